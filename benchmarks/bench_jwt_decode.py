@@ -0,0 +1,60 @@
+"""
+Benchmark of access token decoding: plain python-jose decode vs memoized Auth.decode_token.
+
+Simulates concurrent clients, each reusing its own bearer token for many requests.
+
+Usage:
+    python -m benchmarks.bench_jwt_decode --clients 200 --requests 50
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from jose import jwt
+
+from src.services.auth import auth_service
+
+
+async def run(decode, tokens: list[str], requests: int) -> list[float]:
+    latencies = []
+
+    async def client(token: str):
+        for _ in range(requests):
+            start = time.perf_counter()
+            decode(token)
+            latencies.append(time.perf_counter() - start)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(client(token) for token in tokens))
+    return latencies
+
+
+def report(name: str, latencies: list[float], elapsed: float) -> None:
+    latencies.sort()
+    print(f"{name:<10} ops/s={len(latencies) / elapsed:>10.0f}  "
+          f"p50={statistics.median(latencies) * 1e6:>7.1f}us  "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1e6:>7.1f}us")
+
+
+async def main(clients: int, requests: int) -> None:
+    tokens = [await auth_service.create_access_token({"sub": f"user{i}@example.com", "uid": i, "role": "user",
+                                                      "ver": 0}) for i in range(clients)]
+
+    def plain(token):
+        return jwt.decode(token, auth_service.SECRET_KEY, algorithms=[auth_service.ALGORITHM])
+
+    for name, decode in (("plain", plain), ("memoized", auth_service.decode_token)):
+        start = time.perf_counter()
+        latencies = await run(decode, tokens, requests)
+        report(name, latencies, time.perf_counter() - start)
+
+    print("cache", auth_service.decoded_tokens.stats())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(main(args.clients, args.requests))
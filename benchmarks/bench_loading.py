@@ -0,0 +1,114 @@
+"""
+Benchmark of publication loading: former lazy="joined" defaults vs loader profiles of src.repositories.loaders.
+
+Seeds an in-memory SQLite database with publications having tags, ratings and comments, then loads
+a feed page and single publications, counting SQL statements and rows read from the cursor.
+
+Usage:
+    python -m benchmarks.bench_loading --publications 500 --page 20 --repeat 50
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import joinedload
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Comment, Publication, PubImage, Rating, Tag, User
+from src.repositories.loaders import DETAIL, LIST, publication_options
+
+# relationships the models used to join on every query
+JOINED_DEFAULTS = (
+    joinedload(Publication.user),
+    joinedload(Publication.image),
+    joinedload(Publication.tags),
+    joinedload(Publication.ratings).joinedload(Rating.user),
+    joinedload(Publication.comment).joinedload(Comment.user),
+)
+
+
+class Counter:
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.queries += 1
+        self.rows += len(getattr(cursor, "_rows", ()))
+
+
+async def seed(sessions: async_sessionmaker, publications: int, tags: int, ratings: int, comments: int) -> None:
+    async with sessions() as db:
+        users = [User(username=f"user{i}", email=f"user{i}@example.com", password="x", confirmed=True)
+                 for i in range(ratings + 1)]
+        tag_objects = [Tag(name=f"tag{i}") for i in range(tags * 4)]
+        db.add_all(users + tag_objects)
+        pubs = [Publication(title=f"title {i}", description=f"description {i}", user=users[0],
+                            image=PubImage(current_img=f"http://img/{i}"),
+                            tags=[tag_objects[(i + j) % len(tag_objects)] for j in range(tags)],
+                            ratings=[Rating(score=j % 5 + 1, user=users[j + 1]) for j in range(ratings)])
+                for i in range(publications)]
+        db.add_all(pubs)
+        await db.flush()
+        db.add_all(Comment(text=f"comment {j}", user_id=users[j % len(users)].id, publication_id=publication.id)
+                   for publication in pubs for j in range(comments))
+        await db.commit()
+
+
+async def measure(name: str, sessions: async_sessionmaker, counter: Counter, repeat: int, load) -> None:
+    counter.queries = counter.rows = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        async with sessions() as db:
+            await load(db)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<14} {elapsed / repeat * 1000:>8.2f}ms  "
+          f"queries={counter.queries / repeat:>5.1f}  rows={counter.rows / repeat:>8.1f}")
+
+
+async def main(publications: int, page: int, repeat: int, tags: int, ratings: int, comments: int) -> None:
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(bind=engine)
+    await seed(sessions, publications, tags, ratings, comments)
+
+    counter = Counter()
+    event.listen(engine.sync_engine, "after_cursor_execute", counter)
+
+    def feed(options):
+        async def load(db):
+            stmt = select(Publication).options(*options).order_by(Publication.created_at.desc()).limit(page)
+            result = await db.execute(stmt)
+            for publication in result.unique().scalars():
+                publication.tags_name, publication.average_rating, publication.image.current_img
+
+        return load
+
+    def detail(options):
+        async def load(db):
+            result = await db.execute(select(Publication).filter_by(id=publications // 2).options(*options))
+            publication = result.unique().scalar_one()
+            publication.tags_name, publication.average_rating, publication.image.current_img
+
+        return load
+
+    await measure("feed joined", sessions, counter, repeat, feed(JOINED_DEFAULTS))
+    await measure("feed list", sessions, counter, repeat, feed(publication_options(LIST)))
+    await measure("detail joined", sessions, counter, repeat, detail(JOINED_DEFAULTS))
+    await measure("detail", sessions, counter, repeat, detail(publication_options(DETAIL)))
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--publications", type=int, default=500)
+    parser.add_argument("--page", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--tags", type=int, default=5)
+    parser.add_argument("--ratings", type=int, default=10)
+    parser.add_argument("--comments", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.publications, args.page, args.repeat, args.tags, args.ratings, args.comments))
@@ -0,0 +1,80 @@
+"""
+Benchmark of JSON responses: default FastAPI serialization vs src.utils.responses.
+
+Serves the same page of PublicationUsersResponse items by routes of an in-process app, both as projection
+rows of src.repositories.projections and as ready pydantic models (as returned by cached reads):
+- default: response_model validation and the json module;
+- orjson: response_model validation, encoded by FastJSONResponse;
+- json_response: validated once by cached TypeAdapter and serialized by it, without revalidation.
+
+Usage:
+    python -m benchmarks.bench_responses --limit 500 --repeat 50
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime
+
+from fastapi import FastAPI
+from httpx import AsyncClient
+
+from src.database.models import Role
+from src.repositories.projections import ImageRow, PublicationRow, UserRow
+from src.schemas.publications import PublicationUsersResponse
+from src.utils.responses import FastJSONResponse, json_response, type_adapter
+
+PAGE = list[PublicationUsersResponse]
+
+
+def rows(limit: int) -> list[PublicationRow]:
+    return [PublicationRow(i, f"title {i}", f"description of publication {i}", datetime(2024, 1, 1),
+                           ImageRow(f"http://img/{i}", f"http://img/{i}/updated", None), "cat, sunset, sea",
+                           i % 5 + 0.5, i % 7, UserRow(i % 50, f"user{i % 50}", f"user{i % 50}@example.com",
+                                                f"http://avatar/{i % 50}", None, Role.user))
+            for i in range(limit)]
+
+
+def make_app(content: list) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/default", response_model=PAGE)
+    async def default():
+        return content
+
+    @app.get("/orjson", response_model=PAGE, response_class=FastJSONResponse)
+    async def orjson():
+        return content
+
+    @app.get("/json_response", response_model=PAGE, response_class=FastJSONResponse)
+    async def fast():
+        return json_response(PAGE, content)
+
+    return app
+
+
+async def measure(name: str, content: list, repeat: int) -> None:
+    async with AsyncClient(app=make_app(content), base_url="http://test") as client:
+        bodies = {}
+        for path in ("/default", "/orjson", "/json_response"):
+            await client.get(path)
+            start = time.perf_counter()
+            for _ in range(repeat):
+                response = await client.get(path)
+            elapsed = (time.perf_counter() - start) / repeat * 1000
+            bodies[path] = response.json()
+            print(f"{name:<8} {path:<15} {elapsed:>8.2f}ms/request, {len(response.content)} bytes")
+    assert bodies["/default"] == bodies["/orjson"] == bodies["/json_response"]
+
+
+async def main(args: argparse.Namespace) -> None:
+    page = rows(args.limit)
+    print(f"--- page of {args.limit} PublicationUsersResponse")
+    await measure("rows", page, args.repeat)
+    await measure("models", type_adapter(PAGE).validate_python(page, from_attributes=True), args.repeat)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    asyncio.run(main(parser.parse_args()))
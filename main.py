@@ -1,6 +1,3 @@
-# from fastapi_limiter import FastAPILimiter
-# from fastapi_limiter.depends import RateLimiter
-
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -9,8 +6,18 @@ from sqlalchemy.ext.asyncio import AsyncSession
 import uvicorn
 
 from src.routing.comments import router as comments_router
-from src.routing import auth, profile, publications, tags, ratings
-from src.database.db import get_db
+from src.routing import auth, profile, publications, tags, ratings, metrics
+from src.conf.config import config
+from src.database.db import ReadYourWritesMiddleware, get_db, sessionmanager
+from src.database.query_stats import SERVER_TIMING_HEADER, QueryStatsMiddleware
+from src.services.email import outbox_worker
+from src.services.feed_pages import feed_pages
+from src.services.hashing import hashing_pool
+from src.services.principal_cache import invalidations
+from src.services.rate_limit import rate_limiter
+from src.services.tag_index import tag_index
+from src.utils.conditional import ETAG_HEADER
+from src.utils.pagination import NEXT_CURSOR_HEADER
 
 # from src.services.auth import auth_service
 
@@ -26,11 +33,37 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, SERVER_TIMING_HEADER, ETAG_HEADER],
 )
-
-# @app.on_event('startup')
-# async def startup():
-#     await FastAPILimiter.init(auth_service.r)
+if sessionmanager.has_replicas:
+    app.add_middleware(ReadYourWritesMiddleware, window=config.DB_READ_YOUR_WRITES)
+if config.SQL_STATS:
+    app.add_middleware(QueryStatsMiddleware, n_plus_one_threshold=config.SQL_N_PLUS_ONE_THRESHOLD)
+
+
+@app.on_event('startup')
+async def startup():
+    hashing_pool.start()
+    if hashing_pool.rounds is None:
+        await hashing_pool.calibrate(config.BCRYPT_TARGET_MS)
+    rate_limiter.start()
+    invalidations.start()
+    await sessionmanager.start(config.DB_REPLICA_CHECK_INTERVAL)
+    await tag_index.start(sessionmanager.session)
+    await feed_pages.start(sessionmanager.session)
+    if config.MAIL_WORKER_IN_APP:
+        outbox_worker.start()
+
+
+@app.on_event('shutdown')
+async def shutdown():
+    hashing_pool.shutdown()
+    await rate_limiter.stop()
+    await invalidations.stop()
+    await outbox_worker.stop()
+    await tag_index.stop()
+    await feed_pages.stop()
+    await sessionmanager.stop()
 
 prefix = '/api/v1'
 
@@ -38,11 +71,13 @@ app.include_router(comments_router, prefix=prefix)
 app.include_router(auth.router, prefix=prefix)
 app.include_router(publications.router, prefix=prefix)
 app.include_router(tags.router, prefix=prefix)
+app.include_router(tags.suggest_router, prefix=prefix)
 app.include_router(profile.router, prefix=prefix)
 app.include_router(ratings.router, prefix=prefix)
+app.include_router(metrics.router, prefix=prefix)
 
 
-@app.get('/', dependencies=[])  # Depends(RateLimiter(times=2, seconds=5))
+@app.get('/')
 def read_root():
     return {'message': 'It works!'}
 
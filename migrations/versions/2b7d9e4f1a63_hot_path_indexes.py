@@ -0,0 +1,54 @@
+"""hot_path_indexes
+
+Revision ID: 2b7d9e4f1a63
+Revises: 9c4f2b7e1d58
+Create Date: 2026-10-17 00:12:37.640215
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b7d9e4f1a63'
+down_revision: Union[str, None] = '9c4f2b7e1d58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# publications(user_id, created_at) and comments(publication_id, created_at) are indexed by 5d8b1e0c6a42
+INDEXES = (
+    ('ix_ratings_publication_id_id', 'ratings', ('publication_id', 'id')),
+    ('ix_publication_tag_tag_id_publication_id', 'publication_tag', ('tag_id', 'publication_id')),
+)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, list(columns), unique=False)
+        return
+
+    # CONCURRENTLY doesn't block writes to the tables, but can't run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            # an interrupted concurrent build leaves an invalid index, which IF NOT EXISTS would keep
+            invalid = bind.execute(sa.text('SELECT NOT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)'),
+                                   {'name': name}).scalar()
+            if invalid:
+                op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
+            op.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table} ({", ".join(columns)})')
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table)
+        return
+
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {name}')
@@ -0,0 +1,42 @@
+"""publication_comment_count
+
+Revision ID: 3f7a9d2c5e81
+Revises: 6e3a8c1f4b27
+Create Date: 2026-10-17 02:13:40.528174
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f7a9d2c5e81'
+down_revision: Union[str, None] = '6e3a8c1f4b27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    # column may exist if a previous run was interrupted during backfill
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('publications')}
+    if 'comment_count' not in columns:
+        op.add_column('publications', sa.Column('comment_count', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill by ranges of id, every batch is committed separately, see 9c4f2b7e1d58
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        max_id = bind.execute(sa.text('SELECT max(id) FROM publications')).scalar() or 0
+        for start in range(0, max_id, BATCH_SIZE):
+            bind.execute(sa.text(
+                'UPDATE publications SET '
+                'comment_count = (SELECT count(*) FROM comments WHERE comments.publication_id = publications.id) '
+                'WHERE id > :start AND id <= :end'
+            ), {'start': start, 'end': start + BATCH_SIZE})
+
+
+def downgrade() -> None:
+    op.drop_column('publications', 'comment_count')
@@ -0,0 +1,34 @@
+"""keyset_pagination_indexes
+
+Revision ID: 5d8b1e0c6a42
+Revises: 7a2e5c4b9d31
+Create Date: 2026-10-16 23:02:41.508116
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d8b1e0c6a42'
+down_revision: Union[str, None] = '7a2e5c4b9d31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_publications_created_at_id', 'publications', ['created_at', 'id'], unique=False)
+    op.create_index('ix_publications_user_id_created_at_id', 'publications', ['user_id', 'created_at', 'id'],
+                    unique=False)
+    op.create_index('ix_comments_publication_id_created_at_id', 'comments', ['publication_id', 'created_at', 'id'],
+                    unique=False)
+    op.create_index('ix_ratings_user_id_id', 'ratings', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_ratings_user_id_id', table_name='ratings')
+    op.drop_index('ix_comments_publication_id_created_at_id', table_name='comments')
+    op.drop_index('ix_publications_user_id_created_at_id', table_name='publications')
+    op.drop_index('ix_publications_created_at_id', table_name='publications')
@@ -0,0 +1,67 @@
+"""publication_search
+
+Revision ID: 6e3a8c1f4b27
+Revises: 2b7d9e4f1a63
+Create Date: 2026-10-17 00:48:15.902377
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '6e3a8c1f4b27'
+down_revision: Union[str, None] = '2b7d9e4f1a63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+# must match SEARCH_CONFIG of settings, see src.repositories.search
+SEARCH_CONFIG = 'simple'
+
+TAGS = ("(SELECT {aggregate}(tags.name, ' ') FROM tags JOIN publication_tag ON publication_tag.tag_id = tags.id "
+        "WHERE publication_tag.publication_id = publications.id)")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    columns = {column['name'] for column in sa.inspect(bind).get_columns('publications')}
+    if 'search_vector' not in columns:
+        op.add_column('publications', sa.Column('search_vector', postgresql.TSVECTOR().with_variant(sa.Text(), 'sqlite'),
+                                                nullable=True))
+
+    if bind.dialect.name != 'postgresql':
+        op.execute('CREATE VIRTUAL TABLE IF NOT EXISTS publications_fts USING fts5(title, description, tags)')
+        op.execute('DELETE FROM publications_fts')
+        op.execute('INSERT INTO publications_fts (rowid, title, description, tags) '
+                   f'SELECT id, title, description, {TAGS.format(aggregate="group_concat")} FROM publications')
+        return
+
+    vector = (f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') || "
+              f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce({TAGS.format(aggregate='string_agg')}, '')), 'A') || "
+              f"setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')")
+    # backfill by ranges of id and build the index without blocking writes, see 9c4f2b7e1d58 and 2b7d9e4f1a63
+    with op.get_context().autocommit_block():
+        max_id = bind.execute(sa.text('SELECT max(id) FROM publications')).scalar() or 0
+        for start in range(0, max_id, BATCH_SIZE):
+            bind.execute(sa.text(f'UPDATE publications SET search_vector = {vector} WHERE id > :start AND id <= :end'),
+                         {'start': start, 'end': start + BATCH_SIZE})
+
+        invalid = bind.execute(sa.text("SELECT NOT indisvalid FROM pg_index "
+                                       "WHERE indexrelid = to_regclass('ix_publications_search_vector')")).scalar()
+        if invalid:
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_publications_search_vector')
+        op.execute('CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_publications_search_vector '
+                   'ON publications USING gin (search_vector)')
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name != 'postgresql':
+        op.execute('DROP TABLE IF EXISTS publications_fts')
+    else:
+        with op.get_context().autocommit_block():
+            op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_publications_search_vector')
+    op.drop_column('publications', 'search_vector')
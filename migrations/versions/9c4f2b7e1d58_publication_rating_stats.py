@@ -0,0 +1,48 @@
+"""publication_rating_stats
+
+Revision ID: 9c4f2b7e1d58
+Revises: 5d8b1e0c6a42
+Create Date: 2026-10-16 23:41:09.114806
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c4f2b7e1d58'
+down_revision: Union[str, None] = '5d8b1e0c6a42'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    # columns may exist if a previous run was interrupted during backfill
+    columns = {column['name'] for column in sa.inspect(op.get_bind()).get_columns('publications')}
+    if 'rating_count' not in columns:
+        op.add_column('publications', sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False))
+    if 'rating_sum' not in columns:
+        op.add_column('publications', sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill by ranges of id, every batch is committed separately so the migration can be resumed
+    # and doesn't lock the whole table; values are recomputed, so repeated batches are harmless
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        max_id = bind.execute(sa.text('SELECT max(id) FROM publications')).scalar() or 0
+        for start in range(0, max_id, BATCH_SIZE):
+            bind.execute(sa.text(
+                'UPDATE publications SET '
+                'rating_count = (SELECT count(*) FROM ratings WHERE ratings.publication_id = publications.id), '
+                'rating_sum = (SELECT coalesce(sum(score), 0) FROM ratings '
+                'WHERE ratings.publication_id = publications.id) '
+                'WHERE id > :start AND id <= :end'
+            ), {'start': start, 'end': start + BATCH_SIZE})
+
+
+def downgrade() -> None:
+    op.drop_column('publications', 'rating_sum')
+    op.drop_column('publications', 'rating_count')
@@ -10,20 +10,71 @@ class Settings(BaseSettings):
     PG_PORT: int = 5432
 
     DB_URL: str = f"postgresql+asyncpg://{PG_USER}:{PG_PASSWORD}@{PG_DOMAIN}:{PG_PORT}/{PG_DB}"
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_REPLICA_URLS: list[str] = []
+    DB_REPLICA_MAX_LAG: float = 5
+    DB_REPLICA_CHECK_INTERVAL: float = 10
+    DB_READ_YOUR_WRITES: float = 5
+    # diagnostics: Server-Timing header and a log line of SQL statements for every request
+    SQL_STATS: bool = False
+    SQL_N_PLUS_ONE_THRESHOLD: int = 0
+    SEARCH_CONFIG: str = "simple"
 
     SECRET_KEY_JWT: str = "secret_key_jwt"
     ALGORITHM_JWT: str = "HS256"
+    JWT_CACHE_SIZE: int = 10000
 
     MAIL_USERNAME: str = "example@meta.ua"
     MAIL_PASSWORD: str = "secretPassword"
     MAIL_FROM: str = "example@meta.ua"
     MAIL_PORT: int = 465
     MAIL_SERVER: str = "smtp.meta.ua"
+    MAIL_SSL_TLS: bool = True
+    MAIL_STARTTLS: bool = False
+    MAIL_POOL_SIZE: int = 2
+    MAIL_BATCH_SIZE: int = 20
+    MAIL_MAX_ATTEMPTS: int = 5
+    MAIL_RETRY_BASE: int = 30
+    MAIL_WORKER_IN_APP: bool = True
 
     REDIS_DOMAIN: str = "localhost"
     REDIS_PORT: int = 6379
     REDIS_PASSWORD: str = '123456'
 
+    PRINCIPAL_CACHE_SIZE: int = 4096
+    PRINCIPAL_CACHE_TTL: int = 60
+    PRINCIPAL_CACHE_REDIS: bool = False
+    # required with more than one worker: blocks and role changes revoke tokens in other workers by Redis pub/sub
+    PRINCIPAL_CACHE_BROADCAST: bool = False
+
+    READ_CACHE_SIZE: int = 4096
+    READ_CACHE_TTL: float = 60
+    READ_CACHE_LOCAL_TTL: float = 5
+    READ_CACHE_REDIS: bool = False
+
+    FEED_PAGES_REDIS: bool = False
+    FEED_PAGES: int = 5
+    FEED_PAGE_SIZE: int = 10
+    FEED_PAGES_TTL: int = 3600
+
+    REFRESH_TOKEN_TTL: int = 7 * 24 * 3600
+    SESSION_STORE: str = "redis"
+
+    HASHING_POOL_WORKERS: int = 2
+    HASHING_POOL_MAX_PENDING: int = 64
+    BCRYPT_ROUNDS: int = 0
+    BCRYPT_TARGET_MS: int = 250
+
+    RATE_LIMIT_SYNC_INTERVAL: float = 1.0
+
+    TAG_INDEX_REDIS: bool = False
+    TAG_INDEX_RELOAD_INTERVAL: float = 600
+
     CLOUDINARY_NAME: str = "cloud_name"
     CLOUDINARY_API_KEY: int = 123456
     CLOUDINARY_API_SECRET: str = "api_secret"
@@ -1,10 +1,25 @@
+import asyncio
+import hashlib
+import itertools
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Sequence
+
 from redis import Redis
+from sqlalchemy import exc, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, ConnectionPoolEntry, QueuePool
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
 from src.messages import SESSION_NOT_CREATED, SOME_EXCEPTION_SESSION
 
 from src.conf.config import config
+from src.database import query_stats
+from src.utils import metrics
+from src.utils.my_logger import logger
+from src.utils.ttl_cache import TTLCache
 
 import contextlib
 
@@ -12,12 +27,203 @@ SQLALCHEMY_DATABASE_URL = config.DB_URL
 
 SessionLocal = sessionmaker
 
+# set for requests which must read from primary, see ReadYourWritesMiddleware
+primary_pinned: ContextVar[bool] = ContextVar("primary_pinned", default=False)
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """
+    Queue pool which measures how long checkouts wait for a connection.
+    """
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self) -> ConnectionPoolEntry:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+
+def pool_stats(pool: QueuePool) -> dict[str, Any]:
+    """
+    Get state of connection pool.
+
+    :param pool: QueuePool: pool of engine
+    :return: dict: size, checked out, idle and overflow connections, checkout wait time
+
+    """
+    if not isinstance(pool, QueuePool):
+        return {"pool": type(pool).__name__}
+    stats = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "max_overflow": pool._max_overflow,
+    }
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update({
+            "checkouts": pool.checkouts,
+            "timeouts": pool.timeouts,
+            "wait_avg_ms": round(pool.wait_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+            "wait_max_ms": round(pool.wait_max * 1000, 3),
+        })
+    return stats
+
+
+def engine_options(url: str) -> dict[str, Any]:
+    """
+    Get options of create_async_engine from settings. Pool settings apply to server databases,
+    asyncpg statement caches are sized by DB_STATEMENT_CACHE_SIZE (0 disables them, for pgbouncer in transaction mode).
+
+    :param url: str: database url
+    :return: dict: keyword arguments of create_async_engine
+
+    """
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return {}
+
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": config.DB_POOL_SIZE,
+        "max_overflow": config.DB_MAX_OVERFLOW,
+        "pool_timeout": config.DB_POOL_TIMEOUT,
+        "pool_recycle": config.DB_POOL_RECYCLE,
+        "pool_pre_ping": config.DB_POOL_PRE_PING,
+    }
+    if url.get_driver_name() == "asyncpg":
+        options["connect_args"] = {
+            "statement_cache_size": config.DB_STATEMENT_CACHE_SIZE,
+            "prepared_statement_cache_size": config.DB_STATEMENT_CACHE_SIZE,
+        }
+    return options
+
+
+def replica_lag_query(engine: AsyncEngine) -> str:
+    """
+    Get query returning replication lag of replica in seconds. Replica which replayed everything it received
+    has no lag, even if primary was idle since the last transaction.
+
+    :param engine: AsyncEngine: engine of replica
+    :return: str: SQL query
+    """
+    if engine.dialect.name == "postgresql":
+        return ("SELECT CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() "
+                "THEN 0 ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END")
+    return "SELECT 0"
+
+
+@dataclass
+class Replica:
+    engine: AsyncEngine
+    session_maker: async_sessionmaker
+    healthy: bool = True
+    lag: float | None = None
+    error: str | None = None
+
 
 class DatabaseSessionManager:
-    def __init__(self, url: str) -> None:
-        self._engine: AsyncEngine = create_async_engine(url)
+    def __init__(self, url: str, replica_urls: Sequence[str] = (), max_lag: float = 5.0,
+                 **engine_kwargs: Any) -> None:
+        """
+        :param url: str: url of primary database
+        :param replica_urls: Sequence[str]: urls of read replicas
+        :param max_lag: float: replica lagging more seconds behind primary isn't used
+        :param engine_kwargs: Any: options of primary engine
+
+        """
+        self._engine: AsyncEngine = create_async_engine(url, **engine_kwargs)
         self._session_maker: async_sessionmaker = async_sessionmaker(autocommit=False, autoflush=False,
                                                                      bind=self._engine)
+        self.max_lag = max_lag
+        self._replicas: list[Replica] = []
+        for replica_url in replica_urls:
+            engine = create_async_engine(replica_url, **engine_options(replica_url))
+            self._replicas.append(Replica(engine, async_sessionmaker(autocommit=False, autoflush=False, bind=engine)))
+        self._round_robin = itertools.count()
+        self._monitor: asyncio.Task | None = None
+
+    @property
+    def has_replicas(self) -> bool:
+        return bool(self._replicas)
+
+    @property
+    def engines(self) -> list[AsyncEngine]:
+        return [self._engine, *(replica.engine for replica in self._replicas)]
+
+    def pool_stats(self) -> dict[str, Any]:
+        return pool_stats(self._engine.pool)
+
+    def replica_stats(self) -> dict[str, Any]:
+        return {
+            f"replica_{i}": {"host": replica.engine.url.host, "healthy": replica.healthy, "lag": replica.lag,
+                             "error": replica.error, **pool_stats(replica.engine.pool)}
+            for i, replica in enumerate(self._replicas)
+        }
+
+    def pick_replica(self) -> Replica | None:
+        """
+        Pick healthy replica round-robin.
+
+        :return: Replica | None: replica or None if there is no healthy replica
+        """
+        healthy = [replica for replica in self._replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._round_robin) % len(healthy)]
+
+    async def check_replicas(self) -> None:
+        """
+        Check connection and replication lag of every replica. Unreachable or lagging replicas are skipped by reads
+        until they recover.
+        """
+        for replica in self._replicas:
+            try:
+                async with replica.engine.connect() as conn:
+                    lag = (await conn.execute(text(replica_lag_query(replica.engine)))).scalar()
+                replica.lag = float(lag or 0)
+                replica.error = None
+                replica.healthy = replica.lag <= self.max_lag
+            except (exc.SQLAlchemyError, OSError) as err:
+                replica.lag, replica.error, replica.healthy = None, str(err), False
+            if not replica.healthy:
+                logger.warning(f"replica {replica.engine.url.host} is not used, lag: {replica.lag}, "
+                               f"error: {replica.error}")
+
+    async def _monitor_replicas(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_replicas()
+
+    async def start(self, check_interval: float) -> None:
+        """
+        Check replicas and keep checking them in background.
+
+        :param check_interval: float: seconds between checks
+        :return: None
+        """
+        if self._replicas and self._monitor is None:
+            await self.check_replicas()
+            self._monitor = asyncio.get_running_loop().create_task(self._monitor_replicas(check_interval))
+
+    async def stop(self) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
 
     @contextlib.asynccontextmanager
     async def session(self) -> AsyncSession:
@@ -33,11 +239,107 @@ class DatabaseSessionManager:
         finally:
             await session.close()
 
+    @contextlib.asynccontextmanager
+    async def primary_session(self, session: AsyncSession) -> AsyncSession:
+        """
+        Session of primary for reads which must not lag behind, e.g. loads of caches shared by all clients.
+        The given session is reused unless it's bound to replica.
+
+        :param session: AsyncSession: session of request
+        """
+        if not any(session.bind is replica.engine for replica in self._replicas):
+            yield session
+            return
+
+        async with self._session_maker() as primary:
+            yield primary
+
+    @contextlib.asynccontextmanager
+    async def read_session(self) -> AsyncSession:
+        """
+        Session for reads. It's bound to healthy replica, or to primary if there is no one
+        or the request is pinned to primary after a write.
+        """
+        replica = None if primary_pinned.get() else self.pick_replica()
+        if replica is None:
+            async with self.session() as session:
+                yield session
+            return
 
-sessionmanager = DatabaseSessionManager(SQLALCHEMY_DATABASE_URL)
+        session = replica.session_maker()
+        try:
+            yield session
+        except Exception as err:
+            print(SOME_EXCEPTION_SESSION, err)
+            if isinstance(err, (exc.OperationalError, exc.InterfaceError, OSError)):
+                replica.healthy, replica.error = False, str(err)
+            await session.rollback()
+        finally:
+            await session.close()
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pin reads of a client to primary for a short window after its successful write,
+    so the client sees its changes even if replicas lag behind.
+    Client is identified by Authorization header, or by address for anonymous requests.
+    """
+    write_methods = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+
+    def __init__(self, app, window: float, maxsize: int = 100_000):
+        """
+        :param app: ASGI application
+        :param window: float: seconds reads are pinned to primary after write
+        :param maxsize: int: maximum of tracked clients
+
+        """
+        self.app = app
+        self.recent_writers = TTLCache(maxsize=maxsize, ttl=window)
+
+    @staticmethod
+    def client_key(scope) -> bytes:
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                return hashlib.sha256(value).digest()
+        return (scope.get("client") or ("unknown",))[0].encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        key = self.client_key(scope)
+        if scope["method"] in self.write_methods:
+            async def send_and_pin(message):
+                if message["type"] == "http.response.start" and message["status"] < 400:
+                    self.recent_writers.set(key, True)
+                await send(message)
+
+            return await self.app(scope, receive, send_and_pin)
+
+        token = primary_pinned.set(key in self.recent_writers)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            primary_pinned.reset(token)
+
+
+sessionmanager = DatabaseSessionManager(SQLALCHEMY_DATABASE_URL, config.DB_REPLICA_URLS, config.DB_REPLICA_MAX_LAG,
+                                        **engine_options(SQLALCHEMY_DATABASE_URL))
+metrics.register("db_pool", sessionmanager.pool_stats)
+metrics.register("db_replicas", sessionmanager.replica_stats)
+if config.SQL_STATS:
+    for engine in sessionmanager.engines:
+        query_stats.instrument(engine)
+    metrics.register("sql", query_stats.stats)
 
 
 # Dependency
 async def get_db() -> AsyncSession:
     async with sessionmanager.session() as session:
+        yield session
+
+
+# Dependency of read-only routes
+async def get_read_db() -> AsyncSession:
+    async with sessionmanager.read_session() as session:
         yield session
\ No newline at end of file
@@ -3,7 +3,9 @@ from datetime import date
 from typing import Optional
 
 from sqlalchemy.orm import Mapped, mapped_column, relationship, validates
-from sqlalchemy import String, ForeignKey, DateTime, func, Enum, Boolean, UniqueConstraint, CheckConstraint
+from sqlalchemy import String, ForeignKey, DateTime, func, Enum, Boolean, UniqueConstraint, CheckConstraint, Integer, \
+    JSON, Index, Text, DDL, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.orm import DeclarativeBase
 
 
@@ -30,6 +32,7 @@ class User(Base):
     role: Mapped[Enum] = mapped_column("role", Enum(Role), default=Role.user)
     confirmed: Mapped[bool] = mapped_column(Boolean, default=False, nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=True)
+    token_version: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     created_at: Mapped[date] = mapped_column("created_at", DateTime(timezone=True), default=func.now())
     updated_at: Mapped[date] = mapped_column("updated_at", DateTime(timezone=True), default=func.now(),
@@ -42,7 +45,7 @@ class Tag(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(50), unique=True, nullable=False, index=True)
-    publications = relationship("Publication", secondary="publication_tag", back_populates="tags", lazy="joined")
+    publications = relationship("Publication", secondary="publication_tag", back_populates="tags", lazy="select")
 
 
 class PublicationTagAssociation(Base):
@@ -51,6 +54,10 @@ class PublicationTagAssociation(Base):
     publication_id: Mapped[int] = mapped_column(ForeignKey("publications.id", ondelete="CASCADE"), primary_key=True)
     tag_id: Mapped[int] = mapped_column(ForeignKey("tags.id", ondelete="CASCADE"), primary_key=True)
 
+    __table_args__ = (
+        Index("ix_publication_tag_tag_id_publication_id", "tag_id", "publication_id"),
+    )
+
 
 class Publication(Base):
     __tablename__ = "publications"
@@ -60,34 +67,57 @@ class Publication(Base):
     description: Mapped[str] = mapped_column(String(255), nullable=True)
 
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
-    user: Mapped["User"] = relationship("User", backref="publications", lazy="joined")
+    user: Mapped["User"] = relationship("User", backref="publications", lazy="select")
 
-    image: Mapped["PubImage"] = relationship("PubImage", backref="publications", lazy="joined", uselist=False,
+    image: Mapped["PubImage"] = relationship("PubImage", backref="publications", lazy="select", uselist=False,
                                              cascade="all,delete")
-    comment: Mapped["Comment"] = relationship("Comment", back_populates="publication", lazy="joined",
+    comment: Mapped["Comment"] = relationship("Comment", back_populates="publication", lazy="select",
                                               cascade="all,delete")
     tags: Mapped[list["Tag"]] = relationship("Tag", secondary="publication_tag", back_populates="publications",
-                                             lazy="joined")
-    ratings: Mapped[list["Rating"]] = relationship("Rating", back_populates="publication", lazy="joined",
+                                             lazy="select")
+    ratings: Mapped[list["Rating"]] = relationship("Rating", back_populates="publication", lazy="select",
                                                    cascade="all, delete")
+    # aggregates of ratings, maintained by repositories.ratings
+    rating_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    rating_sum: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    # number of comments, maintained by repositories.comments
+    comment_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     created_at: Mapped[date] = mapped_column("created_at", DateTime(timezone=True), default=func.now())
     updated_at: Mapped[date] = mapped_column("updated_at", DateTime(timezone=True), default=func.now(),
                                              onupdate=func.now())
+    # full-text document of title, description and tags, maintained by repositories.search;
+    # SQLite keeps it in publications_fts table instead
+    search_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR().with_variant(Text(), "sqlite"), nullable=True,
+                                                         deferred=True)
+
+    # keyset pagination of feed and of user's publications
+    __table_args__ = (
+        Index("ix_publications_created_at_id", "created_at", "id"),
+        Index("ix_publications_user_id_created_at_id", "user_id", "created_at", "id"),
+        Index("ix_publications_search_vector", "search_vector", postgresql_using="gin"),
+    )
 
     @property
     def average_rating(self) -> Optional[float]:
-        if self.ratings:
-            if len(self.ratings) == 0:  # type: ignore
-                return None
-            return sum(rating.score for rating in self.ratings) / len(self.ratings)  # type: ignore
-        return None
+        if not self.rating_count:
+            return None
+        return self.rating_sum / self.rating_count
 
     @property
     def tags_name(self) -> str:
         return ", ".join(tag.name for tag in self.tags) if self.tags else None
 
 
+# SQLite full-text index of publications, rowid is id of publication
+event.listen(Publication.__table__, "after_create", DDL(
+    "CREATE VIRTUAL TABLE IF NOT EXISTS publications_fts USING fts5(title, description, tags)"
+).execute_if(dialect="sqlite"))
+event.listen(Publication.__table__, "after_drop", DDL(
+    "DROP TABLE IF EXISTS publications_fts"
+).execute_if(dialect="sqlite"))
+
+
 class PubImage(Base):
     __tablename__ = "pub_images"
 
@@ -103,11 +133,11 @@ class Comment(Base):
 
     id: Mapped[int] = mapped_column(primary_key=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
-    user: Mapped["User"] = relationship("User", backref="comments", lazy="joined")
+    user: Mapped["User"] = relationship("User", backref="comments", lazy="select")
     text: Mapped[str] = mapped_column(String(250), nullable=False)
 
     publication_id: Mapped[int] = mapped_column(ForeignKey("publications.id"))
-    publication: Mapped["Publication"] = relationship("Publication", back_populates="comment", lazy="joined")
+    publication: Mapped["Publication"] = relationship("Publication", back_populates="comment", lazy="select")
 
     # emoji: Mapped[Enum] = mapped_column("role", Enum(Role), default=Role.user) # reaction with the comment?
 
@@ -115,6 +145,10 @@ class Comment(Base):
     updated_at: Mapped[date] = mapped_column("updated_at", DateTime(timezone=True), default=func.now(),
                                              onupdate=func.now())
 
+    __table_args__ = (
+        Index("ix_comments_publication_id_created_at_id", "publication_id", "created_at", "id"),
+    )
+
 
 class Rating(Base):
     __tablename__ = "ratings"
@@ -126,14 +160,44 @@ class Rating(Base):
 
     __table_args__ = (
         UniqueConstraint('user_id', 'publication_id', name='uix_1'),
-        CheckConstraint('score >= 1 AND score <= 5', name='check_score_range')
+        CheckConstraint('score >= 1 AND score <= 5', name='check_score_range'),
+        Index("ix_ratings_user_id_id", "user_id", "id"),
+        Index("ix_ratings_publication_id_id", "publication_id", "id"),
     )
 
-    user: Mapped["User"] = relationship("User", backref="ratings", lazy="joined")
-    publication: Mapped["Publication"] = relationship("Publication", back_populates="ratings", lazy="joined")
+    user: Mapped["User"] = relationship("User", backref="ratings", lazy="select")
+    publication: Mapped["Publication"] = relationship("Publication", back_populates="ratings", lazy="select")
 
     @validates('score')
     def validate_score(self, key, score):
         if not (1 <= score <= 5):
             raise ValueError("Score must be between 1 and 5")
         return score
+
+
+class EmailStatus(enum.Enum):
+    pending: str = "pending"
+    sent: str = "sent"
+    failed: str = "failed"
+
+
+class EmailOutbox(Base):
+    __tablename__ = "email_outbox"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    recipient: Mapped[str] = mapped_column(String(150), nullable=False)
+    subject: Mapped[str] = mapped_column(String(255), nullable=False)
+    template: Mapped[str] = mapped_column(String(100), nullable=False)
+    context: Mapped[dict] = mapped_column(JSON, nullable=False)
+    status: Mapped[Enum] = mapped_column("status", Enum(EmailStatus), default=EmailStatus.pending, nullable=False)
+    attempts: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    next_attempt_at: Mapped[date] = mapped_column(DateTime(timezone=True), default=func.now(), nullable=False)
+    last_error: Mapped[str] = mapped_column(String(500), nullable=True)
+
+    created_at: Mapped[date] = mapped_column("created_at", DateTime(timezone=True), default=func.now())
+    sent_at: Mapped[date] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
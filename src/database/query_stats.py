@@ -0,0 +1,137 @@
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src.utils.my_logger import logger
+
+SERVER_TIMING_HEADER = "Server-Timing"
+
+
+@dataclass(slots=True)
+class QueryStats:
+    """
+    SQL statements executed while handling one request.
+    """
+    count: int = 0
+    duration: float = 0.0
+    rows: int = 0
+    statements: Counter | None = None
+
+    def record(self, statement: str, duration: float, rows: int) -> None:
+        self.count += 1
+        self.duration += duration
+        self.rows += rows
+        if self.statements is not None:
+            self.statements[statement] += 1
+
+    def repeated(self, threshold: int) -> list[tuple[str, int]]:
+        """
+        Get statements executed at least threshold times, the usual sign of lazy loading in a loop (N+1).
+
+        :param threshold: int: minimum number of executions
+        :return: list[tuple[str, int]]: statements with their number of executions, most repeated first
+        """
+        if self.statements is None:
+            return []
+        return [(statement, count) for statement, count in self.statements.most_common() if count >= threshold]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.duration * 1000:.2f};desc="{self.count} queries, {self.rows} rows"'
+
+
+# stats of the current request, set by QueryStatsMiddleware
+request_queries: ContextVar[QueryStats | None] = ContextVar("request_queries", default=None)
+
+# totals of all requests, for /metrics
+totals = {"requests": 0, "queries": 0, "duration_ms": 0.0, "rows": 0, "n_plus_one": 0}
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if request_queries.get() is not None:
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stats = request_queries.get()
+    if stats is None or not conn.info.get("query_start"):
+        return
+    duration = time.perf_counter() - conn.info["query_start"].pop()
+    # drivers report rowcount of DML only, rows of SELECT are buffered by async adapters
+    rows = cursor.rowcount
+    if rows is None or rows < 0:
+        rows = len(getattr(cursor, "_rows", None) or ())
+    stats.record(statement, duration, rows)
+
+
+def instrument(engine: AsyncEngine | Engine) -> None:
+    """
+    Count statements, their time and rows of the current request on engine.
+    Statements executed outside of QueryStatsMiddleware, e.g. by background workers, aren't counted.
+
+    :param engine: AsyncEngine | Engine: engine to instrument
+    :return: None
+    """
+    sync_engine = engine.sync_engine if isinstance(engine, AsyncEngine) else engine
+    if not event.contains(sync_engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def stats() -> dict[str, Any]:
+    return {**totals, "duration_ms": round(totals["duration_ms"], 3)}
+
+
+class QueryStatsMiddleware:
+    """
+    Collect SQL statements of each request, report them in Server-Timing header and in log.
+    With n_plus_one_threshold, statements repeated that many times within one request are logged as warnings.
+    """
+
+    def __init__(self, app, n_plus_one_threshold: int = 0):
+        """
+        :param app: ASGI application
+        :param n_plus_one_threshold: int: repetitions of identical statement reported as N+1, 0 disables detection
+
+        """
+        self.app = app
+        self.n_plus_one_threshold = n_plus_one_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        query_stats = QueryStats(statements=Counter() if self.n_plus_one_threshold else None)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start" and query_stats.count:
+                message["headers"] = [*message.get("headers", ()),
+                                      (SERVER_TIMING_HEADER.lower().encode(), query_stats.server_timing().encode())]
+            await send(message)
+
+        token = request_queries.set(query_stats)
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            request_queries.reset(token)
+            self.report(scope, query_stats)
+
+    def report(self, scope, query_stats: QueryStats) -> None:
+        totals["requests"] += 1
+        totals["queries"] += query_stats.count
+        totals["duration_ms"] += query_stats.duration * 1000
+        totals["rows"] += query_stats.rows
+        if not query_stats.count:
+            return
+
+        route = f'{scope["method"]} {scope["path"]}'
+        logger.info(f"{route}: {query_stats.count} queries, {query_stats.duration * 1000:.2f} ms, "
+                    f"{query_stats.rows} rows")
+        for statement, count in query_stats.repeated(self.n_plus_one_threshold):
+            totals["n_plus_one"] += 1
+            logger.warning(f"{route}: possible N+1, statement executed {count} times: {' '.join(statement.split())}")
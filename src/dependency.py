@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio as aioredis
 
 from src.conf.config import config
 from src.utils.my_logger import logger
@@ -14,3 +15,14 @@ def get_cache():
     except redis.ConnectionError as e:
         # TODO тут нам нужно упасть?/продолжить?/перезапустить?/сообщить?
         logger.error(e)
+
+
+def get_async_cache():
+    try:
+        return aioredis.Redis(
+            host=config.REDIS_DOMAIN,
+            port=config.REDIS_PORT,
+            db=0
+        )
+    except redis.ConnectionError as e:
+        logger.error(e)
@@ -3,6 +3,8 @@ SESSION_NOT_CREATED = 'Session is not initialized!'
 SOME_EXCEPTION_SESSION = 'Seems like the following exception appeared during session creation: '
 FORBIDDEN = 'You don\'t have access to this resource.'
 INVALID_SCOPES = 'Invalid scope for token'
+TOO_MANY_REQUESTS = 'Too many requests, please try again later'
+INVALID_CURSOR = 'Invalid pagination cursor'
 
 # Auth
 NOT_VALID_CREDENTIALS = "Could not validate credentials"
@@ -16,6 +18,7 @@ VERIFICATION_ERROR = "Verification error"
 EMAIL_ALREADY_CONFIRMED = "Your email is already confirmed"
 EMAIL_CONFIRMED = "Email confirmed"
 CHECK_EMAIL = "Check your email for confirmation link"
+HASHING_POOL_SATURATED = "Server is busy, please try again later"
 
 # Publications
 PUBLICATION_NOT_FOUND = "Publication not found"
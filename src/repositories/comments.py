@@ -1,15 +1,23 @@
 from src.database.models import *
 from src.schemas.comments import *
 from src.database.db import AsyncSession
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, update
+from datetime import datetime
 from typing import List
 
 from sqlalchemy.future import select
+from sqlalchemy.orm import raiseload
+from src.repositories.projections import fetch_comment_rows, select_comment_rows
+from src.services.principal import Principal
+from src.services.read_cache import read_cache
 from src.utils.my_logger import logger as my_logger
+from src.utils.pagination import Keyset
+
+comments_keyset = Keyset(Comment.created_at, Comment.id)
 
 
 async def add_comment(
-        publication_id: int, current_user: User, body: CommentModel, db: AsyncSession
+        publication_id: int, current_user: User | Principal, body: CommentModel, db: AsyncSession
 ) -> Comment:
     """
     User can add comment for current publication (if exist).
@@ -17,7 +25,7 @@ async def add_comment(
     Receiving publication id and current user.
 
     :param publication_id: int: publication id received
-    :param current_user: User: current user received
+    :param current_user: User | Principal: current user received
     :param body: CommentModel: comment model received
     :param db: AsyncSession: database session received
     :return: Comment: comment added
@@ -30,9 +38,9 @@ async def add_comment(
     )
 
     publication = await db.execute(
-        select(Publication).filter(Publication.id == publication_id)
+        select(Publication.id).filter(Publication.id == publication_id)
     )
-    publication = publication.unique().scalar_one_or_none()
+    publication = publication.scalar_one_or_none()
 
     if not publication:
         return None
@@ -47,12 +55,31 @@ async def add_comment(
         comment.updated_at,
     )
     db.add(comment)
+    await update_comment_count(publication_id, 1, db)
     await db.commit()
     await db.refresh(comment)
 
     return comment
 
 
+async def update_comment_count(publication_id: int, count: int, db: AsyncSession) -> None:
+    """
+    Change number of comments of publication in the current transaction.
+    Increment is done by database, so concurrent comments don't overwrite each other.
+
+    :param publication_id: int: id of commented publication
+    :param count: int: change of comment count, 1 or -1
+    :param db: AsyncSession: database session
+    :return: None
+
+    """
+    stmt = (update(Publication).where(Publication.id == publication_id)
+            .values(comment_count=Publication.comment_count + count)
+            .execution_options(synchronize_session=False))
+    await db.execute(stmt)
+    read_cache.track(db, f"publication:{publication_id}")
+
+
 async def edit_comment(
         comment_id: int, body: CommentModelEditing, current_user: User, db: AsyncSession
 ) -> Comment | None:
@@ -107,35 +134,55 @@ async def delete_comment(
 
     if comment:
         await db.delete(comment)
+        await update_comment_count(comment.publication_id, -1, db)
         await db.commit()
 
     return comment
 
 
+@read_cache.cached("comments", List[CommentWithAuthor],
+                   tags=lambda publication_id, **_: [f"comments:{publication_id}", "comment_authors"])
 async def get_comments(
-        publication_id: int, skip: int, limit: int, db: AsyncSession
-) -> List[Comment]:
+        publication_id: int, skip: int, limit: int, db: AsyncSession, cursor: str | None = None
+) -> List[CommentWithAuthor]:
     """
-    (Any) Get all comments.
+    (Any) Get all comments with username and avatar of authors. Cached, comments are returned as schemas,
+    not models; only comment columns and the author's username and avatar are selected.
+    Pages are invalidated by changes of comments of publication and by any change of username or avatar.
 
     Receiving publication id.
 
     :param publication_id: int: publication id to get comments from db
-    :param skip: int: offset for pagination
+    :param skip: int: offset for pagination, ignored if cursor is given
     :param limit: int: limit for pagination
     :param db: AsyncSession: database session
-    :return: List[Comment]: list of comments from db
+    :param cursor: str | None: cursor of page, see comments_keyset
+    :return: List[CommentWithAuthor]: list of comments from db
 
     """
-    comment = await db.execute(
-        select(Comment)
-        .filter(Comment.publication_id == publication_id)
-        .offset(skip)
-        .limit(limit)
-        .order_by(Comment.created_at)
-    )
-    comment = comment.unique().scalars().all()
-    return comment
+    stmt = select_comment_rows().filter(Comment.publication_id == publication_id)
+    return await fetch_comment_rows(comments_keyset.paginate(stmt, cursor, skip, limit), db)
+
+
+@read_cache.cached("comments_version", tuple[int, int | None, datetime | None, datetime | None],
+                   tags=lambda publication_id: [f"comments:{publication_id}", "comment_authors"])
+async def get_comments_version(
+        publication_id: int, db: AsyncSession
+) -> tuple[int, int | None, datetime | None, datetime | None]:
+    """
+    (Any) Get version of comments of publication for validators of responses, without loading them. Cached.
+    Comments are returned with username and avatar of authors, so their changes are a part of version.
+
+    :param publication_id: int: publication id
+    :param db: AsyncSession: database session
+    :return: tuple: number of comments, the last id, the last updated_at of comments and of their authors
+
+    """
+    stmt = (select(func.count(Comment.id), func.max(Comment.id), func.max(Comment.updated_at),
+                   func.max(User.updated_at))
+            .join(User, User.id == Comment.user_id)
+            .filter(Comment.publication_id == publication_id))
+    return (await db.execute(stmt)).one()
 
 
 async def get_comment(
@@ -152,7 +199,7 @@ async def get_comment(
 
     """
     comment = await db.execute(
-        select(Comment).filter(Comment.id == comment_id)
+        select(Comment).filter(Comment.id == comment_id).options(raiseload("*"))
     )
-    comment = comment.unique().scalar_one_or_none()
+    comment = comment.scalar_one_or_none()
     return comment
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import EmailOutbox, EmailStatus
+
+
+def add_email(recipient: str, subject: str, template: str, context: dict, db: AsyncSession) -> EmailOutbox:
+    """
+    Add email to outbox. It isn't committed here, so email is saved in the same transaction as the caller's changes.
+
+    :param recipient: str: email address of recipient
+    :param subject: str: subject of email
+    :param template: str: name of html template
+    :param context: dict: template variables, must be JSON serializable
+    :param db: AsyncSession: database session
+    :return: EmailOutbox: added email
+
+    """
+    email = EmailOutbox(recipient=recipient, subject=subject, template=template, context=context)
+    db.add(email)
+    return email
+
+
+async def claim_emails(limit: int, lease: float, db: AsyncSession) -> list[EmailOutbox]:
+    """
+    Claim batch of pending emails which are due. Claimed emails are postponed by lease,
+    so other workers skip them, and they are retried if this worker dies before marking them.
+
+    :param limit: int: maximum number of emails
+    :param lease: float: seconds the emails are reserved for this worker
+    :param db: AsyncSession: database session
+    :return: list[EmailOutbox]: claimed emails
+
+    """
+    now = datetime.now(timezone.utc)
+    result = await db.execute(
+        select(EmailOutbox)
+        .filter(EmailOutbox.status == EmailStatus.pending, EmailOutbox.next_attempt_at <= now)
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    emails = list(result.scalars().all())
+    for email in emails:
+        email.attempts += 1
+        email.next_attempt_at = now + timedelta(seconds=lease)
+    await db.flush()
+    # detached emails aren't expired by commit, so they can be read after the session is closed
+    for email in emails:
+        db.expunge(email)
+    await db.commit()
+    return emails
+
+
+async def mark_sent(ids: list[int], db: AsyncSession) -> None:
+    """
+    Mark emails as sent.
+
+    :param ids: list[int]: ids of sent emails
+    :param db: AsyncSession: database session
+    :return: None
+
+    """
+    if ids:
+        await db.execute(
+            update(EmailOutbox)
+            .filter(EmailOutbox.id.in_(ids))
+            .values(status=EmailStatus.sent, sent_at=datetime.now(timezone.utc), last_error=None)
+        )
+        await db.commit()
+
+
+async def mark_failed(email_id: int, error: str, retry_in: float | None, db: AsyncSession) -> None:
+    """
+    Record failed attempt of email. It's retried later or failed for good.
+
+    :param email_id: int: id of email
+    :param error: str: description of error
+    :param retry_in: float | None: seconds to next attempt, None - don't retry
+    :param db: AsyncSession: database session
+    :return: None
+
+    """
+    values = {"last_error": error[:500]}
+    if retry_in is None:
+        values["status"] = EmailStatus.failed
+    else:
+        values["next_attempt_at"] = datetime.now(timezone.utc) + timedelta(seconds=retry_in)
+    await db.execute(update(EmailOutbox).filter(EmailOutbox.id == email_id).values(**values))
+    await db.commit()
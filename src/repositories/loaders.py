@@ -0,0 +1,50 @@
+"""
+Loader profiles of publication queries.
+
+Relationships of models are loaded lazily by default, so every repository function picks the profile
+it needs explicitly:
+
+- "list": publications with image, owner and tags, as shown in feeds
+- "detail": one publication with image and tags
+- "owner-check": columns only, for existence and ownership checks before a change
+
+Average rating is served from rating_count and rating_sum columns, ratings aren't loaded.
+Collections are loaded by separate ``SELECT ... IN`` queries, so LIMIT/OFFSET applies to publications,
+not to rows multiplied by joins. Relationships outside the profile raise on access instead of
+silently issuing a query per row.
+"""
+from sqlalchemy.orm import joinedload, raiseload, selectinload
+
+from src.database.models import Publication
+
+LIST = "list"
+DETAIL = "detail"
+OWNER_CHECK = "owner-check"
+
+_publication_profiles = {
+    LIST: (
+        joinedload(Publication.image),
+        joinedload(Publication.user),
+        selectinload(Publication.tags).raiseload("*"),
+        raiseload("*"),
+    ),
+    DETAIL: (
+        joinedload(Publication.image),
+        selectinload(Publication.tags).raiseload("*"),
+        raiseload("*"),
+    ),
+    OWNER_CHECK: (
+        raiseload("*"),
+    ),
+}
+
+
+def publication_options(profile: str) -> tuple:
+    """
+    Get loader options of publication query.
+
+    :param profile: str: name of profile: "list", "detail" or "owner-check"
+    :return: tuple: options for select(Publication).options(...)
+
+    """
+    return _publication_profiles[profile]
@@ -7,18 +7,20 @@ from libgravatar import Gravatar
 
 from src.database.models import User, Publication
 from src.repositories.users import get_user_by_email
-from src.schemas.user import UserNameSchema, AboutSchema
+from src.schemas.user import UserNameSchema, AboutSchema, UserPublic
+from src.services.read_cache import read_cache
 
 from src.utils.my_logger import logger
 
 
+@read_cache.cached("user_by_username", UserPublic | None, tags=lambda username: [f"username:{username}"])
 async def get_user_by_username(username: str, db: AsyncSession):
     """
-    Getting user by username.
+    Getting user by username. Cached, the result is a snapshot of user, not the model.
 
     :param username: str: username
     :param db: AsyncSession: database session
-    :return: User: user by username
+    :return: UserPublic: user by username
 
     """
     stmt = select(User).filter_by(username=username)
@@ -28,9 +30,10 @@ async def get_user_by_username(username: str, db: AsyncSession):
     return user
 
 
+@read_cache.cached("user_publications_count", int, tags=lambda user_id: [f"user_publications:{user_id}"])
 async def count_user_publications(user_id: int, db: AsyncSession) -> int:
     """
-    Count user publications.
+    Count user publications. Cached.
 
     :param user_id: int: user id
     :param db: AsyncSession: database session
@@ -0,0 +1,147 @@
+"""
+Column projections of publication and comment lists.
+
+List responses don't need ORM objects: hydrating a page builds Publication, PubImage, User and Tag
+instances with identity map entries and change tracking, only for pydantic to read their attributes once.
+Projections select just the columns of responses into slotted dataclasses, in one query per page:
+tag names are aggregated by ``string_agg``/``group_concat``, average rating is computed from
+rating_count and rating_sum, comments get only username and avatar of their authors.
+Rows are read by response schemas with ``from_attributes`` like models.
+
+See benchmarks/bench_projections.py.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+
+from sqlalchemy import Float, Select, cast, func, literal, select
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import Comment, Publication, PublicationTagAssociation, PubImage, Role, Tag, User
+
+
+@dataclass(slots=True)
+class ImageRow:
+    current_img: str | None
+    updated_img: str | None
+    qr_code_img: str | None
+
+
+@dataclass(slots=True)
+class UserRow:
+    id: int
+    username: str
+    email: str
+    avatar: str | None
+    about: str | None
+    role: Role
+
+
+@dataclass(slots=True)
+class PublicationRow:
+    id: int
+    title: str | None
+    description: str | None
+    created_at: datetime
+    image: ImageRow | None
+    tags_name: str | None
+    average_rating: float | None
+    comment_count: int
+    user: UserRow | None = None
+
+
+@dataclass(slots=True)
+class CommentRow:
+    id: int
+    text: str
+    created_at: datetime
+    updated_at: datetime
+    user_id: int
+    publication_id: int
+    username: str
+    avatar: str | None
+
+
+_USER_COLUMNS = (User.id, User.username, User.email, User.avatar, User.about, User.role)
+
+
+def tag_names(dialect: str, separator: str = ", "):
+    """
+    Correlated subquery of names of tags of publication sorted and joined by separator, NULL if it has no tags.
+    Names are sorted, so responses and their ETags don't change between queries.
+
+    :param dialect: str: name of database dialect
+    :param separator: str: separator of names
+    :return: ScalarSelect: subquery
+    """
+    names = (select(Tag.name)
+             .join(PublicationTagAssociation, PublicationTagAssociation.tag_id == Tag.id)
+             .where(PublicationTagAssociation.publication_id == Publication.id))
+    if dialect == "postgresql":
+        aggregate = func.string_agg(Tag.name, aggregate_order_by(literal(separator), Tag.name))
+        return names.with_only_columns(aggregate).scalar_subquery()
+    # group_concat has no ORDER BY before SQLite 3.44, it keeps the order of an ordered subquery
+    names = names.order_by(Tag.name).correlate(Publication).subquery()
+    return select(func.group_concat(names.c.name, separator)).scalar_subquery()
+
+
+def select_publication_rows(dialect: str, with_user: bool = False) -> Select:
+    """
+    Query of columns of publication responses, filter and paginate it like select(Publication).
+
+    :param dialect: str: name of database dialect
+    :param with_user: bool: select owner too, for PublicationUsersResponse
+    :return: Select: query for fetch_publication_rows
+    """
+    average_rating = cast(Publication.rating_sum, Float) / func.nullif(Publication.rating_count, 0)
+    stmt = (select(Publication.id, Publication.title, Publication.description, Publication.created_at,
+                   PubImage.id.label("image_id"), PubImage.current_img, PubImage.updated_img, PubImage.qr_code_img,
+                   tag_names(dialect).label("tags_name"), average_rating.label("average_rating"),
+                   Publication.comment_count)
+            .select_from(Publication)
+            .outerjoin(PubImage, PubImage.publication_id == Publication.id))
+    if with_user:
+        stmt = (stmt.add_columns(*(column.label(f"user_{column.key}") for column in _USER_COLUMNS))
+                .join(User, User.id == Publication.user_id))
+    return stmt
+
+
+async def fetch_publication_rows(stmt: Select, db: AsyncSession, with_user: bool = False) -> list[PublicationRow]:
+    """
+    Execute query of select_publication_rows.
+
+    :param stmt: Select: query
+    :param db: AsyncSession: database session
+    :param with_user: bool: the query selects owner
+    :return: list[PublicationRow]: publications
+    """
+    publications = []
+    for row in await db.execute(stmt):
+        image = ImageRow(row.current_img, row.updated_img, row.qr_code_img) if row.image_id is not None else None
+        user = UserRow(row.user_id, row.user_username, row.user_email, row.user_avatar, row.user_about,
+                       row.user_role) if with_user else None
+        publications.append(PublicationRow(row.id, row.title, row.description, row.created_at, image,
+                                           row.tags_name, row.average_rating, row.comment_count, user))
+    return publications
+
+
+def select_comment_rows() -> Select:
+    """
+    Query of comments with username and avatar of authors, filter and paginate it like select(Comment).
+
+    :return: Select: query for fetch_comment_rows
+    """
+    return (select(Comment.id, Comment.text, Comment.created_at, Comment.updated_at, Comment.user_id,
+                   Comment.publication_id, User.username, User.avatar)
+            .join(User, User.id == Comment.user_id))
+
+
+async def fetch_comment_rows(stmt: Select, db: AsyncSession) -> list[CommentRow]:
+    """
+    Execute query of select_comment_rows.
+
+    :param stmt: Select: query
+    :param db: AsyncSession: database session
+    :return: list[CommentRow]: comments
+    """
+    return [CommentRow(*row) for row in await db.execute(stmt)]
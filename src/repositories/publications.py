@@ -1,102 +1,105 @@
-from sqlalchemy import select
+from datetime import datetime
+
+from sqlalchemy import Row, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from src.database.models import User, Publication, PubImage
+from src.repositories.loaders import DETAIL, OWNER_CHECK, publication_options
+from src.repositories.projections import fetch_publication_rows, select_publication_rows
+from src.repositories.search import refresh_search_documents
 from src.repositories.tags import create_tags
-from src.schemas.publications import PublicationCreate, PubImageSchema, PublicationUpdate
+from src.schemas.publications import PublicationCreate, PubImageSchema, PublicationUpdate, PublicationResponse
 from src.schemas.tags import TagSchema
+from src.services.read_cache import read_cache
+from src.services.tag_index import tag_index
 from src.utils.my_logger import logger
+from src.utils.pagination import Keyset
 from src.schemas.publications import PublicationCreate, PublicationUpdate
 from src.schemas.pub_images import BaseImageSchema, PubImageSchema
 
-
-async def create_pub_img(img_body: PubImageSchema, db: AsyncSession):
-    """
-    Create new pub_img in database.
-
-    :param img_body: PubImageSchema: pub_img schema to create in database
-    :param db: AsyncSession: database session to create pub_img in database
-    :return: PubImage: pub_img created in database
-
-    """
-    pub_img = PubImage(**img_body.model_dump(exclude_unset=True))
-    db.add(pub_img)
-    await db.commit()
-    await db.refresh(pub_img)
-    return pub_img
+# newest first, id breaks ties of publications created in one transaction
+publications_keyset = Keyset(Publication.created_at, Publication.id, descending=True)
 
 
-async def create_publication(body: PublicationCreate, img_body: PubImageSchema, db: AsyncSession, user: User):
+async def create_publication(body: PublicationCreate, db: AsyncSession, user: User) -> Publication:
     """
-    Create new publication in database.
+    Add new publication with its tags to the session, without image and without commit.
+    Publication gets its id by flush, so images can be moved to its folder before the single commit.
 
     :param body: PublicationCreate: publication schema to create in database
-    :param img_body: PubImageSchema: pub_img schema to create in database
     :param db: AsyncSession: database session to create publication in database
     :param user: User: user to create publication
-    :return: Publication: publication created in database
+    :return: Publication: publication flushed to database
 
     """
-    pub_img = await create_pub_img(img_body, db)
-    publication = Publication(**body.model_dump(exclude_unset=True, exclude={'tags'}), user=user, image=pub_img)
+    publication = Publication(**body.model_dump(exclude_unset=True, exclude={'tags'}), user_id=user.id)
 
     if body.tags is not None:
-        for tag in await create_tags(body.tags, db):
-            publication.tags.append(tag)
+        publication.tags = await create_tags(body.tags, db)
+        tag_index.track(db, {tag.name: 1 for tag in publication.tags})
 
     db.add(publication)
-    await db.commit()
-    await db.refresh(publication)
+    await db.flush()
+    await refresh_search_documents([publication.id], db)
 
     return publication
 
 
-async def get_user_publications(limit: int, offset: int, db: AsyncSession, user: User):
+def add_images(publication_id: int, images: dict[str, str | None], db: AsyncSession) -> None:
+    """
+    Add images of publication created by create_publication to the session, without commit.
+
+    :param publication_id: int: id of new publication
+    :param images: dict[str, str | None]: urls of images by name: current_img, updated_img
+    :param db: AsyncSession: database session
+    :return: None
+
+    """
+    db.add(PubImage(**images, publication_id=publication_id))
+
+
+async def get_user_publications(limit: int, offset: int, db: AsyncSession, user: User, cursor: str | None = None):
     """
     Get all user publications from database.
 
     :param limit: int: limit of publications to get
-    :param offset: int: offset of publications to get
+    :param offset: int: offset of publications to get, ignored if cursor is given
     :param db: AsyncSession: database session to get publications from database
     :param user: User: user to get publications
-    :return: List[Publication]: list of publications from database
+    :param cursor: str | None: cursor of page, see publications_keyset
+    :return: List[PublicationRow]: list of publications from database, projections, not models
 
     """
-    stmt = (select(Publication).filter_by(user=user)
-            .offset(offset).limit(limit)
-            .order_by(Publication.created_at.desc()))
-
-    publications = await db.execute(stmt)
+    stmt = select_publication_rows(db.get_bind().dialect.name).where(Publication.user_id == user.id)
+    return await fetch_publication_rows(publications_keyset.paginate(stmt, cursor, offset, limit), db)
 
-    return publications.unique().scalars().all()
 
-
-async def get_all_publications(limit: int, offset: int, db: AsyncSession):
+async def get_all_publications(limit: int, offset: int, db: AsyncSession, cursor: str | None = None):
     """
     Get all publications from database.
 
     :param limit: int: limit of publications to get
-    :param offset: int: offset of publications to get
+    :param offset: int: offset of publications to get, ignored if cursor is given
     :param db: AsyncSession: database session to get publications from database
-    :return: List[Publication]: list of publications from database
+    :param cursor: str | None: cursor of page, see publications_keyset
+    :return: List[PublicationRow]: list of publications with owners from database, projections, not models
 
     """
-    stmt = (select(Publication)
-            .offset(offset).limit(limit)
-            .order_by(Publication.created_at.desc()))
-
-    publications = await db.execute(stmt)
+    stmt = select_publication_rows(db.get_bind().dialect.name, with_user=True)
+    return await fetch_publication_rows(publications_keyset.paginate(stmt, cursor, offset, limit), db,
+                                        with_user=True)
 
-    return publications.unique().scalars().all()
 
-
-async def get_publication_by_id(publication_id: int, db: AsyncSession, user: User | None = None):
+async def get_publication_by_id(publication_id: int, db: AsyncSession, user: User | None = None,
+                                profile: str = DETAIL):
     """
     Get publication by id from database.
 
     :param publication_id: int: id of publication to get
     :param db: AsyncSession: database session to get publication from database
     :param user: User | None: user to get publication
+    :param profile: str: loader profile, "detail" or "owner-check" if relationships aren't needed
     :return: Publication | None: publication from database
 
     """
@@ -104,8 +107,59 @@ async def get_publication_by_id(publication_id: int, db: AsyncSession, user: Use
         stmt = select(Publication).filter_by(id=publication_id, user=user)
     else:
         stmt = select(Publication).filter_by(id=publication_id)
-    publication = await db.execute(stmt)
-    return publication.unique().scalar_one_or_none()
+    publication = await db.execute(stmt.options(*publication_options(profile)))
+    return publication.scalar_one_or_none()
+
+
+@read_cache.cached("publication", PublicationResponse | None,
+                   tags=lambda publication_id: [f"publication:{publication_id}"])
+async def get_publication(publication_id: int, db: AsyncSession):
+    """
+    Get publication by id for read-only response. Cached, the result is a schema, not the model,
+    use get_publication_by_id to change publication.
+
+    :param publication_id: int: id of publication to get
+    :param db: AsyncSession: database session to get publication from database
+    :return: PublicationResponse | None: publication
+
+    """
+    return await get_publication_by_id(publication_id, db)
+
+
+@read_cache.cached("publication_version", tuple[datetime, int, int] | None,
+                   tags=lambda publication_id: [f"publication:{publication_id}"])
+async def get_publication_version(publication_id: int, db: AsyncSession):
+    """
+    Get version of publication for validators of responses, without loading the publication. Cached.
+
+    :param publication_id: int: id of publication
+    :param db: AsyncSession: database session
+    :return: tuple[datetime, int, int] | None: updated_at, rating_count and rating_sum, None if not found
+
+    """
+    stmt = (select(Publication.updated_at, Publication.rating_count, Publication.rating_sum)
+            .where(Publication.id == publication_id))
+    return (await db.execute(stmt)).one_or_none()
+
+
+async def get_publications_versions(limit: int, offset: int, db: AsyncSession, cursor: str | None = None,
+                                    user: User | None = None) -> list[Row]:
+    """
+    Get versions of publications of page for validators of responses, without loading images and tags.
+
+    :param limit: int: limit of publications
+    :param offset: int: offset of publications, ignored if cursor is given
+    :param db: AsyncSession: database session
+    :param cursor: str | None: cursor of page, see publications_keyset
+    :param user: User | None: owner of publications, None - all publications
+    :return: list[Row]: id, updated_at, rating_count, rating_sum of publications and updated_at of owners
+
+    """
+    stmt = select(Publication.id, Publication.updated_at, Publication.rating_count, Publication.rating_sum,
+                  User.updated_at).join(Publication.user)
+    if user is not None:
+        stmt = stmt.where(Publication.user_id == user.id)
+    return (await db.execute(publications_keyset.paginate(stmt, cursor, offset, limit))).all()
 
 
 async def update_text_publication(publication_id: int, body: PublicationUpdate, db: AsyncSession, user: User):
@@ -119,12 +173,14 @@ async def update_text_publication(publication_id: int, body: PublicationUpdate,
     :return: Publication: publication updated in database
 
     """
-    publication = await get_publication_by_id(publication_id, db, user)
+    publication = await get_publication_by_id(publication_id, db, user, OWNER_CHECK)
     if publication is not None:
         for field, value in body.model_dump(exclude_unset=True).items():
             setattr(publication, field, value)
+        await db.flush()
+        await refresh_search_documents([publication_id], db)
         await db.commit()
-        await db.refresh(publication)
+        publication = await get_publication_by_id(publication_id, db)
 
     return publication
 
@@ -140,16 +196,17 @@ async def update_image(publication_id: int, body: BaseImageSchema, db: AsyncSess
     :return: Publication: publication updated in database
 
     """
-    stmt = select(Publication).filter_by(id=publication_id, user=user)
+    stmt = select(Publication).filter_by(id=publication_id, user=user).options(*publication_options(DETAIL))
     publication = await db.execute(stmt)
-    publication = publication.unique().scalar_one_or_none()
+    publication = publication.scalar_one_or_none()
 
     if publication is not None:
         for field, value in body.model_dump(exclude_unset=True).items():
             setattr(publication.image, field, value)
+        publication.updated_at = func.now()
 
         await db.commit()
-        await db.refresh(publication)
+        publication = await get_publication_by_id(publication_id, db)
 
     return publication
 
@@ -164,11 +221,15 @@ async def delete_publication(publication_id: int, db: AsyncSession, user: User):
     :return: Publication: publication deleted from database
 
     """
-    stmt = select(Publication).filter_by(id=publication_id, user=user)
+    # publication is returned after delete, comments and ratings are loaded for delete cascade
+    stmt = (select(Publication).filter_by(id=publication_id, user=user)
+            .options(*publication_options(DETAIL), selectinload(Publication.comment),
+                     selectinload(Publication.ratings)))
     publication = await db.execute(stmt)
-    publication = publication.unique().scalar_one_or_none()
+    publication = publication.scalar_one_or_none()
 
     if publication is not None:
+        tag_index.track(db, {tag.name: -1 for tag in publication.tags})
         await db.delete(publication)
         await db.commit()
 
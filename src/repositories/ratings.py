@@ -1,11 +1,17 @@
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
 
 from src.database.models import User, Publication, Rating
 from src.schemas.ratings import RatingCreate
+from src.services.principal import Principal
+from src.services.read_cache import read_cache
+from src.utils.pagination import Keyset
 
+ratings_keyset = Keyset(Rating.id)
 
-async def add_rating(publication_id: int, body: RatingCreate, db: AsyncSession, user: User):
+
+async def add_rating(publication_id: int, body: RatingCreate, db: AsyncSession, user: User | Principal):
     """
     (User) Add rating. If publication already rated, update rating. If not rated, create new rating.
 
@@ -16,42 +22,66 @@ async def add_rating(publication_id: int, body: RatingCreate, db: AsyncSession,
     :return: created rating.
 
     """
-    rating = Rating(**body.model_dump(exclude_unset=True), user=user, publication_id=publication_id)
+    rating = Rating(**body.model_dump(exclude_unset=True), user_id=user.id, publication_id=publication_id)
     db.add(rating)
+    await db.flush()
+    await update_publication_stats(publication_id, 1, rating.score, db)
     await db.commit()
     await db.refresh(rating)
     return rating
 
 
-async def get_all_ratings_by_user_id(user_id: int, db: AsyncSession, limit: int, offset: int):
+async def update_publication_stats(publication_id: int, count: int, score: int, db: AsyncSession):
+    """
+    Change rating aggregates of publication in the current transaction.
+    Increment is done by database, so concurrent ratings don't overwrite each other.
+
+    :param publication_id: id of rated publication.
+    :param count: change of rating count, 1 or -1.
+    :param score: change of rating sum.
+    :param db: database session.
+    :return: None.
+
+    """
+    stmt = (update(Publication).where(Publication.id == publication_id)
+            .values(rating_count=Publication.rating_count + count, rating_sum=Publication.rating_sum + score)
+            .execution_options(synchronize_session=False))
+    await db.execute(stmt)
+    read_cache.track(db, f"publication:{publication_id}")
+
+
+async def get_all_ratings_by_user_id(user_id: int, db: AsyncSession, limit: int, offset: int,
+                                     cursor: str | None = None):
     """
     (Admin, Moderator only) Get all ratings by user id.
 
     :param user_id: user id.
     :param db: database session.
     :param limit: limit of ratings.
-    :param offset: offset of ratings.
+    :param offset: offset of ratings, ignored if cursor is given.
+    :param cursor: cursor of page, see ratings_keyset.
     :return: list of ratings.
 
     """
-    stmt = select(Rating).filter_by(user_id=user_id).limit(limit).offset(offset)
+    stmt = ratings_keyset.paginate(select(Rating).filter_by(user_id=user_id).options(raiseload("*")),
+                                   cursor, offset, limit)
     ratings = await db.execute(stmt)
-    return ratings.unique().scalars().all()
+    return ratings.scalars().all()
 
 
-async def get_users_by_ratings(ratings: list[Rating], db: AsyncSession, limit: int, offset: int):
+async def get_users_by_publication_id(publication_id: int, db: AsyncSession, limit: int, offset: int):
     """
-    (Admin, Moderator only) Get users by ratings.
+    (Admin, Moderator only) Get users who rated publication.
 
-    :param ratings: list of ratings.
+    :param publication_id: publication id.
     :param db: database session.
     :param limit: limit of users.
     :param offset: offset of users.
     :return: list of users.
 
     """
-    stmt = (select(User).filter(User.id.in_([rating.user_id for rating in ratings]))
-            .limit(limit).offset(offset))
+    stmt = (select(User).join(Rating, Rating.user_id == User.id).filter(Rating.publication_id == publication_id)
+            .order_by(Rating.id).limit(limit).offset(offset))
     users = await db.execute(stmt)
     return users.scalars().all()
 
@@ -72,6 +102,7 @@ async def delete_rating(user_id, publication_id, db):
 
     if rating is not None:
         await db.delete(rating)
+        await update_publication_stats(publication_id, -1, -rating.score, db)
         await db.commit()
 
     return rating
@@ -0,0 +1,104 @@
+import re
+
+from sqlalchemy import Select, cast, column, delete, func, insert, literal_column, select, table, tuple_, update
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import config
+from src.database.models import Publication
+from src.repositories.loaders import LIST, publication_options
+from src.repositories.projections import tag_names
+from src.utils.pagination import decode_cursor, encode_cursor
+
+# SQLite full-text table, created with publications table, see models
+publications_fts = table("publications_fts", column("rowid"), column("title"), column("description"),
+                         column("tags"))
+
+
+def _tsvector(document, weight: str):
+    return func.setweight(func.to_tsvector(cast(config.SEARCH_CONFIG, REGCONFIG), func.coalesce(document, "")),
+                          literal_column(f"'{weight}'"))
+
+
+async def refresh_search_documents(publication_ids: list[int], db: AsyncSession) -> None:
+    """
+    Rebuild full-text documents of publications from their title, description and tags, without commit.
+    Changes of publications and their tags must be flushed before.
+
+    On Postgres the document is search_vector column with title and tags weighted above description,
+    on SQLite it is the row of publications_fts table.
+
+    :param publication_ids: list[int]: ids of changed publications
+    :param db: AsyncSession: database session
+    :return: None
+    """
+    if not publication_ids:
+        return
+    dialect = db.get_bind().dialect.name
+
+    if dialect == "postgresql":
+        vector = (_tsvector(Publication.title, "A").op("||")(_tsvector(tag_names(dialect, " "), "A"))
+                  .op("||")(_tsvector(Publication.description, "B")))
+        await db.execute(update(Publication).where(Publication.id.in_(publication_ids))
+                         .values(search_vector=vector).execution_options(synchronize_session=False))
+        return
+
+    await db.execute(delete(publications_fts).where(publications_fts.c.rowid.in_(publication_ids)))
+    await db.execute(insert(publications_fts).from_select(
+        ["rowid", "title", "description", "tags"],
+        select(Publication.id, Publication.title, Publication.description, tag_names(dialect, " "))
+        .where(Publication.id.in_(publication_ids))))
+
+
+def _search_statement(query: str, dialect: str) -> tuple[Select, object] | None:
+    if dialect == "postgresql":
+        tsquery = func.websearch_to_tsquery(cast(config.SEARCH_CONFIG, REGCONFIG), query)
+        rank = func.ts_rank(Publication.search_vector, tsquery)
+        stmt = select(Publication, rank.label("rank")).where(Publication.search_vector.op("@@")(tsquery))
+        return stmt, rank
+
+    # terms are quoted, so input can't break FTS5 query syntax; all of them must match
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return None
+    fts = literal_column("publications_fts")
+    # bm25 is lower for better match, weights of title, description and tags columns
+    rank = -func.bm25(fts, 10.0, 2.0, 10.0)
+    stmt = (select(Publication, rank.label("rank"))
+            .join(publications_fts, publications_fts.c.rowid == Publication.id)
+            .where(fts.op("MATCH")(" ".join(f'"{term}"' for term in terms))))
+    return stmt, rank
+
+
+async def search_publications(query: str, limit: int, db: AsyncSession,
+                              cursor: str | None = None) -> tuple[list[Publication], str | None]:
+    """
+    Search publications by words of title, description and tags, best matches first.
+
+    Pages continue after cursor of the last result, which keeps its rank and id:
+    ``WHERE (rank, id) < (:rank, :id)``.
+
+    :param query: str: words to search, all of them must be found
+    :param limit: int: size of page
+    :param db: AsyncSession: database session
+    :param cursor: str | None: cursor of page from the previous page
+    :return: tuple[list[Publication], str | None]: publications and cursor of the next page, None if it's the last
+    :raises HTTPException: 400 if cursor is malformed
+    """
+    search = _search_statement(query, db.get_bind().dialect.name)
+    if search is None:
+        return [], None
+    stmt, rank = search
+
+    stmt = stmt.options(*publication_options(LIST)).order_by(rank.desc(), Publication.id.desc()).limit(limit)
+    if cursor is not None:
+        after_rank, after_id = decode_cursor(cursor, (float, int))
+        stmt = stmt.where(tuple_(rank, Publication.id) < tuple_(after_rank, after_id))
+
+    rows = (await db.execute(stmt)).all()
+    publications = [publication for publication, _ in rows]
+    next_cursor = None
+    if len(rows) == limit:
+        last, last_rank = rows[-1]
+        next_cursor = encode_cursor([last_rank, last.id])
+    return publications, next_cursor
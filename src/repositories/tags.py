@@ -1,10 +1,13 @@
-from sqlalchemy import select, insert
+from sqlalchemy import select, insert, delete, func, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import IntegrityError
 
 from src.database.models import Tag, Publication, PublicationTagAssociation, User
+from src.repositories.search import refresh_search_documents
+from src.services.read_cache import read_cache
+from src.services.tag_index import tag_index
 from src.schemas.tags import TagSchema
-from src.repositories import publications as repositories_publications
 from src.utils.my_logger import logger
 
 
@@ -62,17 +65,6 @@ from src.utils.my_logger import logger
 #     for tag in await get_tags_for_publication_id(publication_id, db):
 #         await db.delete(tag)
 
-async def create_tag(tag: TagSchema, db: AsyncSession) -> Tag:
-    new_tag = Tag(**tag.model_dump(exclude_unset=True))
-    db.add(new_tag)
-    try:
-        await db.commit()
-        await db.refresh(new_tag)
-    except IntegrityError as e:
-        await db.rollback()
-    return new_tag
-
-
 # async def delete_tag_from_publication_by_name(publication_id, body, db):
 #     tag_id = await get_tag_id_by_name(body, db)
 #     stmt = select(PublicationTagAssociation).filter_by(tag_id=tag_id, publication_id=publication_id)
@@ -81,8 +73,118 @@ async def create_tag(tag: TagSchema, db: AsyncSession) -> Tag:
 #     if pub_as_tag is not None:
 #         await db.delete(pub_as_tag)
 
+
+def insert_ignore(table, db: AsyncSession):
+    """
+    INSERT ... ON CONFLICT DO NOTHING for dialect of session, PostgreSQL in production and SQLite in tests.
+
+    :param table: model or table to insert into
+    :param db: AsyncSession: database session
+    :return: Insert: statement without values
+    """
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(table).on_conflict_do_nothing()
+
+
+async def upsert_tags(names: list[str], db: AsyncSession) -> list[Tag]:
+    """
+    Create tags which don't exist yet and get all tags by names, without commit.
+    New tags are inserted by one statement, existing ones are selected only if there are any.
+
+    :param names: list[str]: names of tags
+    :param db: AsyncSession: database session
+    :return: list[Tag]: tags in order of names
+    """
+    names = list(dict.fromkeys(names))
+    if not names:
+        return []
+
+    stmt = insert_ignore(Tag, db).values([{"name": name} for name in names]).returning(Tag)
+    tags = {tag.name: tag for tag in (await db.execute(stmt)).scalars()}
+    tag_index.track(db, dict.fromkeys(tags, 0))
+    missing = [name for name in names if name not in tags]
+    if missing:
+        existing = await db.execute(select(Tag).filter(Tag.name.in_(missing)))
+        tags.update((tag.name, tag) for tag in existing.scalars())
+    return [tags[name] for name in names]
+
+
+async def attach_tags(publication_id: int, tags: list[Tag], db: AsyncSession) -> None:
+    """
+    Attach tags to publication by one statement, without commit. Already attached tags are skipped.
+
+    :param publication_id: int: id of publication
+    :param tags: list[Tag]: tags to attach
+    :param db: AsyncSession: database session
+    :return: None
+    """
+    if tags:
+        attached = await db.execute(insert_ignore(PublicationTagAssociation, db).values(
+            [{"publication_id": publication_id, "tag_id": tag.id} for tag in tags])
+            .returning(PublicationTagAssociation.tag_id))
+        attached = set(attached.scalars())
+        tag_index.track(db, {tag.name: 1 for tag in tags if tag.id in attached})
+
+
+async def tags_changed(publication_id: int, db: AsyncSession) -> None:
+    """
+    Update what depends on tags of publication after they were changed, without commit:
+    its search document, updated_at used by validators of responses and cached reads.
+
+    :param publication_id: int: id of publication
+    :param db: AsyncSession: database session
+    :return: None
+    """
+    await refresh_search_documents([publication_id], db)
+    await db.execute(update(Publication).where(Publication.id == publication_id)
+                     .values(updated_at=func.now()).execution_options(synchronize_session=False))
+    read_cache.track(db, f"publication:{publication_id}")
+
+
 async def create_tags(tags: list[TagSchema], db: AsyncSession) -> list[Tag]:
-    return [await create_tag(tag, db) for tag in tags]
+    return await upsert_tags([tag.name for tag in tags], db)
+
+
+async def add_tags_to_publication(publication_id: int, body: list[TagSchema], db: AsyncSession) -> list[str]:
+    """
+    Create tags if needed and attach them to publication in one transaction.
+
+    :param publication_id: int: id of publication
+    :param body: list[TagSchema]: tags from request body
+    :param db: AsyncSession: database session
+    :return: list[str]: names of attached tags
+    """
+    tags = await create_tags(body, db)
+    names = [tag.name for tag in tags]
+    await attach_tags(publication_id, tags, db)
+    await tags_changed(publication_id, db)
+    await db.commit()
+    return names
+
+
+async def set_publication_tags(publication_id: int, body: list[TagSchema], db: AsyncSession) -> list[str]:
+    """
+    Replace tags of publication with tags from body in one transaction.
+
+    :param publication_id: int: id of publication
+    :param body: list[TagSchema]: tags from request body
+    :param db: AsyncSession: database session
+    :return: list[str]: names of tags of publication
+    """
+    tags = await create_tags(body, db)
+    names = [tag.name for tag in tags]
+    detached = await db.execute(delete(PublicationTagAssociation).filter(
+        PublicationTagAssociation.publication_id == publication_id,
+        PublicationTagAssociation.tag_id.not_in([tag.id for tag in tags]))
+        .returning(PublicationTagAssociation.tag_id))
+    detached = list(detached.scalars())
+    if detached:
+        detached = await db.execute(select(Tag.name).filter(Tag.id.in_(detached)))
+        tag_index.track(db, dict.fromkeys(detached.scalars(), -1))
+    await attach_tags(publication_id, tags, db)
+    await tags_changed(publication_id, db)
+    await db.commit()
+    return names
 
 
 async def get_tag_by_name(body: TagSchema, db: AsyncSession):
@@ -167,19 +269,6 @@ async def get_tag_by_name(body: TagSchema, db: AsyncSession):
 #     )
 
 
-async def publication_extend_tag(publication_id: int, body: TagSchema, db: AsyncSession):
-    tag = await get_tag_by_name(body, db)
-    stmt = PublicationTagAssociation(publication_id=publication_id, tag_id=tag.id)
-    try:
-        db.add(stmt)
-
-        await db.commit()
-    except IntegrityError as e:
-        await db.rollback()
-    await db.refresh(tag)
-    return tag
-
-
 async def delete_tag_from_publication(publication_id: int, body: TagSchema, db: AsyncSession):
     tag = await get_tag_by_name(body, db)
     if tag is None:
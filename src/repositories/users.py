@@ -35,10 +35,9 @@ async def get_user_by_publication_id(publication_id: int, db: AsyncSession):
     :return: user object: user object from db
 
     """
-    pub = await db.execute(select(Publication).filter_by(id=publication_id))
-    pub = pub.unique().scalar_one_or_none()
-    user = pub.user
-    return user
+    stmt = select(User).join(Publication, Publication.user_id == User.id).filter(Publication.id == publication_id)
+    user = await db.execute(stmt)
+    return user.scalar_one_or_none()
 
 
 # admin
@@ -94,6 +93,33 @@ async def update_token(user: User, token: str | None, db: AsyncSession):
     await db.commit()
 
 
+async def update_password(user: User, password: str, db: AsyncSession) -> None:
+    """
+    Update user password hash in db table User
+
+    :param user: User: user object from db
+    :param password: str: new password hash
+    :param db: AsyncSession: database connection
+    :return: None
+
+    """
+    user.password = password
+    await db.commit()
+
+
+async def bump_token_version(user: User, db: AsyncSession) -> None:
+    """
+    Increment token version of user in db table User, access tokens issued before are revoked
+
+    :param user: User: user object from db
+    :param db: AsyncSession: database connection
+    :return: None
+
+    """
+    user.token_version = User.token_version + 1
+    await db.commit()
+
+
 async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     Update user confirmed in db table User
@@ -1,5 +1,7 @@
 import logging
-from fastapi import APIRouter, HTTPException, Depends, status, BackgroundTasks, Request
+from uuid import uuid4
+
+from fastapi import APIRouter, HTTPException, Depends, status, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -8,21 +10,27 @@ from src.messages import ACCOUNT_ALREADY_EXISTS, INVALID_EMAIL, EMAIL_NOT_CONFIR
     VERIFICATION_ERROR, EMAIL_ALREADY_CONFIRMED, EMAIL_CONFIRMED, CHECK_EMAIL, INVALID_REFRESH_TOKEN, USER_IS_BLOCK
 from src.repositories import users as repositories_users
 from src.schemas.user import UserSchema, TokenSchema, UserResponse, RequestEmail
-from src.services.email import send_email
+from src.services.email import outbox_worker, queue_verification_email
 from src.services.auth import auth_service
+from src.services.rate_limit import RateLimit, TokenBucket
+from src.services.sessions import SessionStore, get_session_store
 
 router = APIRouter(prefix='/auth', tags=['auth'])
 get_refresh_token = HTTPBearer()
 
+# bcrypt makes every attempt expensive, so bursts are small and refill slowly
+password_limit = RateLimit(TokenBucket(capacity=10, rate=10 / 60), "auth:password")
+
 
-@router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserSchema, bt: BackgroundTasks, request: Request, db: AsyncSession = Depends(get_db)):
+@router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED,
+             dependencies=[Depends(password_limit)])
+async def signup(body: UserSchema, request: Request, db: AsyncSession = Depends(get_db)):
     """
 
-    Create new user in database and send email for verification to user email address
+    Create new user in database and send email for verification to user email address.
+    Email is saved to outbox in the same transaction as user and delivered by outbox worker.
 
     :param body: UserSchema: body of request with user data
-    :param bt: BackgroundTasks: background task for sending email
     :param request: Request: request object
     :param db: AsyncSession: database session
     :return: UserSchema: created user data with token and refresh token and token type
@@ -32,19 +40,24 @@ async def signup(body: UserSchema, bt: BackgroundTasks, request: Request, db: As
     exist_user = await repositories_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=ACCOUNT_ALREADY_EXISTS)
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash_async(body.password)
+    queue_verification_email(body.email, body.username, str(request.base_url), db)
     new_user = await repositories_users.create_user(body, db)
-    bt.add_task(send_email, new_user.email, new_user.username, str(request.base_url))
+    outbox_worker.notify()
     return new_user
 
 
-@router.post("/login", response_model=TokenSchema)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
+@router.post("/login", response_model=TokenSchema, dependencies=[Depends(password_limit)])
+async def login(request: Request, body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db),
+                sessions: SessionStore = Depends(get_session_store)):
     """
-    Login user and generate JWT and refresh token for user with email and password in body
+    Login user and generate JWT and refresh token for user with email and password in body.
+    Every login opens a new refresh session, so user can stay logged in on several devices.
 
+    :param request: Request: request object
     :param body: OAuth2PasswordRequestForm: body of request with username and password
     :param db: AsyncSession: database session
+    :param sessions: SessionStore: storage of refresh sessions
     :return: TokenSchema: access token and refresh token and token type
 
     """
@@ -55,38 +68,41 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession =
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=EMAIL_NOT_CONFIRMED)
     if not user.is_active:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=USER_IS_BLOCK)
-    if not auth_service.verify_password(body.password, user.password):
+    verified, new_hash = await auth_service.verify_and_update_password_async(body.password, user.password)
+    if not verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_PASSWORD)
 
     # Generate JWT
-    access_token = await auth_service.create_access_token(data={"sub": user.email, "test": "test"})
-    refresh_token2 = await auth_service.create_refresh_token(data={"sub": user.email})
-    await repositories_users.update_token(user, refresh_token2, db)
+    sid = uuid4().hex
+    access_token = await auth_service.create_access_token(data=auth_service.access_claims(user))
+    refresh_token2 = await auth_service.create_refresh_token(data={"sub": user.email, "sid": sid})
+    await sessions.create(sid, user.email, refresh_token2, request.headers.get("user-agent"))
+    if new_hash:
+        # stored hash is weaker than current bcrypt cost, it migrates on successful login
+        await repositories_users.update_password(user, new_hash, db)
     return {"access_token": access_token, "refresh_token": refresh_token2, "token_type": "bearer"}
 
 
 @router.post("/logout", status_code=status.HTTP_200_OK)
 async def logout(credentials: HTTPAuthorizationCredentials = Depends(get_refresh_token),
-                 db: AsyncSession = Depends(get_db)):
+                 db: AsyncSession = Depends(get_db), sessions: SessionStore = Depends(get_session_store)):
     """
 
-    Logout user and revoke refresh token
+    Logout user, revoke refresh session of current device and issued access tokens
 
     :param credentials: HTTPAuthorizationCredentials: refresh token
     :param db: AsyncSession: database session
+    :param sessions: SessionStore: storage of refresh sessions
     :return: {"message": "Logged out successfully"}
 
     """
     token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await repositories_users.get_user_by_email(email, db)
-
-    if user and user.refresh_token == token:
-        user.is_active = False
-        await repositories_users.update_token(user, None, db)
-        user.is_revoked = True
-        await db.commit()
+    payload = await auth_service.decode_refresh_payload(token)
 
+    if payload.get("sid") and await sessions.revoke(payload["sid"], payload["sub"], token):
+        user = await auth_service.load_user(payload["sub"], db)
+        if user is not None:
+            await repositories_users.bump_token_version(user, db)
         return {"message": "Logged out successfully"}
     else:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_REFRESH_TOKEN)
@@ -94,27 +110,35 @@ async def logout(credentials: HTTPAuthorizationCredentials = Depends(get_refresh
 
 @router.get('/refresh_token', response_model=TokenSchema)
 async def refresh_token(credentials: HTTPAuthorizationCredentials = Depends(get_refresh_token),
-                        db: AsyncSession = Depends(get_db)):
+                        db: AsyncSession = Depends(get_db), sessions: SessionStore = Depends(get_session_store)):
     """
 
-    Generate new access token with refresh token in body
+    Generate new access token with refresh token in body.
+    Refresh token is rotated, reuse of an outdated refresh token revokes the session.
 
     :param credentials: HTTPAuthorizationCredentials: refresh token
     :param db: AsyncSession: database session
+    :param sessions: SessionStore: storage of refresh sessions
     :return: TokenSchema: access token and refresh token and token type
 
 
     """
     token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await repositories_users.get_user_by_email(email, db)
-    if user.refresh_token != token or user.is_revoked:
-        await repositories_users.update_token(user, None, db)
+    payload = await auth_service.decode_refresh_payload(token)
+    email, sid = payload["sub"], payload.get("sid")
+    if sid is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_REFRESH_TOKEN)
+
+    refresh_token2 = await auth_service.create_refresh_token(data={"sub": email, "sid": sid})
+    if not await sessions.rotate(sid, email, token, refresh_token2):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_REFRESH_TOKEN)
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token2 = await auth_service.create_refresh_token(data={"sub": email})
-    await repositories_users.update_token(user, refresh_token2, db)
+    user = await auth_service.load_user(email, db)
+    if user is None or not user.is_active:
+        await sessions.revoke_user(email)
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=INVALID_REFRESH_TOKEN)
+
+    access_token = await auth_service.create_access_token(data=auth_service.access_claims(user))
     return {"access_token": access_token, "refresh_token": refresh_token2, "token_type": "bearer"}
 
 
@@ -141,14 +165,12 @@ async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
 
 
 @router.post('/request_email')
-async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: AsyncSession = Depends(get_db)):
+async def request_email(body: RequestEmail, request: Request, db: AsyncSession = Depends(get_db)):
     """
 
     Request email for verification
 
     :param body: RequestEmail: body of request with email address
-    :param background_tasks: BackgroundTasks: background tasks for sending email
     :param request: Request: request object
     :param db: AsyncSession: database session
     :return: {"message": "Check your email"}
@@ -159,7 +181,9 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     if user.confirmed:
         return {"message": EMAIL_ALREADY_CONFIRMED}
     if user:
-        background_tasks.add_task(send_email, user.email, user.username, str(request.base_url))
+        queue_verification_email(user.email, user.username, str(request.base_url), db)
+        await db.commit()
+        outbox_worker.notify()
     return {"message": CHECK_EMAIL}
 
 
@@ -169,14 +193,16 @@ async def block_user(
     user_id: int,
     is_active: bool,
     current_user: UserResponse = Depends(auth_service.get_current_user),
-    db: AsyncSession = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    sessions: SessionStore = Depends(get_session_store)
 ):
     """
-    Block user
+    Block user. Blocked user loses all refresh sessions
 
     :param user_id: int: user id from database
     :param is_active: bool: user status
     :param db: AsyncSession: database session
+    :param sessions: SessionStore: storage of refresh sessions
     :return: {"message": "User status updated successfully"}
 
     """
@@ -189,8 +215,11 @@ async def block_user(
     if user is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
+    email = user.email
     user.is_active = is_active
     await db.commit()
+    if not is_active:
+        await sessions.revoke_user(email)
 
     return {"message": "User status updated successfully"}
 
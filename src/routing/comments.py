@@ -3,43 +3,66 @@ from typing import List
 from src.database.models import Role
 from src.messages import *
 from src.schemas.comments import *
-from src.database.db import get_db, AsyncSession
+from src.database.db import get_db, get_read_db, AsyncSession
 from src.services.auth import auth_service
+from src.services.principal import Principal
 from src.database.models import User
 from src.repositories import comments as repository_comments
+from src.services.rate_limit import RateLimit, SlidingWindow
+from src.utils.conditional import conditional, version_etag
+from src.utils.pagination import set_next_cursor
+from src.utils.responses import FastJSONResponse, json_response
 
-# from fastapi_limiter.depends import RateLimiter
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Request, Response
 
 router = APIRouter(prefix="/publications", tags=["comments"])
 
+comments_limit = RateLimit(SlidingWindow(times=100, seconds=60), "comments")
+edit_limit = RateLimit(SlidingWindow(times=10, seconds=60), "comments:edit")
+
 
 @router.get(
     "/{publication_id}/comments",
-    response_model=List[CommentModelReturned],
+    response_model=List[CommentWithAuthor],
+    response_class=FastJSONResponse,
     description="No more than 100 requests per minute",
-    dependencies=[],
-)  # Depends(RateLimiter(times=100, seconds=60))
+    dependencies=[Depends(comments_limit)],
+)
 async def read_comments(
     publication_id: int,
+    request: Request,
+    response: Response,
     skip: int = Query(0, ge=0),
     limit: int = Query(20, ge=0, le=500),
-    db: AsyncSession = Depends(get_db),
+    cursor: str | None = Query(None),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """
-    Get comments by publication id and skip and limit parameters
+    Get comments by publication id and skip and limit parameters, or by cursor.
+    Cursor of the next page is returned in X-Next-Cursor header. Conditional requests get 304
+    if comments of publication didn't change.
 
     :param publication_id: int: id of publication to get comments
-    :param skip: int: number of comments to skip from the beginning of the list
+    :param request: Request: request with conditional headers
+    :param response: Response: response to set next cursor and ETag
+    :param skip: int: number of comments to skip from the beginning of the list, ignored if cursor is given
     :param limit: int: number of comments to return from the beginning of the list
+    :param cursor: str | None: cursor of page from X-Next-Cursor header of previous page
     :param db: AsyncSession: database session
-    :return: List[CommentModelReturned]: list of comments
+    :return: List[CommentWithAuthor]: list of comments with authors
 
     """
-    comments = await repository_comments.get_comments(publication_id, skip, limit, db)
+    version = await repository_comments.get_comments_version(publication_id, db)
+    if version[0]:
+        not_modified = conditional(request, response, version_etag("comments", publication_id, *version))
+        if not_modified is not None:
+            return not_modified
+
+    comments = await repository_comments.get_comments(publication_id, skip, limit, db, cursor)
 
     if list(comments):
-        return comments
+        set_next_cursor(response, repository_comments.comments_keyset, comments, limit)
+        return json_response(List[CommentWithAuthor], comments, response)
     else:
         raise HTTPException(404, COMMENTS_NOT_FOUND)
 
@@ -48,10 +71,10 @@ async def read_comments(
     "/{publication_id}/comments/{comment_id}",
     response_model=CommentModelReturned,
     description="No more than 100 requests per minute",
-    dependencies=[],
-)  # Depends(RateLimiter(times=100, seconds=60))
+    dependencies=[Depends(comments_limit)],
+)
 async def read_comment(
-    comment_id: int, db: AsyncSession = Depends(get_db)
+    comment_id: int, db: AsyncSession = Depends(get_read_db)
 ):
     """
     Get comment by comment id
@@ -73,13 +96,13 @@ async def read_comment(
     response_model=CommentResponceAdded,
     status_code=status.HTTP_201_CREATED,
     description="No more than 100 requests per minute",
-    dependencies=[],
-)  # Depends(RateLimiter(times=100, seconds=60))
+    dependencies=[Depends(comments_limit)],
+)
 async def add_comment(
     publication_id: int,
     body: CommentModelEditing,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(auth_service.get_current_user),
+    current_user: Principal = Depends(auth_service.get_current_principal),
 ):
     """
     Add comment by publication id and body
@@ -87,7 +110,7 @@ async def add_comment(
     :param publication_id: int: id of publication to add comment
     :param body: CommentModelEditing: body of comment to add
     :param db: AsyncSession: database session
-    :param current_user: User: current user from auth service
+    :param current_user: Principal: current user from access token claims
     :return: CommentResponceAdded: comment added to publication
 
     """
@@ -105,8 +128,8 @@ async def add_comment(
     response_model=CommentResponceEdited,
     status_code=status.HTTP_202_ACCEPTED,
     description="No more than 10 requests per minute",
-    dependencies=[],
-)  # Depends(RateLimiter(times=10, seconds=60))
+    dependencies=[Depends(edit_limit)],
+)
 async def edit_comment(
     comment_id: int,
     body: CommentModelEditing,
@@ -136,8 +159,8 @@ async def edit_comment(
     # response_model=CommentResponceDeleted,
     status_code=status.HTTP_204_NO_CONTENT,
     description="No more than 10 requests per minute",
-    dependencies=[],
-)  # Depends(RateLimiter(times=10, seconds=60))
+    dependencies=[Depends(edit_limit)],
+)
 async def delete_comment(
     comment_id: int,
     db: AsyncSession = Depends(get_db),
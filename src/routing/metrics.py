@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends
+
+from src.database.models import Role
+from src.services.roles import RoleAccess
+from src.utils import metrics
+
+router = APIRouter(tags=['metrics'])
+
+access_to_route = RoleAccess([Role.admin])
+
+
+@router.get('/metrics', dependencies=[Depends(access_to_route)])
+async def read_metrics():
+    """
+    (Admin only) Get runtime metrics of caches and pools: hits, misses, sizes, etc.
+
+    :return: dict: metrics by name of group
+
+    """
+    return metrics.collect()
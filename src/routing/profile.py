@@ -5,6 +5,8 @@ from fastapi import (
     status,
     UploadFile,
     File,
+    Request,
+    Response,
 )
 
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -17,16 +19,21 @@ from src.services.auth import auth_service
 from src.conf.config import config
 from src.repositories import profile as repositories_profile
 from src.services.cloud_in_ary.cloud_image import CloudinaryService, cloud_img_service
+from src.utils.conditional import conditional, version_etag
 
 router = APIRouter(prefix="/profile", tags=["profile"])
 
 
 @router.get("/{username}", response_model=UserProfile)
-async def read_user_profile(username: str, db: AsyncSession = Depends(get_db)):
+async def read_user_profile(username: str, request: Request, response: Response,
+                            db: AsyncSession = Depends(get_db)):
     """
-    Get user profile by username and count of publications and usage days in profile
+    Get user profile by username and count of publications and usage days in profile.
+    Conditional requests get 304 if the profile didn't change.
 
     :param username: str: username of user to get profile data
+    :param request: Request: request with conditional headers
+    :param response: Response: response to set ETag
     :param db: AsyncSession: database session
     :return: UserProfile: user profile data with publications count and usage days
 
@@ -36,6 +43,10 @@ async def read_user_profile(username: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=USER_NOT_FOUND)
     quantity_publications = await repositories_profile.count_user_publications(user.id, db)
     usage_days = await repositories_profile.count_usage_days(user.created_at, db)
+    etag = version_etag("profile", user.id, user.updated_at, quantity_publications, usage_days)
+    not_modified = conditional(request, response, etag)
+    if not_modified is not None:
+        return not_modified
 
     return {"user": user, "publications_count": quantity_publications, "usage_days": usage_days}
 
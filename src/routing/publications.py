@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, File, UploadFile, Query, HTTPException
+from fastapi import APIRouter, Depends, File, UploadFile, Query, HTTPException, Request, Response
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db
 from src.database.models import User, Role
 from src.repositories import publications as repositories_publications
 from src.repositories import users as repository_users
+from src.repositories import search as repositories_search
+from src.repositories.loaders import OWNER_CHECK
 
 from src.schemas.publications import (
     PublicationCreate,
@@ -16,25 +18,34 @@ from src.schemas.publications import (
     PublicationUsersResponse
 )
 from src.schemas.pub_images import (
-    PubImageSchema,
     CurrentImageSchema,
     UpdatedImageSchema,
     QrCodeImageSchema,
     TransformationKey
 )
+from src.services.feed_pages import feed_pages
 from src.services.qr_code import generate_qr_code_byte
+from src.services.publish import publish_publication
+from src.services.rate_limit import RateLimit, SlidingWindow
 from src.services.auth import auth_service
 from src.services.cloud_in_ary.cloud_image import cloud_img_service, CloudinaryService, TRANSFORMATION_KEYS
 from src.services.cloud_in_ary.errors import CloudinaryResourceNotFoundError, CloudinaryLoadingError
 
+from src.utils.conditional import body_etag, conditional, version_etag
 from src.utils.my_logger import logger
+from src.utils.responses import FastJSONResponse, json_response
+from src.utils.pagination import NEXT_CURSOR_HEADER, set_next_cursor
 import src.messages as msg
 
 router = APIRouter(prefix='/publications', tags=['publications'])
 
+# every call goes to Cloudinary
+cloudinary_limit = RateLimit(SlidingWindow(times=20, seconds=60), "publications:cloudinary")
+
 
 ## Utilitary?
-@router.post('/upload_image', status_code=status.HTTP_201_CREATED, response_model=CurrentImageSchema)
+@router.post('/upload_image', status_code=status.HTTP_201_CREATED, response_model=CurrentImageSchema,
+             dependencies=[Depends(cloudinary_limit)])
 async def upload_image(file: UploadFile = File(), user: User = Depends(auth_service.get_current_user),
                        cloud: CloudinaryService = Depends(cloud_img_service)):
     """
@@ -57,7 +68,8 @@ async def upload_image(file: UploadFile = File(), user: User = Depends(auth_serv
 
 ## Utilitary?
 @router.post('/transform_image', status_code=status.HTTP_201_CREATED, response_model=UpdatedImageSchema,
-             description=f"Transform image keys : {', '.join(TRANSFORMATION_KEYS)}")
+             description=f"Transform image keys : {', '.join(TRANSFORMATION_KEYS)}",
+             dependencies=[Depends(cloudinary_limit)])
 async def transform_image(body: TransformationKey, user: User = Depends(auth_service.get_current_user),
                           cloud: CloudinaryService = Depends(cloud_img_service)):
     """
@@ -105,61 +117,70 @@ async def create_publication(body: PublicationCreate, db: AsyncSession = Depends
     :raises HTTPException: 400 if image not uploaded in {email}/temp/ by postfix current_img (base img)
     """
 
-    email = user.email
-
-    # check base image on existence in path {email}/temp/current_img
-    if cloud.get_cloud_id(email, "current_img") is None:
+    # publication, its images and tags are committed once, after images are moved to
+    # {email}/publications/{publication_id}; on failure nothing is created and images stay in {email}/temp
+    try:
+        publication = await publish_publication(body, db, user, cloud)
+    except CloudinaryResourceNotFoundError:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=msg.PLEASE_UPLOAD_IMAGE)
-
-    # create publication with empty PubImage, rel one_to_one in field publication.image
-    img_body = PubImageSchema(**{"current_img": "костыль", "updated_img": None, "qr_code_img": None})
-    publication = await repositories_publications.create_publication(body, img_body, db, user)
-
-    # replace temp images to folder {email}/publications/{publication_id}/postfix_name & create schemas
-    current_image_body = CurrentImageSchema(**cloud.replace_temp_to_publications(
-        email=email,
-        postfix="current_img",
-        post_id=publication.id))
-    # if None - save None in publication.image.updated_img
-    update_image_body = UpdatedImageSchema(**cloud.replace_temp_to_publications(
-        email=email,
-        postfix="updated_img",
-        post_id=publication.id))
-
-    # save images to database with in table PubImage, rel one_to_one in field publication.image
-    publication = await repositories_publications.update_image(publication.id, current_image_body, db, user)
-    publication = await repositories_publications.update_image(publication.id, update_image_body, db, user)
+    except CloudinaryLoadingError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=msg.CLOUDINARY_LOADING_ERROR)
 
     return publication
 
 
 # User/Admin, every publication
-@router.get('/get_all_publications', status_code=status.HTTP_200_OK, response_model=list[PublicationUsersResponse])
-async def get_all_publications(limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0),
-                           db: AsyncSession = Depends(get_db)):
+@router.get('/get_all_publications', status_code=status.HTTP_200_OK, response_model=list[PublicationUsersResponse],
+            response_class=FastJSONResponse)
+async def get_all_publications(request: Request, response: Response, limit: int = Query(10, ge=10, le=500),
+                               offset: int = Query(0, ge=0), cursor: str | None = Query(None),
+                               db: AsyncSession = Depends(get_read_db)):
     """
-    Get all publications
+    Get all publications, newest first. Cursor of the next page is returned in X-Next-Cursor header.
+    The first pages of default size are served from feed_pages when they are materialized.
+    Conditional requests get 304 if ETag of the page didn't change.
 
+    :param request: Request: request with conditional headers
+    :param response: Response: response to set next cursor
     :param limit: number of publications: 10
-    :param offset: offset of publications: 0
+    :param offset: offset of publications: 0, ignored if cursor is given
+    :param cursor: cursor of page from X-Next-Cursor header of previous page
     :param db: AsyncSession: database
-    :param user: current user owner of publications
     :return: publications list with PublicationUsersResponse
     """
 
-    publications = await repositories_publications.get_all_publications(limit, offset, db)
-    return publications
+    page = await feed_pages.get_page(offset, limit) if cursor is None else None
+    if page is not None:
+        body, next_cursor = page
+        headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor is not None else None
+        page_response = FastJSONResponse(body, headers=headers)
+        return conditional(request, page_response, body_etag(body)) or page_response
+
+    versions = await repositories_publications.get_publications_versions(limit, offset, db, cursor)
+    not_modified = conditional(request, response, version_etag("feed", *versions))
+    if not_modified is not None:
+        return not_modified
+
+    publications = await repositories_publications.get_all_publications(limit, offset, db, cursor)
+    set_next_cursor(response, repositories_publications.publications_keyset, publications, limit)
+    return json_response(list[PublicationUsersResponse], publications, response)
 
 
 # User-only, for current user
-@router.get('/all_my', status_code=status.HTTP_200_OK, response_model=list[PublicationResponse])
-async def get_publications(limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0),
+@router.get('/all_my', status_code=status.HTTP_200_OK, response_model=list[PublicationResponse],
+            response_class=FastJSONResponse)
+async def get_publications(request: Request, response: Response, limit: int = Query(10, ge=10, le=500),
+                           offset: int = Query(0, ge=0), cursor: str | None = Query(None),
                            db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
     """
-    Get all publications of current user
+    Get all publications of current user. Cursor of the next page is returned in X-Next-Cursor header.
+    Conditional requests get 304 if ETag of the page didn't change.
 
+    :param request: Request: request with conditional headers
+    :param response: Response: response to set next cursor
     :param limit:
-    :param offset:
+    :param offset: ignored if cursor is given
+    :param cursor: cursor of page from X-Next-Cursor header of previous page
     :param db: AsyncSession
     :param user: current user owner of publications
     :return: publications list with PublicationResponse (title, description, image)
@@ -167,27 +188,38 @@ async def get_publications(limit: int = Query(10, ge=10, le=500), offset: int =
     """
 
     logger_actor = user.email + f"({user.role})"
-    publications = await repositories_publications.get_user_publications(limit, offset, db, user)
+    versions = await repositories_publications.get_publications_versions(limit, offset, db, cursor, user)
+    if versions:
+        not_modified = conditional(request, response, version_etag("user_publications", user.id, *versions))
+        if not_modified is not None:
+            return not_modified
+
+    publications = await repositories_publications.get_user_publications(limit, offset, db, user, cursor)
 
     if len(publications) == 0:
         logger.warning(f'User {logger_actor} try get not exist publications')
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=msg.PUBLICATIONS_EMPTY)
 
     logger.info(f'User {logger_actor} get count{len(publications)} publications')
-    return publications
+    set_next_cursor(response, repositories_publications.publications_keyset, publications, limit)
+    return json_response(list[PublicationResponse], publications, response)
 
 
 # Admin-only, for 1 user
 @router.get('/get_user_publications/{user_id}', status_code=status.HTTP_200_OK,
             response_model=list[PublicationResponse])
-async def get_user_publications(user_id: int, limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0),
-                           db: AsyncSession = Depends(get_db), user: User = Depends(auth_service.get_current_user)):
+async def get_user_publications(user_id: int, response: Response, limit: int = Query(10, ge=10, le=500),
+                                offset: int = Query(0, ge=0), cursor: str | None = Query(None),
+                                db: AsyncSession = Depends(get_read_db),
+                                user: User = Depends(auth_service.get_current_user)):
     """
-    Get publications of 1 user
+    Get publications of 1 user. Cursor of the next page is returned in X-Next-Cursor header.
 
     :param user_id: id of user: 1
+    :param response: Response: response to set next cursor
     :param limit: number of publications: 10
-    :param offset: offset of publications: 0
+    :param offset: offset of publications: 0, ignored if cursor is given
+    :param cursor: cursor of page from X-Next-Cursor header of previous page
     :param db: AsyncSession: database
     :param user: current user owner of publications
     :return: publications list with PublicationResponse (title, description, image)
@@ -201,35 +233,73 @@ async def get_user_publications(user_id: int, limit: int = Query(10, ge=10, le=5
             logger.warning(f'User {logger_actor} try get not exist user {user_id}')
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=msg.USER_NOT_FOUND)
 
-        publications = await repositories_publications.get_user_publications(limit, offset, db, user)
+        publications = await repositories_publications.get_user_publications(limit, offset, db, user, cursor)
 
         if len(publications) == 0:
             logger.warning(f'User {logger_actor} try get not exist publications')
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=msg.PUBLICATIONS_EMPTY)
 
         logger.info(f'User {logger_actor} get count{len(publications)} publications')
+        set_next_cursor(response, repositories_publications.publications_keyset, publications, limit)
         return publications
 
     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=msg.FORBIDDEN)
 
 
 # for anyone
-@router.get('/{publication_id}', status_code=status.HTTP_200_OK, response_model=PublicationResponse)
-async def get_publication(publication_id: int, db: AsyncSession = Depends(get_db)):
+@router.get('/search', status_code=status.HTTP_200_OK, response_model=list[PublicationUsersResponse],
+            response_class=FastJSONResponse)
+async def search_publications(response: Response, q: str = Query(min_length=1, max_length=100),
+                              limit: int = Query(10, ge=10, le=500), cursor: str | None = Query(None),
+                              db: AsyncSession = Depends(get_read_db)):
     """
-    Get publication by id
+    Search publications by words of title, description and tags, best matches first.
+    Cursor of the next page is returned in X-Next-Cursor header.
+
+    :param response: Response: response to set next cursor
+    :param q: words to search: "cat sunset"
+    :param limit: number of publications: 10
+    :param cursor: cursor of page from X-Next-Cursor header of previous page
+    :param db: AsyncSession: database
+    :return: publications list with PublicationUsersResponse
+    :raises HTTPException: 400 if cursor is malformed
+    """
+
+    publications, next_cursor = await repositories_search.search_publications(q, limit, db, cursor)
+    if next_cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return json_response(list[PublicationUsersResponse], publications, response)
+
+
+# for anyone
+@router.get('/{publication_id}', status_code=status.HTTP_200_OK, response_model=PublicationResponse,
+            response_class=FastJSONResponse)
+async def get_publication(publication_id: int, request: Request, response: Response,
+                          db: AsyncSession = Depends(get_read_db)):
+    """
+    Get publication by id. Conditional requests get 304 if the publication didn't change.
 
     :param publication_id:
+    :param request: Request: request with conditional headers
+    :param response: Response: response to set ETag and Last-Modified
     :param db: AsyncSession
     :return: publication by PublicationResponse (title, description, image)
     :raises HTTPException: 404 if publication not exist
     """
 
-    publication = await repositories_publications.get_publication_by_id(publication_id, db)
+    version = await repositories_publications.get_publication_version(publication_id, db)
+    if version is not None:
+        updated_at, *_ = version
+        not_modified = conditional(request, response, version_etag("publication", publication_id, *version),
+                                   updated_at)
+        if not_modified is not None:
+            return not_modified
+
+    publication = await repositories_publications.get_publication(publication_id, db)
 
     if publication is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=msg.PUBLICATION_NOT_FOUND)
-    return publication
+    return json_response(PublicationResponse, publication, response)
 
 
 # Admin/User, 1 user by publication id
@@ -264,7 +334,8 @@ async def update_text_publication(publication_id: int, body: PublicationUpdate,
 
 # Admin/User, 1 publication
 @router.put("/{publication_id}/update_image", status_code=status.HTTP_200_OK, response_model=UpdatedImageSchema,
-            description=f"Transform image keys : {', '.join(TRANSFORMATION_KEYS)}")
+            description=f"Transform image keys : {', '.join(TRANSFORMATION_KEYS)}",
+            dependencies=[Depends(cloudinary_limit)])
 async def update_image(publication_id: int, body: TransformationKey, db: AsyncSession = Depends(get_db),
                        user: User = Depends(auth_service.get_current_user),
                        cloud: CloudinaryService = Depends(cloud_img_service)):
@@ -285,7 +356,7 @@ async def update_image(publication_id: int, body: TransformationKey, db: AsyncSe
     :raises HTTPException: if image not exist in cloudinary {email}/publications/{publication_id}/current_img
     """
 
-    publication = await repositories_publications.get_publication_by_id(publication_id, db, user)
+    publication = await repositories_publications.get_publication_by_id(publication_id, db, user, OWNER_CHECK)
 
     logger_actor = user.email + f'({user.role})'
 
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, Query, HTTPException
+from fastapi import APIRouter, Depends, Query, HTTPException, Response
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
@@ -7,11 +7,14 @@ from src.database.db import get_db
 from src.database.models import User, Role
 from src.repositories import publications as repositories_publications
 from src.repositories import ratings as repositories_ratings
+from src.repositories.loaders import OWNER_CHECK
 
 from src.schemas.ratings import RatingCreate, RatingResponse
 from src.schemas.user import UserResponse
 from src.services.auth import auth_service
+from src.services.principal import Principal
 from src.services.roles import RoleAccess
+from src.utils.pagination import set_next_cursor
 import src.messages as msg
 
 router = APIRouter(tags=['rating'])
@@ -22,18 +25,18 @@ access_to_route = RoleAccess([Role.admin, Role.moderator])
 @router.post('/publications/{publication_id}/rating/add', status_code=status.HTTP_201_CREATED,
              response_model=RatingResponse)
 async def add_rating(publication_id: int, body: RatingCreate, db: AsyncSession = Depends(get_db),
-                     user: User = Depends(auth_service.get_current_user)):
+                     user: Principal = Depends(auth_service.get_current_principal)):
     """
     Add rating to publication by user if not exists else update rating by user if exists
 
     :param publication_id: int: id of publication to add rating
     :param body: RatingCreate: rating data to add or update by user if exists in database
     :param db: AsyncSession: database session
-    :param user: User: current user
+    :param user: Principal: current user from access token claims
     :return: RatingResponse: rating data with user data
 
     """
-    publication = await repositories_publications.get_publication_by_id(publication_id, db)
+    publication = await repositories_publications.get_publication_by_id(publication_id, db, profile=OWNER_CHECK)
     if publication is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=msg.PUBLICATION_NOT_FOUND)
 
@@ -67,30 +70,35 @@ async def get_users_ratings_by_publication_id(publication_id: int, db: AsyncSess
     if user.role != Role.user:
         user = None
 
-    publication = await repositories_publications.get_publication_by_id(publication_id, db, user)
+    publication = await repositories_publications.get_publication_by_id(publication_id, db, user, OWNER_CHECK)
     if publication is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=msg.PUBLICATION_NOT_FOUND)
 
-    users = await repositories_ratings.get_users_by_ratings(publication.ratings, db, limit, offset)
+    users = await repositories_ratings.get_users_by_publication_id(publication_id, db, limit, offset)
     return users
 
 
 # admin, moderator only
 @router.get('/admin/users/{user_id}/ratings', status_code=status.HTTP_200_OK, response_model=list[RatingResponse],
             dependencies=[Depends(access_to_route)])
-async def get_user_ratings(user_id: int, db: AsyncSession = Depends(get_db),
+async def get_user_ratings(user_id: int, response: Response, db: AsyncSession = Depends(get_db),
                            limit: int = Query(10, ge=10, le=500), offset: int = Query(0, ge=0),
-                           user: User = Depends(auth_service.get_current_user)):
+                           cursor: str | None = Query(None),
+                           user: Principal = Depends(auth_service.get_current_principal)):
     """
     Get all ratings by user id
 
     :param user_id: int: id of user to get ratings
+    :param response: Response: response to set next cursor in X-Next-Cursor header
     :param db: AsyncSession: database session
     :param limit: int: limit of ratings
+    :param offset: int: offset of ratings, ignored if cursor is given
+    :param cursor: str | None: cursor of page from X-Next-Cursor header of previous page
 
     """
 
-    ratings = await repositories_ratings.get_all_ratings_by_user_id(user_id, db, limit, offset)
+    ratings = await repositories_ratings.get_all_ratings_by_user_id(user_id, db, limit, offset, cursor)
+    set_next_cursor(response, repositories_ratings.ratings_keyset, ratings, limit)
     return ratings
 
 
@@ -98,14 +106,14 @@ async def get_user_ratings(user_id: int, db: AsyncSession = Depends(get_db),
 @router.delete('/publications/{publication_id}/ratings/{user_id}/delete', status_code=status.HTTP_204_NO_CONTENT,
                dependencies=[Depends(access_to_route)])
 async def delete_rating(user_id: int, publication_id: int, db: AsyncSession = Depends(get_db),
-                        user: User = Depends(auth_service.get_current_user)):
+                        user: Principal = Depends(auth_service.get_current_principal)):
     """
     Delete rating by user id and publication id
 
     :param user_id: int: id of user to delete rating
     :param publication_id: int: id of publication to delete rating
     :param db: AsyncSession: database session
-    :param user: User: current user
+    :param user: Principal: current user from access token claims
     :return: None
 
     """
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
@@ -6,11 +6,26 @@ from src.database.db import get_db
 from src.database.models import User
 from src.repositories import tags as repositories_tags
 from src.repositories import publications as repositories_publications
+from src.repositories.loaders import OWNER_CHECK
 from src.services.auth import auth_service
-from src.schemas.tags import TagSchema, TagsDetailResponse
+from src.services.tag_index import tag_index
+from src.schemas.tags import TagSchema, TagsDetailResponse, TagsListResponse, TagSuggestion
 import src.messages as msg
 
 router = APIRouter(prefix='/publications', tags=['tags'])
+suggest_router = APIRouter(prefix='/tags', tags=['tags'])
+
+
+@suggest_router.get('/suggest', response_model=list[TagSuggestion])
+async def suggest_tags(prefix: str = Query(min_length=1, max_length=15), limit: int = Query(10, ge=1, le=50)):
+    """
+    Autocomplete of tag names, most used tags first. Served from in-process index, without database.
+
+    :param prefix: beginning of tag name, case-insensitive: "ca"
+    :param limit: number of suggestions: 10
+    :return: list of tags with numbers of their publications
+    """
+    return [{"name": name, "publications": count} for name, count in tag_index.suggest(prefix, limit)]
 
 
 @router.post('/{publication_id}/tags', status_code=status.HTTP_201_CREATED, response_model=TagsDetailResponse,
@@ -35,11 +50,38 @@ async def add_tag_to_publication(publication_id: int, body: TagSchema, db: Async
     if body.name in [tag.name for tag in publication.tags]:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=msg.TAG_ALREADY_EXISTS)
 
-    tag = await repositories_tags.create_tag(body, db)
-    tag = await repositories_tags.publication_extend_tag(publication_id, body, db)
+    await repositories_tags.add_tags_to_publication(publication_id, [body], db)
+    return {
+        "detail": msg.TAG_ASSOCIATION_ADDED + f"{publication_id}",
+        "tag": body
+    }
+
+
+@router.put('/{publication_id}/tags', response_model=TagsListResponse,
+            description='Replace tags of pub by id with list of tags')
+async def set_tags_of_publication(publication_id: int, body: list[TagSchema], db: AsyncSession = Depends(get_db),
+                                  user: User = Depends(auth_service.get_current_user)):
+    """
+    Replace tags of pub by id with tags from request body. Missing tags are created,
+    tags not in the list are detached.
+
+    :param publication_id: id of publication: int from request body
+    :param body: list of tags, no more than 5
+    :param db: database session: AsyncSession
+    :param user: current user owner of publication
+    :return: tags of publication
+
+    """
+    publication = await repositories_publications.get_publication_by_id(publication_id, db, user, OWNER_CHECK)
+    if publication is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=msg.PUBLICATION_NOT_FOUND)
+    if len({tag.name for tag in body}) > 5:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=msg.TAGS_LIMIT_EXCEEDED)
+
+    names = await repositories_tags.set_publication_tags(publication_id, body, db)
     return {
         "detail": msg.TAG_ASSOCIATION_ADDED + f"{publication_id}",
-        "tag": tag
+        "tags": [{"name": name} for name in names]
     }
 
 
@@ -48,7 +90,7 @@ async def add_tag_to_publication(publication_id: int, body: TagSchema, db: Async
 async def delete_tag_from_publication(publication_id: int, body: TagSchema, db: AsyncSession = Depends(get_db),
                                       user: User = Depends(auth_service.get_current_user)):
   
-    publication = await repositories_publications.get_publication_by_id(publication_id, db, user)
+    publication = await repositories_publications.get_publication_by_id(publication_id, db, user, OWNER_CHECK)
     if publication is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=msg.PUBLICATION_NOT_FOUND)
     association = await repositories_tags.delete_tag_from_publication(publication_id, body, db)
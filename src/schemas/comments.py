@@ -22,6 +22,11 @@ class CommentModelReturned(CommentModel):
     publication_id: int
 
 
+class CommentWithAuthor(CommentModelReturned):
+    username: str
+    avatar: str | None = None
+
+
 class CommentResponceAdded(BaseModel):
     comment: CommentModelReturned
     detail: str = messages.COMMENT_SUCCESSFULLY_ADDED
@@ -33,6 +33,7 @@ class PublicationResponse(PublicationSchema):
     image: PubImageSchema
     tags_name: Optional[str]
     average_rating: Optional[float]
+    comment_count: int = 0
 
     class Config:
         from_attributes = True
@@ -8,3 +8,13 @@ class TagSchema(BaseModel):
 class TagsDetailResponse(BaseModel):
     detail: str
     tag: TagSchema
+
+
+class TagsListResponse(BaseModel):
+    detail: str
+    tags: list[TagSchema]
+
+
+class TagSuggestion(BaseModel):
+    name: str
+    publications: int
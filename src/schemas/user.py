@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Optional
 from pydantic import BaseModel, EmailStr, Field
 from src.database.models import Role
@@ -30,6 +31,20 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 
+class UserPublic(BaseModel):
+    id: int
+    username: str
+    email: str
+    avatar: Optional[str] = None
+    about: Optional[str] = None
+    role: Optional[Role] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+
 class UserProfile(BaseModel):
     user: UserResponse
     publications_count: int
@@ -1,22 +1,49 @@
+import hashlib
+import time
 from datetime import datetime, timedelta
 from typing import Optional
+from uuid import uuid4
 
 from fastapi import Depends, HTTPException, status
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
 from jose import JWTError, jwt # noqa
 
 from src.database.db import get_db
+from src.database.models import Role, User
 from src.repositories import users as repository_users
+from src.services.principal import Principal
+from src.services.principal_cache import principal_cache, token_versions
+from src.services import hashing
 from src.conf.config import config
 from src.messages import INVALID_SCOPES, NOT_VALID_CREDENTIALS, INVALID_TOKEN
+from src.utils import metrics
+from src.utils.ttl_cache import TTLCache
 
 
 class Auth:
-    pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    pwd_context = hashing.pwd_context
     SECRET_KEY = config.SECRET_KEY_JWT
     ALGORITHM = config.ALGORITHM_JWT
+    decoded_tokens = TTLCache(maxsize=config.JWT_CACHE_SIZE)
+
+    def decode_token(self, token: str) -> dict:
+        """
+        Decode and verify JWT. Verified payloads are memoized by token digest until token expires,
+        so a bearer token reused for many requests is verified once.
+
+        :param token: encoded JWT
+        :return: payload of token
+        :raise JWTError: if token is invalid or expired
+
+        """
+        key = hashlib.sha256(token.encode()).digest()
+        payload = self.decoded_tokens.get(key)
+        if payload is None:
+            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            if isinstance(payload.get("exp"), (int, float)):
+                self.decoded_tokens.set(key, payload, ttl=payload["exp"] - time.time())
+        return dict(payload)
 
     def verify_password(self, plain_password, hashed_password):
         """
@@ -37,10 +64,58 @@ class Auth:
         :return: hashed password
 
         """
-        return self.pwd_context.hash(password)
+        return hashing.hash_password(password, hashing.hashing_pool.rounds)
+
+    async def verify_password_async(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Verify password in hashing pool, so bcrypt doesn't block event loop.
+
+        :param plain_password: plain text password from request body
+        :param hashed_password: hashed password from database
+        :return: True if password is correct else False
+        :raise HTTPException: 503 if hashing pool is saturated
+
+        """
+        return await hashing.hashing_pool.run(hashing.verify_password, plain_password, hashed_password)
+
+    async def verify_and_update_password_async(self, plain_password: str,
+                                               hashed_password: str) -> tuple[bool, str | None]:
+        """
+        Verify password in hashing pool and rehash it, if stored hash is weaker than current bcrypt cost.
+
+        :param plain_password: plain text password from request body
+        :param hashed_password: hashed password from database
+        :return: True if password is correct else False, and new hash to store or None
+        :raise HTTPException: 503 if hashing pool is saturated
+
+        """
+        return await hashing.hashing_pool.run(hashing.verify_and_update, plain_password, hashed_password,
+                                              hashing.hashing_pool.rounds)
+
+    async def get_password_hash_async(self, password: str) -> str:
+        """
+        Hash password in hashing pool, so bcrypt doesn't block event loop.
+
+        :param password: plain text password from request body
+        :return: hashed password
+        :raise HTTPException: 503 if hashing pool is saturated
+
+        """
+        return await hashing.hashing_pool.run(hashing.hash_password, password, hashing.hashing_pool.rounds)
 
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/login")
 
+    @staticmethod
+    def access_claims(user: User) -> dict:
+        """
+        Get claims of access token for user: subject, id, role and token version.
+
+        :param user: User: user from database
+        :return: dict: claims for create_access_token
+
+        """
+        return {"sub": user.email, "uid": user.id, "role": user.role.value, "ver": user.token_version}
+
     # define a function to generate a new access token
     async def create_access_token(
             self, data: dict, expires_delta: Optional[float] = None
@@ -82,75 +157,137 @@ class Auth:
         if expires_delta:
             expire = datetime.utcnow() + timedelta(seconds=expires_delta)
         else:
-            expire = datetime.utcnow() + timedelta(days=7)
+            expire = datetime.utcnow() + timedelta(seconds=config.REFRESH_TOKEN_TTL)
         to_encode.update(
-            {"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"}
+            {"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token", "jti": uuid4().hex}
         )
         encoded_refresh_token = jwt.encode(
             to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM
         )
         return encoded_refresh_token
 
-    async def decode_refresh_token(self, refresh_token: str):
+    async def decode_refresh_payload(self, refresh_token: str) -> dict:
         """
-        Decode refresh token.
+        Decode refresh token and check its scope.
 
         :param refresh_token: refresh token from request body
-        :return: email from refresh token
+        :return: payload of refresh token: sub (email), sid (session id), etc.
 
         """
         try:
-            payload = jwt.decode(
-                refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM]
-            )
-            if payload["scope"] == "refresh_token":
-                email = payload["sub"]
-                return email
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail=INVALID_SCOPES,
-            )
+            payload = self.decode_token(refresh_token)
         except JWTError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail=NOT_VALID_CREDENTIALS,
             )
+        if payload.get("scope") == "refresh_token":
+            return payload
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=INVALID_SCOPES,
+        )
 
-    async def get_current_user(
-            self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
-    ):
+    async def decode_refresh_token(self, refresh_token: str):
         """
-        Get current user.
+        Decode refresh token.
 
-        :param token: access token from request body: str
-        :param db: database session: AsyncSession
-        :return: current user: User
+        :param refresh_token: refresh token from request body
+        :return: email from refresh token
 
         """
-        credentials_exception = HTTPException(
+        payload = await self.decode_refresh_payload(refresh_token)
+        return payload["sub"]
+
+    def _credentials_exception(self) -> HTTPException:
+        return HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=NOT_VALID_CREDENTIALS,
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    def decode_access_token(self, token: str) -> dict:
+        """
+        Decode access token and check its scope.
+
+        :param token: access token from request header: str
+        :return: payload of access token
+        :raise HTTPException: 401 if token is invalid
+
+        """
+        credentials_exception = self._credentials_exception()
+
         try:
             # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(token)
             if payload["scope"] == "access_token":
-                email = payload["sub"]
-                if email is None:
+                if payload.get("sub") is None:
                     raise credentials_exception
             else:
                 raise credentials_exception
         except JWTError:
             raise credentials_exception
+        return payload
+
+    async def load_user(self, email: str, db: AsyncSession) -> User | None:
+        """
+        Get user by email from principal cache, load it from database on cache miss.
+
+        :param email: email of user: str
+        :param db: database session: AsyncSession
+        :return: user or None if not exists: User | None
 
-        user = await repository_users.get_user_by_email(email, db)
+        """
+        user = await principal_cache.get(email, db)
         if user is None:
-            raise credentials_exception
+            user = await repository_users.get_user_by_email(email, db)
+            if user is not None:
+                await principal_cache.set(user)
+        return user
+
+    async def get_current_user(
+            self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+    ):
+        """
+        Get current user.
+
+        :param token: access token from request body: str
+        :param db: database session: AsyncSession
+        :return: current user: User
+
+        """
+        payload = self.decode_access_token(token)
+
+        user = await self.load_user(payload["sub"], db)
+        if user is None or payload.get("ver", user.token_version) != user.token_version:
+            raise self._credentials_exception()
 
         return user
 
+    async def get_current_principal(
+            self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+    ) -> Principal:
+        """
+        Get current caller from access token claims. Token version is checked against cached version map,
+        so blocked users, logged out and changed role tokens are rejected without loading the user.
+        Tokens issued without claims fall back to get_current_user.
+
+        :param token: access token from request body: str
+        :param db: database session: AsyncSession
+        :return: current caller: Principal
+
+        """
+        payload = self.decode_access_token(token)
+        if not {"uid", "role", "ver"} <= payload.keys():
+            user = await self.get_current_user(token, db)
+            return Principal(id=user.id, email=user.email, role=user.role, is_active=bool(user.is_active))
+
+        state = await token_versions.get(payload["uid"], db)
+        if state is None or state != (payload["ver"], True):
+            raise self._credentials_exception()
+
+        return Principal(id=payload["uid"], email=payload["sub"], role=Role(payload["role"]))
+
     def create_email_token(self, data: dict):
         """
         Create email token.
@@ -174,7 +311,7 @@ class Auth:
 
         """
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.decode_token(token)
             email = payload["sub"]
             return email
         except JWTError:
@@ -185,3 +322,4 @@ class Auth:
             )
 
 auth_service = Auth()
+metrics.register("jwt_decode_cache", auth_service.decoded_tokens.stats)
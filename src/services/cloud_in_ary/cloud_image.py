@@ -147,6 +147,19 @@ class CloudinaryService:
 
         return {postfix: result['secure_url']}
 
+    def restore_temp(self, email: str, postfix: str, post_id: int) -> None:
+        """
+        Move image back from {email}/publications/{publication_id} to {email}/temp,
+        undo of replace_temp_to_publications if publication wasn't created
+        :param email: user email main folder in cloudinary
+        :param postfix: name of image in cloudinary
+        :param post_id: publication id also folder in cloudinary
+        :return: None
+        """
+        from_public_id = f"{email}/{self.per_folder.publications.name}/{post_id}/{postfix}"
+        to_public_id = f"{email}/{self.per_folder.temp.name}/{postfix}"
+        rename(from_public_id=from_public_id, to_public_id=to_public_id, overwrite=True)
+
     def delete_by_email(self, email: str, post_id: int, folder: str, postfixes: list[str]) -> None:
         """
         Delete image from cloudinary
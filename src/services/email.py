@@ -1,46 +1,269 @@
+import asyncio
+import contextlib
+from email.message import EmailMessage
+from email.utils import formataddr
 from pathlib import Path
+from typing import Any, AsyncContextManager, Callable
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+import aiosmtplib
+from jinja2 import Environment, FileSystemLoader, select_autoescape
 from pydantic import EmailStr
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from src.services.auth import auth_service
 from src.conf.config import config
+from src.database.db import sessionmanager
+from src.database.models import EmailOutbox
+from src.repositories import email_outbox as repository_outbox
+from src.services.auth import auth_service
+from src.utils import metrics
+from src.utils.my_logger import logger
+
+TEMPLATE_FOLDER = Path(__file__).parent / 'templates'
+MAIL_FROM_NAME = "Picture Sharing Systems"
+
+templates = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape(), auto_reload=False)
+# compile templates once at import, rendering reuses compiled code
+for template_name in ("verify_email.html",):
+    templates.get_template(template_name)
+
+
+def render_email(email: EmailOutbox) -> EmailMessage:
+    """
+    Build html message of outbox email.
+
+    :param email: EmailOutbox: email from outbox
+    :return: EmailMessage: message ready to send
+
+    """
+    message = EmailMessage()
+    message["From"] = formataddr((MAIL_FROM_NAME, config.MAIL_FROM))
+    message["To"] = email.recipient
+    message["Subject"] = email.subject
+    message.set_content(templates.get_template(email.template).render(**email.context), subtype="html")
+    return message
+
+
+def is_permanent_error(err: Exception) -> bool:
+    """
+    SMTP 5xx replies mean message will never be accepted, so it isn't retried.
+
+    :param err: Exception: error of sending
+    :return: bool: True if error is permanent
+
+    """
+    if isinstance(err, aiosmtplib.SMTPRecipientsRefused):
+        return all(recipient.code >= 500 for recipient in err.recipients)
+    if isinstance(err, aiosmtplib.SMTPResponseException):
+        return err.code >= 500
+    return False
+
+
+class SMTPPool:
+    """
+    Pool of persistent SMTP connections. Connections are opened on first use and kept between messages,
+    a connection closed by server is reopened once before the send fails.
+    """
+
+    def __init__(self, size: int, **smtp_params: Any):
+        """
+        :param size: int: number of connections
+        :param smtp_params: Any: parameters of aiosmtplib.SMTP: hostname, port, username, password, use_tls, etc.
+
+        """
+        self.size = size
+        self.smtp_params = smtp_params
+        self._idle: asyncio.Queue | None = None
+
+    @property
+    def idle(self) -> asyncio.Queue:
+        if self._idle is None:
+            self._idle = asyncio.Queue()
+            for _ in range(self.size):
+                self._idle.put_nowait(aiosmtplib.SMTP(**self.smtp_params))
+        return self._idle
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        client = await self.idle.get()
+        try:
+            if not client.is_connected:
+                await client.connect()
+            yield client
+        except aiosmtplib.SMTPException as err:
+            # connection state is unknown after timeout or protocol error, it's reopened on next use
+            if not isinstance(err, aiosmtplib.SMTPResponseException) and client.is_connected:
+                client.close()
+            raise
+        finally:
+            self.idle.put_nowait(client)
+
+    async def send(self, message: EmailMessage) -> None:
+        """
+        Send message on pooled connection.
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=config.MAIL_USERNAME,
-    MAIL_PASSWORD=config.MAIL_PASSWORD,
-    MAIL_FROM=config.MAIL_USERNAME,
-    MAIL_PORT=config.MAIL_PORT,
-    MAIL_SERVER=config.MAIL_SERVER,
-    MAIL_FROM_NAME="Picture Sharing Systems",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
+        :param message: EmailMessage: message to send
+        :return: None
+        :raise aiosmtplib.SMTPException: if message isn't sent
+
+        """
+        async with self.connection() as client:
+            try:
+                await client.send_message(message)
+            except aiosmtplib.SMTPServerDisconnected:
+                await client.connect()
+                await client.send_message(message)
+
+    async def close(self) -> None:
+        if self._idle is None:
+            return
+        while not self._idle.empty():
+            client = self._idle.get_nowait()
+            if client.is_connected:
+                with contextlib.suppress(aiosmtplib.SMTPException):
+                    await client.quit()
+        self._idle = None
+
+
+class OutboxWorker:
+    """
+    Deliver emails from outbox table. Due emails are claimed in batches and sent concurrently on SMTP pool,
+    failed ones are retried with exponential backoff until ``max_attempts``.
+    """
+
+    def __init__(self, pool: SMTPPool, session_factory: Callable[[], AsyncContextManager[AsyncSession]],
+                 batch_size: int = 20, poll_interval: float = 5, max_attempts: int = 5, retry_base: float = 30):
+        """
+        :param pool: SMTPPool: SMTP connections
+        :param session_factory: Callable: returns async context manager of database session
+        :param batch_size: int: maximum of emails claimed at once
+        :param poll_interval: float: seconds between polls of outbox when it's empty
+        :param max_attempts: int: attempts before email is failed for good
+        :param retry_base: float: delay before second attempt in seconds, it doubles every attempt
+
+        """
+        self.pool = pool
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.sent = 0
+        self.retried = 0
+        self.failed = 0
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    def notify(self) -> None:
+        """
+        Wake up worker, so email committed to outbox is sent without waiting for next poll.
+        """
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def run_once(self) -> int:
+        """
+        Claim and send one batch of due emails.
+
+        :return: int: number of processed emails
+        """
+        lease = self.pool.smtp_params.get("timeout", 60) * 2
+        async with self.session_factory() as db:
+            emails = await repository_outbox.claim_emails(self.batch_size, lease, db)
+        if not emails:
+            return 0
+
+        results = await asyncio.gather(*(self.pool.send(render_email(email)) for email in emails),
+                                        return_exceptions=True)
+
+        async with self.session_factory() as db:
+            await repository_outbox.mark_sent([email.id for email, err in zip(emails, results) if err is None], db)
+            for email, err in zip(emails, results):
+                if err is None:
+                    self.sent += 1
+                    continue
+                logger.warning(f"email {email.id} to {email.recipient} attempt {email.attempts} failed: {err}")
+                if is_permanent_error(err) or email.attempts >= self.max_attempts:
+                    self.failed += 1
+                    await repository_outbox.mark_failed(email.id, str(err), None, db)
+                else:
+                    self.retried += 1
+                    await repository_outbox.mark_failed(email.id, str(err),
+                                                        self.retry_base * 2 ** (email.attempts - 1), db)
+        return len(emails)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.run_once()
+            except Exception as err:
+                logger.error(f"email outbox worker: {err}")
+                processed = 0
+            if processed < self.batch_size:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                self._wakeup.clear()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._task
+            self._task = None
+            self._wakeup = None
+        await self.pool.close()
+
+    def stats(self) -> dict[str, int]:
+        return {"sent": self.sent, "retried": self.retried, "failed": self.failed}
+
+
+smtp_pool = SMTPPool(
+    size=config.MAIL_POOL_SIZE,
+    hostname=config.MAIL_SERVER,
+    port=config.MAIL_PORT,
+    username=config.MAIL_USERNAME,
+    password=config.MAIL_PASSWORD,
+    use_tls=config.MAIL_SSL_TLS,
+    start_tls=config.MAIL_STARTTLS,
 )
+outbox_worker = OutboxWorker(smtp_pool, sessionmanager.session, batch_size=config.MAIL_BATCH_SIZE,
+                             max_attempts=config.MAIL_MAX_ATTEMPTS, retry_base=config.MAIL_RETRY_BASE)
+metrics.register("email_outbox", outbox_worker.stats)
 
 
-async def send_email(email: EmailStr, username: str, host: str):
+def queue_verification_email(email: EmailStr, username: str, host: str, db: AsyncSession) -> None:
     """
-    Send email to user.
+    Add verification email to outbox. It's saved by the caller's commit and sent by outbox worker.
+
     :param email: user email: user email from request body
     :param username: user name: user name from request body
     :param host: host url: host url from request body
+    :param db: AsyncSession: database session
     :return: None
 
     """
+    token_verification = auth_service.create_email_token({"sub": email})
+    repository_outbox.add_email(
+        recipient=email,
+        subject="Confirm your email",
+        template="verify_email.html",
+        context={"host": host, "username": username, "token": token_verification},
+        db=db,
+    )
+
+
+async def main():
+    outbox_worker.start()
     try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="verify_email.html")
-    except ConnectionErrors as err:
-        print(err)
+        await asyncio.Event().wait()
+    finally:
+        await outbox_worker.stop()
+
+
+if __name__ == '__main__':
+    # run outbox worker in its own process: python -m src.services.email (with MAIL_WORKER_IN_APP=false for app)
+    asyncio.run(main())
@@ -0,0 +1,232 @@
+import asyncio
+from collections import Counter
+from typing import Iterable
+
+from pydantic import TypeAdapter
+from redis.exceptions import RedisError
+from sqlalchemy import select
+
+from src.conf.config import config
+from src.database.models import Publication
+from src.dependency import get_async_cache
+from src.repositories.projections import fetch_publication_rows, select_publication_rows
+from src.repositories.publications import publications_keyset
+from src.schemas.publications import PublicationUsersResponse
+from src.services.read_cache import read_cache
+from src.utils import metrics
+from src.utils.my_logger import logger
+
+
+class FeedPages:
+    """
+    The first pages of the global feed, materialized in Redis as ready JSON of PublicationUsersResponse lists.
+
+    A page request without cursor and with the page size is served by one HMGET of the page and its
+    next cursor. Keys:
+    - ``feed:pages``: hash of page number to JSON array and ``{number}:cursor`` to cursor of the next page;
+    - ``feed:items``: hash of publication id to its JSON, items of the pages;
+    - ``feed:changed``: set of changed publications (``p:{id}``) and users (``u:{id}``);
+    - ``feed:lock``: held by the worker which rebuilds pages.
+
+    Publications and users changed by a commit are added to ``feed:changed`` and the pages are rebuilt
+    in background: ids of the feed head are selected, only new and changed items are loaded and
+    serialized again, and pages are composed from the JSON of items and replaced in one transaction.
+    Changes made while another worker rebuilds are picked up by that worker before it releases the lock.
+    """
+    prefix = "feed:"
+
+    def __init__(self, redis=None, pages: int = 5, page_size: int = 10, ttl: int = 3600,
+                 lock_timeout: float = 30.0):
+        """
+        :param redis: redis.asyncio.Redis | None: storage of pages, None disables them
+        :param pages: int: number of materialized pages
+        :param page_size: int: number of publications in page, other limits are read from database
+        :param ttl: int: seconds to keep pages, they are rebuilt on the next request after that
+        :param lock_timeout: float: seconds after which lock of crashed rebuild expires
+
+        """
+        self.redis = redis
+        self.pages = pages
+        self.page_size = page_size
+        self.ttl = ttl
+        self.lock_timeout = lock_timeout
+        self.adapter = TypeAdapter(PublicationUsersResponse)
+        self._sessions = None
+        self._tasks: set[asyncio.Task] = set()
+        self.counters = Counter()
+
+    def page_number(self, offset: int, limit: int) -> int | None:
+        """
+        Get number of materialized page.
+
+        :param offset: int: offset of page
+        :param limit: int: size of page
+        :return: int | None: number of page, None if the page isn't materialized
+        """
+        if self.redis is None or limit != self.page_size or offset % self.page_size:
+            return None
+        number = offset // self.page_size
+        return number if number < self.pages else None
+
+    async def get_page(self, offset: int, limit: int) -> tuple[bytes, str | None] | None:
+        """
+        Get materialized page.
+
+        :param offset: int: offset of page
+        :param limit: int: size of page
+        :return: tuple[bytes, str | None] | None: JSON of page and cursor of the next one,
+            None if the page must be read from database
+        """
+        number = self.page_number(offset, limit)
+        if number is None:
+            return None
+        try:
+            body, cursor = await self.redis.hmget(self.prefix + "pages", str(number), f"{number}:cursor")
+        except RedisError as err:
+            logger.warning(f"feed pages get failed: {err}")
+            return None
+        if body is None:
+            self.counters["misses"] += 1
+            self.refresh()
+            return None
+        self.counters["hits"] += 1
+        return body, cursor.decode() if cursor is not None else None
+
+    def changed(self, tags: Iterable[str]) -> None:
+        """
+        Refresh pages after invalidation of read cache, see ReadCache.subscribe.
+
+        :param tags: Iterable[str]: invalidated tags
+        :return: None
+        """
+        members = []
+        for tag in tags:
+            kind, _, value = tag.partition(":")
+            if kind == "publication":
+                members.append(f"p:{value}")
+            elif kind == "user":
+                members.append(f"u:{value}")
+        if members:
+            self.refresh(*members)
+
+    def refresh(self, *members: str) -> None:
+        """
+        Rebuild pages in background.
+
+        :param members: str: changed publications ``p:{id}`` and users ``u:{id}``
+        :return: None
+        """
+        if self.redis is None or self._sessions is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self._refresh(members))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refresh(self, members: tuple[str, ...]) -> None:
+        changed, lock = self.prefix + "changed", self.prefix + "lock"
+        try:
+            if members:
+                await self.redis.sadd(changed, *members)
+            while await self.redis.set(lock, 1, nx=True, px=int(self.lock_timeout * 1000)):
+                try:
+                    async with self.redis.pipeline(transaction=True) as pipe:
+                        pipe.smembers(changed)
+                        pipe.delete(changed)
+                        changes, _ = await pipe.execute()
+                    changes = {member.decode() for member in changes}
+                    rebuilt = await self.rebuild(changes)
+                    if not rebuilt and changes:
+                        await self.redis.sadd(changed, *changes)
+                finally:
+                    await self.redis.delete(lock)
+                if not rebuilt:
+                    break
+                # changes added after they were taken, their workers didn't get the lock
+                if not await self.redis.scard(changed):
+                    break
+        except RedisError as err:
+            logger.warning(f"feed pages refresh failed: {err}")
+
+    async def rebuild(self, changes: set[str]) -> bool:
+        """
+        Rebuild pages, items which aren't changed are reused.
+
+        :param changes: set[str]: changed publications ``p:{id}`` and users ``u:{id}``
+        :return: bool: False if database read failed, the changes are kept for the next rebuild
+        """
+        publication_ids = {int(member[2:]) for member in changes if member.startswith("p:")}
+        user_ids = {int(member[2:]) for member in changes if member.startswith("u:")}
+        items_key = self.prefix + "items"
+
+        window = None
+        async with self._sessions() as db:
+            stmt = (select(Publication.id, Publication.user_id, Publication.created_at)
+                    .order_by(Publication.created_at.desc(), Publication.id.desc())
+                    .limit(self.pages * self.page_size))
+            head = (await db.execute(stmt)).all()
+            stored = await self.redis.hmget(items_key, *(row.id for row in head)) if head else []
+            items = {row.id: item for row, item in zip(head, stored)
+                     if item is not None and row.id not in publication_ids and row.user_id not in user_ids}
+
+            missing = [row.id for row in head if row.id not in items]
+            if missing:
+                stmt = (select_publication_rows(db.get_bind().dialect.name, with_user=True)
+                        .where(Publication.id.in_(missing)))
+                for publication in await fetch_publication_rows(stmt, db, with_user=True):
+                    items[publication.id] = self.adapter.dump_json(
+                        self.adapter.validate_python(publication, from_attributes=True))
+            window = head
+        # errors are logged and rolled back by session
+        if window is None:
+            return False
+
+        # publications deleted meanwhile are left out, their deletion triggers another rebuild
+        rows = [row for row in window if row.id in items]
+        pages = {}
+        for number in range(self.pages):
+            page = rows[number * self.page_size:(number + 1) * self.page_size]
+            pages[str(number)] = b"[" + b",".join(items[row.id] for row in page) + b"]"
+            if len(page) == self.page_size:
+                pages[f"{number}:cursor"] = publications_keyset.encode(page[-1])
+
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(items_key, self.prefix + "pages")
+            if rows:
+                pipe.hset(items_key, mapping={row.id: items[row.id] for row in rows})
+                pipe.expire(items_key, self.ttl)
+            pipe.hset(self.prefix + "pages", mapping=pages)
+            pipe.expire(self.prefix + "pages", self.ttl)
+            await pipe.execute()
+        self.counters["rebuilds"] += 1
+        self.counters["serialized"] += len(missing)
+        return True
+
+    async def start(self, sessions) -> None:
+        """
+        Build pages in background.
+
+        :param sessions: callable returning async context manager of AsyncSession, e.g. sessionmanager.session
+        :return: None
+        """
+        self._sessions = sessions
+        self.refresh()
+
+    async def stop(self) -> None:
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict[str, int]:
+        return dict(self.counters)
+
+
+feed_pages = FeedPages(
+    redis=get_async_cache() if config.FEED_PAGES_REDIS else None,
+    pages=config.FEED_PAGES,
+    page_size=config.FEED_PAGE_SIZE,
+    ttl=config.FEED_PAGES_TTL,
+)
+read_cache.subscribe(feed_pages.changed)
+metrics.register("feed_pages", feed_pages.stats)
@@ -0,0 +1,195 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import Any, Callable
+
+from fastapi import HTTPException, status
+from passlib.context import CryptContext
+
+from src.conf.config import config
+from src.messages import HASHING_POOL_SATURATED
+from src.utils import metrics
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+BCRYPT_MIN_ROUNDS = 10
+BCRYPT_MAX_ROUNDS = 16
+
+
+@lru_cache
+def get_context(rounds: int | None = None) -> CryptContext:
+    """
+    Get bcrypt context hashing with given cost. Hashes with less rounds need update.
+
+    :param rounds: int | None: bcrypt cost, None - passlib default
+    :return: CryptContext: password context
+
+    """
+    if rounds is None:
+        return pwd_context
+    return CryptContext(schemes=["bcrypt"], deprecated="auto",
+                        bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+
+
+def hash_password(password: str, rounds: int | None = None) -> str:
+    """
+    Hash password with bcrypt. Module level function, so it can be sent to worker process.
+
+    :param password: str: plain text password
+    :param rounds: int | None: bcrypt cost, None - passlib default
+    :return: str: hashed password
+
+    """
+    return get_context(rounds).hash(password)
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """
+    Verify plain text password against bcrypt hash. Module level function, so it can be sent to worker process.
+
+    :param plain_password: str: plain text password
+    :param hashed_password: str: hashed password
+    :return: bool: True if password is correct else False
+
+    """
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update(plain_password: str, hashed_password: str, rounds: int | None = None) -> tuple[bool, str | None]:
+    """
+    Verify password and rehash it if stored hash is weaker than current cost.
+    Module level function, so it can be sent to worker process.
+
+    :param plain_password: str: plain text password
+    :param hashed_password: str: hashed password
+    :param rounds: int | None: current bcrypt cost, None - passlib default
+    :return: tuple[bool, str | None]: True if password is correct else False, and new hash if it needs update
+
+    """
+    return get_context(rounds).verify_and_update(plain_password, hashed_password)
+
+
+def calibrate_rounds(target_ms: float, min_rounds: int = BCRYPT_MIN_ROUNDS, max_rounds: int = BCRYPT_MAX_ROUNDS) -> int:
+    """
+    Benchmark bcrypt on this host and pick the highest cost which hashes within target latency.
+    Every extra round doubles the work, so cost is extrapolated from the fastest of few hashes at min_rounds.
+
+    :param target_ms: float: latency budget of one hash in milliseconds
+    :param min_rounds: int: lowest acceptable cost
+    :param max_rounds: int: highest cost
+    :return: int: bcrypt rounds
+
+    """
+    context = get_context(min_rounds)
+    elapsed = float("inf")
+    for _ in range(3):
+        start = time.perf_counter()
+        context.hash("calibration")
+        elapsed = min(elapsed, (time.perf_counter() - start) * 1000)
+
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed * 2 <= target_ms:
+        rounds += 1
+        elapsed *= 2
+    return rounds
+
+
+class HashingPool:
+    """
+    Bounded process pool for CPU heavy password hashing.
+
+    Calls beyond ``max_pending`` (running and queued) are rejected at once with 503,
+    so a login storm can't pile up behind the pool and stall the event loop.
+    With ``workers=0`` hashing runs in the default thread pool of event loop.
+    ``rounds`` is bcrypt cost of new hashes, it's fixed in config or calibrated on start.
+    """
+
+    def __init__(self, workers: int, max_pending: int, rounds: int | None = None):
+        """
+        :param workers: int: number of worker processes, 0 - use thread pool of event loop
+        :param max_pending: int: maximum of running and queued hashing calls
+        :param rounds: int | None: bcrypt cost, None - passlib default until calibrated
+
+        """
+        self.workers = workers
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self.rejected = 0
+        self.timings: dict[str, dict[str, float]] = {}
+        self._executor: Executor | None = None
+
+    @property
+    def executor(self) -> Executor | None:
+        if self._executor is None and self.workers > 0:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context("spawn"))
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run function in pool.
+
+        :param func: Callable: module level function to run
+        :param args: Any: arguments of function
+        :return: Any: result of function
+        :raise HTTPException: 503 if pool is saturated
+
+        """
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=HASHING_POOL_SATURATED,
+                                headers={"Retry-After": "1"})
+
+        self.pending += 1
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+        finally:
+            self.pending -= 1
+            self._observe(func.__name__, (time.perf_counter() - start) * 1000)
+
+    def _observe(self, name: str, elapsed_ms: float) -> None:
+        timing = self.timings.setdefault(name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+        timing["calls"] += 1
+        timing["total_ms"] += elapsed_ms
+        timing["max_ms"] = max(timing["max_ms"], elapsed_ms)
+
+    async def calibrate(self, target_ms: float) -> int:
+        """
+        Calibrate bcrypt cost in pool, so it's measured on the same workers which hash passwords.
+
+        :param target_ms: float: latency budget of one hash in milliseconds
+        :return: int: bcrypt rounds
+
+        """
+        self.rounds = await self.run(calibrate_rounds, target_ms)
+        return self.rounds
+
+    def start(self) -> None:
+        """
+        Spawn worker processes in advance, so the first login doesn't pay for it.
+        """
+        if self.executor is not None:
+            for _ in range(self.workers):
+                self.executor.submit(int)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> dict[str, Any]:
+        timings = {
+            name: {"calls": t["calls"], "avg_ms": round(t["total_ms"] / t["calls"], 2), "max_ms": round(t["max_ms"], 2)}
+            for name, t in self.timings.items()
+        }
+        return {"workers": self.workers, "max_pending": self.max_pending, "pending": self.pending,
+                "rejected": self.rejected, "rounds": self.rounds, "timings": timings}
+
+
+hashing_pool = HashingPool(workers=config.HASHING_POOL_WORKERS, max_pending=config.HASHING_POOL_MAX_PENDING,
+                           rounds=config.BCRYPT_ROUNDS or None)
+metrics.register("hashing_pool", hashing_pool.stats)
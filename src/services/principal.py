@@ -0,0 +1,14 @@
+from dataclasses import dataclass
+
+from src.database.models import Role
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Caller identity built from access token claims, without loading the user from database.
+    """
+    id: int
+    email: str
+    role: Role
+    is_active: bool = True
@@ -0,0 +1,390 @@
+import asyncio
+import enum
+import json
+import os
+import uuid
+from datetime import datetime
+from itertools import chain
+
+from redis.exceptions import RedisError
+from sqlalchemy import DateTime, Enum, event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.base import NO_VALUE
+
+from src.conf.config import config
+from src.database.models import User
+from src.dependency import get_async_cache
+from src.utils import metrics
+from src.utils.my_logger import logger
+from src.utils.ttl_cache import TTLCache
+
+_PENDING_KEY = "principal_cache_pending"
+_background_tasks: set[asyncio.Task] = set()
+
+
+def _run_in_background(coro) -> None:
+    """
+    Schedule coroutine on running event loop, drop it if there is no loop.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        coro.close()
+        return
+    task = loop.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+class PrincipalCache:
+    """
+    Cache of authenticated users keyed by token subject (email).
+
+    First tier is an in-process LRU with TTL, second tier (optional) is Redis shared by workers.
+    Users are cached as column snapshots and attached to the request session by ``merge(load=False)``,
+    so a cache hit costs no query. Entries are dropped after commit of any session that changed the user,
+    in other workers by InvalidationBroadcast.
+    """
+    prefix = "principal:"
+
+    def __init__(self, maxsize: int, ttl: int, redis=None):
+        """
+        :param maxsize: int: size of in-process cache
+        :param ttl: int: time to live of entry in seconds
+        :param redis: redis.asyncio.Redis | None: second tier client, None - in-process cache only
+
+        """
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis = redis
+
+    @staticmethod
+    def snapshot(user: User) -> dict:
+        """
+        Get column values of loaded user.
+
+        :param user: User: user loaded from database
+        :return: dict: column values of user
+
+        """
+        return {column.key: getattr(user, column.key) for column in User.__table__.columns}
+
+    @staticmethod
+    async def restore(snapshot: dict, db: AsyncSession) -> User:
+        """
+        Build user from snapshot and attach it to session without query to database.
+
+        :param snapshot: dict: column values of user
+        :param db: AsyncSession: database session of request
+        :return: User: user persistent in session
+
+        """
+        user = User(**snapshot)
+        make_transient_to_detached(user)
+        return await db.merge(user, load=False)
+
+    @staticmethod
+    def dumps(snapshot: dict) -> str:
+        return json.dumps({key: value.isoformat() if isinstance(value, datetime) else
+                           value.name if isinstance(value, enum.Enum) else value for key, value in snapshot.items()})
+
+    @staticmethod
+    def loads(data: str | bytes) -> dict:
+        snapshot = json.loads(data)
+        for column in User.__table__.columns:
+            value = snapshot.get(column.key)
+            if value is None:
+                continue
+            if isinstance(column.type, DateTime):
+                snapshot[column.key] = datetime.fromisoformat(value)
+            elif isinstance(column.type, Enum):
+                snapshot[column.key] = column.type.enum_class[value]
+        return snapshot
+
+    async def get(self, email: str, db: AsyncSession) -> User | None:
+        """
+        Get user by email from cache.
+
+        :param email: str: email from token subject
+        :param db: AsyncSession: database session to attach user
+        :return: User | None: user or None if not cached
+
+        """
+        snapshot = self.local.get(email)
+        if snapshot is None and self.redis is not None:
+            try:
+                data = await self.redis.get(self.prefix + email)
+            except RedisError as err:
+                logger.warning(f"principal cache redis get failed: {err}")
+                data = None
+            if data is not None:
+                snapshot = self.loads(data)
+                self.local.set(email, snapshot)
+
+        if snapshot is None:
+            return None
+        return await self.restore(snapshot, db)
+
+    async def set(self, user: User) -> None:
+        """
+        Put user in cache.
+
+        :param user: User: user loaded from database
+        :return: None
+
+        """
+        snapshot = self.snapshot(user)
+        self.local.set(user.email, snapshot)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.prefix + user.email, self.dumps(snapshot), ex=self.ttl)
+            except RedisError as err:
+                logger.warning(f"principal cache redis set failed: {err}")
+
+    def invalidate(self, *emails: str) -> None:
+        """
+        Drop users from cache. Redis entries are deleted in background.
+
+        :param emails: str: emails of users to drop
+        :return: None
+
+        """
+        for email in emails:
+            self.local.pop(email)
+
+        if self.redis is not None and emails:
+            _run_in_background(_redis_delete(self.redis, *(self.prefix + email for email in emails)))
+
+
+class TokenVersionMap:
+    """
+    Cached map of user id to current token version and active flag.
+
+    Access tokens carry the version they were issued with. The version is bumped on block, logout and
+    role change, so comparing claim with this map revokes old tokens without loading the user.
+    Other workers drop their entries by InvalidationBroadcast.
+    """
+    prefix = "token_version:"
+
+    def __init__(self, maxsize: int, ttl: int, redis=None):
+        """
+        :param maxsize: int: size of in-process map
+        :param ttl: int: time to live of entry in seconds
+        :param redis: redis.asyncio.Redis | None: second tier client, None - in-process map only
+
+        """
+        self.ttl = ttl
+        self.local = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.redis = redis
+
+    async def get(self, user_id: int, db: AsyncSession) -> tuple[int, bool] | None:
+        """
+        Get token version and active flag of user.
+
+        :param user_id: int: user id from token claims
+        :param db: AsyncSession: database session, used on cache miss
+        :return: tuple[int, bool] | None: token version and active flag, None if user doesn't exist
+
+        """
+        state = self.local.get(user_id)
+        if state is not None:
+            return state
+
+        if self.redis is not None:
+            try:
+                data = await self.redis.get(self.prefix + str(user_id))
+            except RedisError as err:
+                logger.warning(f"token version redis get failed: {err}")
+                data = None
+            if data is not None:
+                version, is_active = json.loads(data)
+                state = (version, is_active)
+                self.local.set(user_id, state)
+                return state
+
+        row = (await db.execute(select(User.token_version, User.is_active).filter_by(id=user_id))).first()
+        if row is None:
+            return None
+        state = (row.token_version or 0, bool(row.is_active))
+        self.local.set(user_id, state)
+        if self.redis is not None:
+            try:
+                await self.redis.set(self.prefix + str(user_id), json.dumps(state), ex=self.ttl)
+            except RedisError as err:
+                logger.warning(f"token version redis set failed: {err}")
+        return state
+
+    def invalidate(self, *user_ids: int) -> None:
+        """
+        Drop users from map. Redis entries are deleted in background.
+
+        :param user_ids: int: ids of users to drop
+        :return: None
+
+        """
+        for user_id in user_ids:
+            self.local.pop(user_id)
+
+        if self.redis is not None and user_ids:
+            _run_in_background(_redis_delete(self.redis, *(self.prefix + str(user_id) for user_id in user_ids)))
+
+
+class InvalidationBroadcast:
+    """
+    Invalidation of principal caches in other workers by Redis pub/sub.
+
+    Both caches keep entries in process, even with the Redis tier, so without the broadcast other workers
+    accept revoked tokens and the old role until PRINCIPAL_CACHE_TTL. Emails and ids of users changed
+    by a commit are published and dropped from in-process entries of the other workers. A worker clears
+    its caches whenever it (re)subscribes, as it may have missed messages meanwhile.
+    Enable it by PRINCIPAL_CACHE_BROADCAST whenever the app runs more than one worker.
+    """
+    channel = "principal:invalidations"
+
+    def __init__(self, caches: tuple[PrincipalCache, TokenVersionMap], redis=None):
+        """
+        :param caches: tuple[PrincipalCache, TokenVersionMap]: caches of this worker
+        :param redis: redis.asyncio.Redis | None: client of pub/sub, None - this worker only
+
+        """
+        self.principals, self.token_versions = caches
+        self.redis = redis
+        self.origin = uuid.uuid4().hex
+        self.received = 0
+        self._subscriber: asyncio.Task | None = None
+
+    def publish(self, emails: list[str], user_ids: list[int]) -> None:
+        """
+        Send invalidation to other workers in background.
+
+        :param emails: list[str]: emails of changed users
+        :param user_ids: list[int]: ids of changed users
+        :return: None
+        """
+        if self.redis is not None and (emails or user_ids):
+            _run_in_background(self._publish(emails, user_ids))
+
+    async def _publish(self, emails: list[str], user_ids: list[int]) -> None:
+        message = json.dumps({"origin": self.origin, "emails": emails, "user_ids": user_ids})
+        try:
+            await self.redis.publish(self.channel, message)
+        except RedisError as err:
+            logger.warning(f"principal invalidation publish failed: {err}")
+
+    def receive(self, data: str | bytes) -> None:
+        message = json.loads(data)
+        if message["origin"] == self.origin:
+            return
+        self.received += 1
+        for email in message["emails"]:
+            self.principals.local.pop(email)
+        for user_id in message["user_ids"]:
+            self.token_versions.local.pop(user_id)
+
+    def _clear(self) -> None:
+        self.principals.local.clear()
+        self.token_versions.local.clear()
+
+    async def _subscribe(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    self._clear()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.receive(message["data"])
+            except (RedisError, OSError) as err:
+                logger.warning(f"principal invalidation subscription failed: {err}")
+            # invalidations are missed until the next subscription
+            self._clear()
+            await asyncio.sleep(1)
+
+    def start(self) -> None:
+        if self.redis is None:
+            # uvicorn and gunicorn read the number of workers from WEB_CONCURRENCY
+            if int(os.environ.get("WEB_CONCURRENCY", 1)) > 1:
+                logger.warning("PRINCIPAL_CACHE_BROADCAST is disabled with several workers, "
+                               f"revoked tokens are accepted by other workers up to {self.principals.ttl}s")
+            return
+        if self._subscriber is None:
+            self._subscriber = asyncio.get_running_loop().create_task(self._subscribe())
+
+    async def stop(self) -> None:
+        if self._subscriber is not None:
+            self._subscriber.cancel()
+            self._subscriber = None
+
+    def stats(self) -> dict[str, int | bool]:
+        return {"subscribed": self._subscriber is not None, "received": self.received}
+
+
+async def _redis_delete(redis, *keys: str) -> None:
+    try:
+        await redis.delete(*keys)
+    except RedisError as err:
+        logger.warning(f"principal cache redis delete failed: {err}")
+
+
+principal_cache = PrincipalCache(
+    maxsize=config.PRINCIPAL_CACHE_SIZE,
+    ttl=config.PRINCIPAL_CACHE_TTL,
+    redis=get_async_cache() if config.PRINCIPAL_CACHE_REDIS else None,
+)
+
+token_versions = TokenVersionMap(
+    maxsize=config.PRINCIPAL_CACHE_SIZE,
+    ttl=config.PRINCIPAL_CACHE_TTL,
+    redis=get_async_cache() if config.PRINCIPAL_CACHE_REDIS else None,
+)
+
+invalidations = InvalidationBroadcast(
+    (principal_cache, token_versions),
+    redis=get_async_cache() if config.PRINCIPAL_CACHE_BROADCAST else None,
+)
+
+metrics.register("principal_cache", principal_cache.local.stats)
+metrics.register("token_versions", token_versions.local.stats)
+metrics.register("principal_invalidations", invalidations.stats)
+
+
+@event.listens_for(User, "before_update")
+def _bump_token_version(mapper, connection, target: User) -> None:
+    """
+    Bump token version when user is blocked or role is changed, so issued access tokens are revoked.
+    """
+    attrs = inspect(target).attrs
+    if attrs.token_version.history.has_changes():
+        return
+    if attrs.role.history.has_changes() or attrs.is_active.history.has_changes():
+        target.token_version = (target.token_version or 0) + 1
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session: Session, flush_context) -> None:
+    """
+    Remember users changed or deleted by flush, caches are invalidated after commit.
+    """
+    for obj in chain(session.dirty, session.deleted):
+        if isinstance(obj, User):
+            attrs = inspect(obj).attrs
+            email, user_id = attrs.email.loaded_value, attrs.id.loaded_value
+            session.info.setdefault(_PENDING_KEY, set()).add((None if email is NO_VALUE else email,
+                                                              None if user_id is NO_VALUE else user_id))
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session: Session) -> None:
+    users = session.info.pop(_PENDING_KEY, None)
+    if users:
+        emails = [email for email, _ in users if email is not None]
+        user_ids = [user_id for _, user_id in users if user_id is not None]
+        principal_cache.invalidate(*emails)
+        token_versions.invalidate(*user_ids)
+        invalidations.publish(emails, user_ids)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_changed_users(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,104 @@
+import asyncio
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.database.models import Publication, User
+from src.repositories import publications as repositories_publications
+from src.schemas.publications import PublicationCreate
+from src.services.cloud_in_ary.cloud_image import CloudinaryService
+from src.services.cloud_in_ary.errors import CloudinaryResourceNotFoundError
+from src.utils.my_logger import logger
+import src.messages as msg
+
+# images uploaded to {email}/temp before publishing, current_img is required
+IMAGE_POSTFIXES = ("current_img", "updated_img")
+
+
+async def move_images(cloud: CloudinaryService, email: str, publication_id: int) -> dict[str, str | None]:
+    """
+    Move images from {email}/temp to folder of publication, concurrently.
+    If any move fails, moved images are returned to {email}/temp.
+
+    :param cloud: CloudinaryService: cloud service
+    :param email: str: user email main folder in cloudinary
+    :param publication_id: int: id of publication
+    :return: dict[str, str | None]: urls of images by postfix, None if image wasn't uploaded
+    :raises CloudinaryResourceNotFoundError: if current_img isn't uploaded
+    :raises CloudinaryError: if cloudinary failed
+    """
+    results = await asyncio.gather(
+        *(asyncio.to_thread(cloud.replace_temp_to_publications, email, postfix, publication_id)
+          for postfix in IMAGE_POSTFIXES),
+        return_exceptions=True,
+    )
+    images = {}
+    for result in results:
+        if isinstance(result, dict):
+            images.update(result)
+
+    error = next((result for result in results if isinstance(result, BaseException)), None)
+    if error is None and images.get("current_img") is None:
+        error = CloudinaryResourceNotFoundError(msg.PLEASE_UPLOAD_IMAGE)
+    if error is not None:
+        await restore_images(cloud, email, publication_id, images)
+        raise error
+    return images
+
+
+async def restore_images(cloud: CloudinaryService, email: str, publication_id: int,
+                         images: dict[str, str | None]) -> None:
+    """
+    Return moved images to {email}/temp, so the user can publish them again.
+
+    :param cloud: CloudinaryService: cloud service
+    :param email: str: user email main folder in cloudinary
+    :param publication_id: int: id of publication which wasn't created
+    :param images: dict[str, str | None]: urls of moved images by postfix
+    :return: None
+    """
+    moved = [postfix for postfix, url in images.items() if url is not None]
+    results = await asyncio.gather(
+        *(asyncio.to_thread(cloud.restore_temp, email, postfix, publication_id) for postfix in moved),
+        return_exceptions=True,
+    )
+    for postfix, result in zip(moved, results):
+        if isinstance(result, BaseException):
+            logger.error(f'image {postfix} of not created publication {publication_id} '
+                         f'was not restored to temp of {email}: {result}')
+
+
+async def publish_publication(body: PublicationCreate, db: AsyncSession, user: User,
+                              cloud: CloudinaryService) -> Publication:
+    """
+    Create publication from images uploaded to {email}/temp.
+
+    Publication is flushed to get its id, images are moved to {email}/publications/{id} concurrently,
+    then publication with images and tags is committed once. If cloudinary or commit fails,
+    the transaction is rolled back and moved images are returned to temp, so nothing is half created.
+
+    :param body: PublicationCreate: title, description and tags
+    :param db: AsyncSession: database session
+    :param user: User: owner of publication
+    :param cloud: CloudinaryService: cloud service
+    :return: Publication: created publication
+    :raises CloudinaryResourceNotFoundError: if current_img isn't uploaded
+    :raises CloudinaryError: if cloudinary failed
+    """
+    email = user.email
+    try:
+        publication = await repositories_publications.create_publication(body, db, user)
+        publication_id = publication.id
+        images = await move_images(cloud, email, publication_id)
+    except BaseException:
+        await db.rollback()
+        raise
+
+    try:
+        repositories_publications.add_images(publication_id, images, db)
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        await restore_images(cloud, email, publication_id, images)
+        raise
+
+    return await repositories_publications.get_publication_by_id(publication_id, db)
@@ -0,0 +1,267 @@
+import asyncio
+import math
+import time
+from dataclasses import dataclass, field
+
+from fastapi import HTTPException, Request, status
+from redis.exceptions import RedisError
+
+from src.conf.config import config
+from src.dependency import get_cache
+from src.messages import TOO_MANY_REQUESTS
+from src.utils import metrics
+from src.utils.my_logger import logger
+
+
+@dataclass(frozen=True)
+class SlidingWindow:
+    """
+    No more than ``times`` requests per ``seconds``, sliding window counter approximation.
+    """
+    times: int
+    seconds: int
+
+
+@dataclass(frozen=True)
+class TokenBucket:
+    """
+    Bursts up to ``capacity`` requests, refilled by ``rate`` requests per second.
+    """
+    capacity: int
+    rate: float
+
+
+@dataclass
+class _WindowState:
+    policy: SlidingWindow
+    window: int
+    count: int = 0
+    prev_count: int = 0
+    synced: int = 0
+    remote: int = 0
+    remote_prev: int = 0
+    touched: float = field(default_factory=time.monotonic)
+
+
+@dataclass
+class _BucketState:
+    policy: TokenBucket
+    tokens: float
+    updated: float
+    consumed: int = 0
+    remote_total: int | None = None
+    touched: float = field(default_factory=time.monotonic)
+
+
+class RateLimiter:
+    """
+    Process-local rate limiter with periodic Redis reconciliation.
+
+    Every check is decided from in-process counters, so it doesn't cost a Redis round trip.
+    Background sync pushes local usage to Redis and pulls usage of other workers, so the
+    limit is shared by all workers with error bounded by the sync interval.
+    """
+    prefix = "ratelimit:"
+
+    def __init__(self, redis=None, sync_interval: float = 1.0, timer=time.time):
+        """
+        :param redis: redis.Redis | None: client of shared counters, None - local limits only
+        :param sync_interval: float: seconds between reconciliations with Redis
+        :param timer: callable: wall clock, shared by workers to align windows
+
+        """
+        self.redis = redis
+        self.sync_interval = sync_interval
+        self.enabled = True
+        self._timer = timer
+        self._windows: dict[str, _WindowState] = {}
+        self._buckets: dict[str, _BucketState] = {}
+        self._task: asyncio.Task | None = None
+        self.allowed = 0
+        self.rejected = 0
+
+    def hit(self, key: str, policy: SlidingWindow | TokenBucket) -> float:
+        """
+        Register request and check the limit.
+
+        :param key: str: limited entity, for example "auth:login:127.0.0.1"
+        :param policy: SlidingWindow | TokenBucket: limit policy
+        :return: float: 0 if request is allowed else seconds to wait before retry
+
+        """
+        if not self.enabled:
+            return 0.0
+        if isinstance(policy, SlidingWindow):
+            retry_after = self._hit_window(key, policy)
+        else:
+            retry_after = self._hit_bucket(key, policy)
+
+        if retry_after:
+            self.rejected += 1
+        else:
+            self.allowed += 1
+        return retry_after
+
+    def _hit_window(self, key: str, policy: SlidingWindow) -> float:
+        now = self._timer()
+        window, elapsed = divmod(now, policy.seconds)
+        window = int(window)
+
+        state = self._windows.get(key)
+        if state is None or state.policy != policy:
+            state = self._windows[key] = _WindowState(policy=policy, window=window)
+        elif state.window != window:
+            previous = state.count + state.remote if state.window == window - 1 else 0
+            state.window, state.count, state.synced, state.remote = window, 0, 0, 0
+            state.prev_count, state.remote_prev = previous, 0
+        state.touched = time.monotonic()
+
+        weight = 1 - elapsed / policy.seconds
+        estimate = (state.prev_count + state.remote_prev) * weight + state.count + state.remote
+        if estimate + 1 > policy.times:
+            return max(policy.seconds - elapsed, 1.0)
+
+        state.count += 1
+        return 0.0
+
+    def _hit_bucket(self, key: str, policy: TokenBucket) -> float:
+        now = self._timer()
+        state = self._buckets.get(key)
+        if state is None or state.policy != policy:
+            state = self._buckets[key] = _BucketState(policy=policy, tokens=policy.capacity, updated=now)
+
+        state.tokens = min(policy.capacity, state.tokens + (now - state.updated) * policy.rate)
+        state.updated = now
+        state.touched = time.monotonic()
+
+        if state.tokens < 1:
+            return max((1 - state.tokens) / policy.rate, 1.0)
+
+        state.tokens -= 1
+        state.consumed += 1
+        return 0.0
+
+    async def sync(self) -> None:
+        """
+        Reconcile local counters with Redis. Redis calls run in thread, counters are updated on event loop.
+        """
+        if self.redis is None:
+            return
+        self._prune()
+        windows = [(key, state, state.window, state.count - state.synced) for key, state in self._windows.items()]
+        buckets = [(key, state, state.consumed) for key, state in self._buckets.items()]
+        if not windows and not buckets:
+            return
+
+        try:
+            window_totals, bucket_totals = await asyncio.to_thread(self._push, windows, buckets)
+        except RedisError as err:
+            logger.warning(f"rate limiter sync failed: {err}")
+            return
+
+        for (key, state, window, delta), (current, previous) in zip(windows, window_totals):
+            if state.window != window:
+                continue
+            state.synced += delta
+            state.remote = max(current - state.synced, 0)
+            state.remote_prev = max(previous - state.prev_count, 0)
+
+        for (key, state, consumed), total in zip(buckets, bucket_totals):
+            state.consumed -= consumed
+            if state.remote_total is not None:
+                state.tokens -= max(total - state.remote_total - consumed, 0)
+            state.remote_total = total
+
+    def _push(self, windows: list, buckets: list) -> tuple[list[tuple[int, int]], list[int]]:
+        pipe = self.redis.pipeline(transaction=False)
+        for key, state, window, delta in windows:
+            current_key = f"{self.prefix}{key}:{window}"
+            pipe.incrby(current_key, delta)
+            pipe.expire(current_key, state.policy.seconds * 2)
+            pipe.get(f"{self.prefix}{key}:{window - 1}")
+        for key, state, consumed in buckets:
+            bucket_key = f"{self.prefix}{key}"
+            pipe.incrby(bucket_key, consumed)
+            pipe.expire(bucket_key, math.ceil(state.policy.capacity / state.policy.rate) * 2)
+        results = pipe.execute()
+
+        window_totals = [(int(results[i * 3]), int(results[i * 3 + 2] or 0)) for i in range(len(windows))]
+        offset = len(windows) * 3
+        bucket_totals = [int(results[offset + i * 2]) for i in range(len(buckets))]
+        return window_totals, bucket_totals
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for key, state in list(self._windows.items()):
+            if now - state.touched > state.policy.seconds * 2:
+                del self._windows[key]
+        for key, state in list(self._buckets.items()):
+            if now - state.touched > state.policy.capacity / state.policy.rate * 2:
+                del self._buckets[key]
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
+
+    def start(self) -> None:
+        """
+        Start background reconciliation with Redis.
+        """
+        if self.redis is not None and self.sync_interval > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+            await self.sync()
+
+    def stats(self) -> dict[str, int]:
+        return {"allowed": self.allowed, "rejected": self.rejected,
+                "windows": len(self._windows), "buckets": len(self._buckets)}
+
+
+rate_limiter = RateLimiter(
+    redis=get_cache() if config.RATE_LIMIT_SYNC_INTERVAL > 0 else None,
+    sync_interval=config.RATE_LIMIT_SYNC_INTERVAL,
+)
+metrics.register("rate_limiter", rate_limiter.stats)
+
+
+class RateLimit:
+    """
+    Route dependency applying rate limit policy per client.
+
+    Example usage:
+    ```
+    @router.post('/login', dependencies=[Depends(RateLimit(TokenBucket(capacity=10, rate=0.2), 'auth:login'))])
+    ```
+    """
+
+    def __init__(self, policy: SlidingWindow | TokenBucket, scope: str, limiter: RateLimiter = rate_limiter):
+        """
+        :param policy: SlidingWindow | TokenBucket: limit policy
+        :param scope: str: name of limited route or group of routes, limits are counted per scope
+        :param limiter: RateLimiter: limiter keeping counters
+
+        """
+        self.policy = policy
+        self.scope = scope
+        self.limiter = limiter
+
+    async def __call__(self, request: Request):
+        """
+        Check rate limit of client. If limit is exceeded, raise HTTPException.
+        :param request: request object: request object from FastAPI
+        :return: None
+
+        """
+        client = request.client.host if request.client else "unknown"
+        retry_after = self.limiter.hit(f"{self.scope}:{client}", self.policy)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail=TOO_MANY_REQUESTS,
+                headers={"Retry-After": str(math.ceil(retry_after))}
+            )
@@ -0,0 +1,405 @@
+import asyncio
+import functools
+import inspect
+import itertools
+import json
+import math
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterable
+
+from pydantic import TypeAdapter
+from redis.exceptions import RedisError
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.conf.config import config
+from src.database.db import DatabaseSessionManager, sessionmanager
+from src.database.models import Comment, Publication, PublicationTagAssociation, PubImage, Rating, User
+from src.dependency import get_async_cache
+from src.schemas.user import UserResponse
+from src.utils import metrics
+from src.utils.my_logger import logger
+from src.utils.ttl_cache import TTLCache
+
+_PENDING_KEY = "read_cache_pending"
+
+
+@dataclass(slots=True)
+class _Entry:
+    value: Any
+    expires_at: float
+    delta: float
+    born: int
+
+
+class ReadCache:
+    """
+    Two-tier read-through cache of repository reads: in-process LRU (L1) in front of Redis (L2).
+
+    Results are validated by a pydantic schema, so cached values don't depend on a database session
+    and are stored in Redis as JSON. Every entry has tags, e.g. ``publication:5``; invalidation of a tag
+    records its version, and entries loaded before that version are ignored. Tags are invalidated after
+    commit of sessions which changed the corresponding rows. Other workers keep their L1 entries until
+    local_ttl expires, so local_ttl bounds staleness between workers. Misses are loaded from primary
+    even if the read got a replica session: an entry loaded from a lagging replica right after
+    invalidation would keep the old value for every client until ttl.
+
+    Stampedes are avoided by:
+    - early refresh: close to expiry a request recomputes the value with probability growing with
+      the time it took to compute (XFetch), the others keep getting the cached value;
+    - single flight: concurrent misses in a worker wait for one load, misses of other workers wait
+      for the holder of a Redis lock instead of querying the database too.
+
+    Example usage:
+    ```
+    @read_cache.cached("comments", list[CommentModelReturned], tags=lambda publication_id, **_: [...])
+    async def get_comments(publication_id: int, db: AsyncSession): ...
+    ```
+    """
+    prefix = "cache:"
+    INVALIDATE = """
+    local clock = redis.call('INCR', KEYS[1])
+    for i = 2, #KEYS do
+        redis.call('SET', KEYS[i], clock, 'EX', ARGV[1])
+    end
+    return clock
+    """
+
+    def __init__(self, maxsize: int, ttl: float, local_ttl: float, redis=None, beta: float = 1.0,
+                 lock_timeout: float = 5.0, sessions: DatabaseSessionManager | None = None):
+        """
+        :param maxsize: int: size of in-process cache, 0 disables it
+        :param ttl: float: time to live of entry in seconds
+        :param local_ttl: float: time to live of entry in process, bounds staleness between workers
+        :param redis: redis.asyncio.Redis | None: second tier client, None - in-process cache only
+        :param beta: float: eagerness of early refresh, 0 disables it
+        :param lock_timeout: float: seconds to wait for load of another worker
+        :param sessions: DatabaseSessionManager | None: loads with replica sessions are moved to its primary
+
+        """
+        self.ttl = ttl
+        self.local_ttl = min(local_ttl, ttl)
+        self.beta = beta
+        self.lock_timeout = lock_timeout
+        self.sessions = sessions
+        self.local = TTLCache(maxsize=maxsize, ttl=self.local_ttl)
+        self.redis = redis
+        self._invalidate = redis.register_script(self.INVALIDATE) if redis is not None else None
+        self._clock = itertools.count(1)
+        self._versions: dict[str, tuple[int, float]] = {}
+        self._inflight: dict[str, asyncio.Future] = {}
+        # tags invalidated locally, whose invalidation isn't written to Redis yet
+        self._unpublished: Counter = Counter()
+        self._tasks: set[asyncio.Task] = set()
+        self._subscribers: list[Callable[[tuple[str, ...]], None]] = []
+        self.counters = Counter()
+
+    def subscribe(self, callback: Callable[[tuple[str, ...]], None]) -> None:
+        """
+        Call callback with tags of every invalidation, e.g. to refresh data materialized elsewhere.
+
+        :param callback: Callable: gets invalidated tags, must not block
+        :return: None
+        """
+        self._subscribers.append(callback)
+
+    def cached(self, namespace: str, schema: Any, tags: Callable[..., Iterable[str]]):
+        """
+        Decorator of async repository read. Arguments except ``db`` make the key, None results aren't cached.
+
+        :param namespace: str: name of cached read, prefix of keys
+        :param schema: Any: type of result for pydantic TypeAdapter, ORM objects are read by attributes
+        :param tags: Callable: gets arguments of read except db, returns tags of its result
+        :return: decorator
+        """
+        adapter = TypeAdapter(schema)
+
+        def decorator(func: Callable[..., Awaitable[Any]]):
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                arguments = {name: value for name, value in bound.arguments.items() if name != "db"}
+                key = f"{namespace}:{json.dumps(list(arguments.values()), default=str, separators=(',', ':'))}"
+                if self.sessions is not None and "db" in bound.arguments:
+                    load = functools.partial(self._load_from_primary, func, bound)
+                else:
+                    load = functools.partial(func, *args, **kwargs)
+                return await self.fetch(key, list(tags(**arguments)), load, adapter)
+
+            return wrapper
+
+        return decorator
+
+    async def _load_from_primary(self, func: Callable[..., Awaitable[Any]], bound: inspect.BoundArguments) -> Any:
+        async with self.sessions.primary_session(bound.arguments["db"]) as db:
+            arguments = inspect.BoundArguments(bound.signature, {**bound.arguments, "db": db})
+            return await func(*arguments.args, **arguments.kwargs)
+
+    async def fetch(self, key: str, tags: list[str], load: Callable[[], Awaitable[Any]],
+                    adapter: TypeAdapter) -> Any:
+        """
+        Get value from cache or load it.
+
+        :param key: str: cache key
+        :param tags: list[str]: tags of value
+        :param load: Callable: loads value from database
+        :param adapter: TypeAdapter: validates loaded value and (de)serializes it for Redis
+        :return: Any: value
+        """
+        entry = self._get_local(key, tags)
+        if entry is not None:
+            self.counters["l1_hits"] += 1
+        elif self._use_redis(tags):
+            entry = await self._get_remote(key, tags, adapter)
+            if entry is not None:
+                self.counters["l2_hits"] += 1
+
+        if entry is not None:
+            if not self._expiring(entry) or not await self._lock(key):
+                return entry.value
+            self.counters["early_refreshes"] += 1
+            return await self._load(key, tags, load, adapter, locked=True)
+
+        self.counters["misses"] += 1
+        future = self._inflight.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(future)
+
+        future = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await self._load_once(key, tags, load, adapter)
+        except BaseException as err:
+            future.set_exception(err)
+            # the exception is raised here, waiters may not exist
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            return value
+        finally:
+            del self._inflight[key]
+
+    def _use_redis(self, tags: list[str]) -> bool:
+        return self.redis is not None and not any(self._unpublished[tag] for tag in tags)
+
+    def _valid(self, born: int, tags: list[str]) -> bool:
+        return all(self._versions.get(tag, (0, 0.0))[0] < born for tag in tags)
+
+    def _get_local(self, key: str, tags: list[str]) -> _Entry | None:
+        entry = self.local.get(key)
+        if entry is None or not self._valid(entry.born, tags):
+            return None
+        return entry
+
+    def _expiring(self, entry: _Entry) -> bool:
+        # XFetch: -log(random) is exponentially distributed, so refresh gets likely close to expiry
+        return time.time() - entry.delta * self.beta * math.log(1 - random.random()) >= entry.expires_at
+
+    def _set_local(self, key: str, entry: _Entry) -> None:
+        self.local.set(key, entry, ttl=min(self.local_ttl, entry.expires_at - time.time()))
+
+    async def _get_remote(self, key: str, tags: list[str], adapter: TypeAdapter) -> _Entry | None:
+        born = next(self._clock)
+        try:
+            async with self.redis.pipeline(transaction=False) as pipe:
+                pipe.get(self.prefix + key)
+                for tag in tags:
+                    pipe.get(self.prefix + "tag:" + tag)
+                data, *versions = await pipe.execute()
+        except RedisError as err:
+            logger.warning(f"read cache redis get failed: {err}")
+            return None
+        if data is None:
+            return None
+
+        header, payload = data.split(b"\n", 1)
+        header = json.loads(header)
+        if any(version is not None and int(version) >= header["born"] for version in versions):
+            return None
+        entry = _Entry(adapter.validate_json(payload), header["expires_at"], header["delta"], born)
+        if not self._valid(born, tags):
+            return None
+        self._set_local(key, entry)
+        return entry
+
+    async def _lock(self, key: str) -> bool:
+        if self.redis is None:
+            return True
+        try:
+            return bool(await self.redis.set(self.prefix + "lock:" + key, 1, nx=True, px=int(self.lock_timeout * 1000)))
+        except RedisError as err:
+            logger.warning(f"read cache redis lock failed: {err}")
+            return True
+
+    async def _load_once(self, key: str, tags: list[str], load, adapter: TypeAdapter) -> Any:
+        if not self._use_redis(tags) or await self._lock(key):
+            return await self._load(key, tags, load, adapter, locked=self._use_redis(tags))
+
+        # another worker loads the value
+        self.counters["lock_waits"] += 1
+        deadline = time.monotonic() + self.lock_timeout
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+            entry = await self._get_remote(key, tags, adapter)
+            if entry is not None:
+                return entry.value
+        return await self._load(key, tags, load, adapter, locked=False)
+
+    async def _load(self, key: str, tags: list[str], load, adapter: TypeAdapter, locked: bool) -> Any:
+        born = next(self._clock)
+        remote_born = None
+        if self._use_redis(tags):
+            try:
+                remote_born = await self.redis.incr(self.prefix + "clock")
+            except RedisError as err:
+                logger.warning(f"read cache redis clock failed: {err}")
+
+        start = time.perf_counter()
+        try:
+            value = adapter.validate_python(await load(), from_attributes=True)
+        finally:
+            if locked and self.redis is not None:
+                await self._unlock(key)
+        self.counters["loads"] += 1
+        if value is None:
+            return None
+
+        entry = _Entry(value, time.time() + self.ttl, time.perf_counter() - start, born)
+        if self._valid(born, tags):
+            self._set_local(key, entry)
+        if remote_born is not None:
+            header = json.dumps({"expires_at": entry.expires_at, "delta": entry.delta, "born": remote_born})
+            try:
+                await self.redis.set(self.prefix + key, header.encode() + b"\n" + adapter.dump_json(value),
+                                     ex=math.ceil(self.ttl))
+            except RedisError as err:
+                logger.warning(f"read cache redis set failed: {err}")
+        return value
+
+    async def _unlock(self, key: str) -> None:
+        try:
+            await self.redis.delete(self.prefix + "lock:" + key)
+        except RedisError as err:
+            logger.warning(f"read cache redis unlock failed: {err}")
+
+    def invalidate(self, *tags: str) -> None:
+        """
+        Drop entries with tags. Redis versions of tags are written in background.
+
+        :param tags: str: tags of changed rows
+        :return: None
+        """
+        if not tags:
+            return
+        self.counters["invalidations"] += len(tags)
+        now = time.monotonic()
+        version = next(self._clock)
+        for tag in tags:
+            self._versions[tag] = (version, now)
+        # entries are older than local_ttl after that, their versions aren't needed
+        if len(self._versions) > max(self.local.maxsize, 1024):
+            self._versions = {tag: item for tag, item in self._versions.items() if now - item[1] <= self.local_ttl}
+        for callback in self._subscribers:
+            callback(tags)
+
+        if self.redis is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._unpublished.update(tags)
+        task = loop.create_task(self._publish(tags))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _publish(self, tags: tuple[str, ...]) -> None:
+        try:
+            await self._invalidate(keys=[self.prefix + "clock", *(self.prefix + "tag:" + tag for tag in tags)],
+                                   args=[math.ceil(self.ttl) * 2])
+        except RedisError as err:
+            logger.warning(f"read cache redis invalidation failed: {err}")
+        finally:
+            self._unpublished.subtract(tags)
+            self._unpublished += Counter()
+
+    def clear(self) -> None:
+        self.local.clear()
+        self._versions.clear()
+
+    @staticmethod
+    def track(db: AsyncSession, *tags: str) -> None:
+        """
+        Remember tags changed by statements of session, they are invalidated after commit.
+        Changes of ORM objects are tracked automatically, this is for Core statements.
+
+        :param db: AsyncSession: database session making the changes
+        :param tags: str: tags of changed rows
+        :return: None
+        """
+        db.sync_session.info.setdefault(_PENDING_KEY, set()).update(tags)
+
+    def stats(self) -> dict[str, int | float]:
+        hits = self.counters["l1_hits"] + self.counters["l2_hits"]
+        total = hits + self.counters["misses"]
+        return {**self.counters, "size": len(self.local), "hit_rate": round(hits / total, 4) if total else 0.0}
+
+
+def _tags_of(obj: Any) -> list[str]:
+    if isinstance(obj, Publication):
+        return [f"publication:{obj.id}", f"user_publications:{obj.user_id}"]
+    if isinstance(obj, (PubImage, Rating, PublicationTagAssociation)):
+        return [f"publication:{obj.publication_id}"]
+    if isinstance(obj, Comment):
+        return [f"comments:{obj.publication_id}"]
+    if isinstance(obj, User):
+        attrs = sa_inspect(obj).attrs
+        tags = [f"username:{username}" for username in attrs.username.history.sum() if username is not None]
+        # feed items embed owners as UserResponse
+        if any(getattr(attrs, field).history.has_changes() for field in UserResponse.model_fields):
+            tags.append(f"user:{obj.id}")
+        if attrs.username.history.has_changes() or attrs.avatar.history.has_changes():
+            # comments are listed with username and avatar of authors
+            tags.append("comment_authors")
+        return tags
+    return []
+
+
+read_cache = ReadCache(
+    maxsize=config.READ_CACHE_SIZE,
+    ttl=config.READ_CACHE_TTL,
+    local_ttl=config.READ_CACHE_LOCAL_TTL,
+    redis=get_async_cache() if config.READ_CACHE_REDIS else None,
+    sessions=sessionmanager,
+)
+metrics.register("read_cache", read_cache.stats)
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_rows(session: Session, flush_context) -> None:
+    """
+    Remember tags of rows changed by flush, entries are invalidated after commit.
+    """
+    tags = {tag for obj in itertools.chain(session.new, session.dirty, session.deleted) for tag in _tags_of(obj)}
+    if tags:
+        session.info.setdefault(_PENDING_KEY, set()).update(tags)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_rows(session: Session) -> None:
+    tags = session.info.pop(_PENDING_KEY, None)
+    if tags:
+        read_cache.invalidate(*tags)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_changed_rows(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -1,20 +1,21 @@
 from fastapi import Request, Depends, HTTPException, status
 
-from src.database.models import Role, User
+from src.database.models import Role
 from src.messages import FORBIDDEN
 from src.services.auth import auth_service
+from src.services.principal import Principal
 
 
 class RoleAccess:
     def __init__(self, allowed_roles: list[Role]):
         self.allowed_roles = allowed_roles
 
-    async def __call__(self, request: Request, user: User = Depends(auth_service.get_current_user)):
+    async def __call__(self, request: Request, user: Principal = Depends(auth_service.get_current_principal)):
         """
         Check user role. If user role not in allowed roles, raise HTTPException.
         :param request: request object: request object from FastAPI
-        :param user: user object: user object from database
-        :return: user object from database
+        :param user: principal: caller from access token claims
+        :return: None
 
         """
         print(user.role, self.allowed_roles)
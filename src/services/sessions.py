@@ -0,0 +1,270 @@
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+
+from src.conf.config import config
+from src.dependency import get_async_cache
+
+
+def token_digest(token: str) -> str:
+    """
+    Get sha256 digest of token, raw refresh tokens are never stored.
+
+    :param token: str: refresh token
+    :return: str: hex digest of token
+
+    """
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+@dataclass
+class RefreshSession:
+    sid: str
+    email: str
+    token: str
+    device: str | None = None
+
+
+class SessionStore(ABC):
+    """
+    Storage of refresh token sessions, one session per device of user.
+
+    Each session keeps digest of the last issued refresh token. Rotation succeeds only for the current token,
+    presenting an outdated token means it was stolen or replayed, so the whole session is revoked.
+    """
+
+    def __init__(self, ttl: int):
+        """
+        :param ttl: int: time to live of session in seconds, prolonged by every rotation
+
+        """
+        self.ttl = ttl
+
+    @abstractmethod
+    async def create(self, sid: str, email: str, token: str, device: str | None = None) -> None:
+        """
+        Create session for new refresh token.
+
+        :param sid: str: session id, also claim of refresh token
+        :param email: str: email of user
+        :param token: str: refresh token
+        :param device: str | None: client description, for example User-Agent
+        :return: None
+
+        """
+
+    @abstractmethod
+    async def rotate(self, sid: str, email: str, old_token: str, new_token: str) -> bool:
+        """
+        Atomically replace refresh token of session. Session is revoked if old token is not the current one.
+
+        :param sid: str: session id
+        :param email: str: email of user
+        :param old_token: str: refresh token presented by client
+        :param new_token: str: new refresh token
+        :return: bool: True if token was rotated else False
+
+        """
+
+    @abstractmethod
+    async def revoke(self, sid: str, email: str, token: str) -> bool:
+        """
+        Revoke session if token is the current one.
+
+        :param sid: str: session id
+        :param email: str: email of user
+        :param token: str: refresh token presented by client
+        :return: bool: True if session was revoked else False
+
+        """
+
+    @abstractmethod
+    async def revoke_user(self, email: str) -> int:
+        """
+        Revoke all sessions of user.
+
+        :param email: str: email of user
+        :return: int: number of revoked sessions
+
+        """
+
+    @abstractmethod
+    async def get_sessions(self, email: str) -> list[RefreshSession]:
+        """
+        Get active sessions of user.
+
+        :param email: str: email of user
+        :return: list[RefreshSession]: active sessions
+
+        """
+
+
+class MemorySessionStore(SessionStore):
+    """
+    In-process session store for tests and single worker deployments.
+    """
+
+    def __init__(self, ttl: int):
+        super().__init__(ttl)
+        self._sessions: dict[str, tuple[float, RefreshSession]] = {}
+
+    def _get(self, sid: str) -> RefreshSession | None:
+        item = self._sessions.get(sid)
+        if item is None:
+            return None
+        expires_at, session = item
+        if expires_at <= time.monotonic():
+            del self._sessions[sid]
+            return None
+        return session
+
+    def _put(self, session: RefreshSession) -> None:
+        self._sessions[session.sid] = (time.monotonic() + self.ttl, session)
+
+    async def create(self, sid: str, email: str, token: str, device: str | None = None) -> None:
+        self._put(RefreshSession(sid=sid, email=email, token=token_digest(token), device=device))
+
+    async def rotate(self, sid: str, email: str, old_token: str, new_token: str) -> bool:
+        session = self._get(sid)
+        if session is None or session.email != email:
+            return False
+        if session.token != token_digest(old_token):
+            del self._sessions[sid]
+            return False
+        session.token = token_digest(new_token)
+        self._put(session)
+        return True
+
+    async def revoke(self, sid: str, email: str, token: str) -> bool:
+        session = self._get(sid)
+        if session is None or session.email != email or session.token != token_digest(token):
+            return False
+        del self._sessions[sid]
+        return True
+
+    async def revoke_user(self, email: str) -> int:
+        sids = [sid for sid, (_, session) in self._sessions.items() if session.email == email]
+        for sid in sids:
+            del self._sessions[sid]
+        return len(sids)
+
+    async def get_sessions(self, email: str) -> list[RefreshSession]:
+        return [session for sid in list(self._sessions) if (session := self._get(sid)) and session.email == email]
+
+
+class RedisSessionStore(SessionStore):
+    """
+    Redis session store shared by all workers.
+
+    Session is a hash ``session:{sid}``, sessions of user are indexed in set ``user_sessions:{email}``.
+    Rotation and revocation run as Lua scripts, so compare-and-set is atomic across workers.
+    """
+    session_prefix = "session:"
+    user_prefix = "user_sessions:"
+
+    ROTATE = """
+    local email = redis.call('HGET', KEYS[1], 'email')
+    if not email or email ~= ARGV[3] then return 0 end
+    if redis.call('HGET', KEYS[1], 'token') ~= ARGV[1] then
+        redis.call('DEL', KEYS[1])
+        redis.call('SREM', KEYS[2], ARGV[4])
+        return 0
+    end
+    redis.call('HSET', KEYS[1], 'token', ARGV[2])
+    redis.call('EXPIRE', KEYS[1], ARGV[5])
+    redis.call('EXPIRE', KEYS[2], ARGV[5])
+    return 1
+    """
+
+    REVOKE = """
+    if redis.call('HGET', KEYS[1], 'email') ~= ARGV[2] or redis.call('HGET', KEYS[1], 'token') ~= ARGV[1] then
+        return 0
+    end
+    redis.call('DEL', KEYS[1])
+    redis.call('SREM', KEYS[2], ARGV[3])
+    return 1
+    """
+
+    REVOKE_USER = """
+    local sids = redis.call('SMEMBERS', KEYS[1])
+    for _, sid in ipairs(sids) do
+        redis.call('DEL', ARGV[1] .. sid)
+    end
+    redis.call('DEL', KEYS[1])
+    return #sids
+    """
+
+    def __init__(self, ttl: int, redis):
+        """
+        :param ttl: int: time to live of session in seconds
+        :param redis: redis.asyncio.Redis: redis client
+
+        """
+        super().__init__(ttl)
+        self.redis = redis
+        self._rotate = redis.register_script(self.ROTATE)
+        self._revoke = redis.register_script(self.REVOKE)
+        self._revoke_user = redis.register_script(self.REVOKE_USER)
+
+    def _keys(self, sid: str, email: str) -> list[str]:
+        return [self.session_prefix + sid, self.user_prefix + email]
+
+    async def create(self, sid: str, email: str, token: str, device: str | None = None) -> None:
+        session_key, user_key = self._keys(sid, email)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(session_key, mapping={"email": email, "token": token_digest(token), "device": device or ""})
+            pipe.expire(session_key, self.ttl)
+            pipe.sadd(user_key, sid)
+            pipe.expire(user_key, self.ttl)
+            await pipe.execute()
+
+    async def rotate(self, sid: str, email: str, old_token: str, new_token: str) -> bool:
+        result = await self._rotate(keys=self._keys(sid, email),
+                                    args=[token_digest(old_token), token_digest(new_token), email, sid, self.ttl])
+        return bool(result)
+
+    async def revoke(self, sid: str, email: str, token: str) -> bool:
+        result = await self._revoke(keys=self._keys(sid, email), args=[token_digest(token), email, sid])
+        return bool(result)
+
+    async def revoke_user(self, email: str) -> int:
+        return await self._revoke_user(keys=[self.user_prefix + email], args=[self.session_prefix])
+
+    async def get_sessions(self, email: str) -> list[RefreshSession]:
+        sessions = []
+        for sid in await self.redis.smembers(self.user_prefix + email):
+            sid = sid.decode() if isinstance(sid, bytes) else sid
+            data = await self.redis.hgetall(self.session_prefix + sid)
+            if data:
+                data = {(k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+                        for k, v in data.items()}
+                sessions.append(RefreshSession(sid=sid, email=data["email"], token=data["token"],
+                                               device=data.get("device") or None))
+        return sessions
+
+
+def create_session_store(backend: str) -> SessionStore:
+    """
+    Create session store by name of backend.
+
+    :param backend: str: "redis" or "memory"
+    :return: SessionStore: session store
+    :raise ValueError: if backend is unknown
+
+    """
+    if backend == "redis":
+        return RedisSessionStore(ttl=config.REFRESH_TOKEN_TTL, redis=get_async_cache())
+    if backend == "memory":
+        return MemorySessionStore(ttl=config.REFRESH_TOKEN_TTL)
+    raise ValueError(f"Unknown session store backend: {backend}")
+
+
+session_store = create_session_store(config.SESSION_STORE)
+
+
+def get_session_store() -> SessionStore:
+    """
+    Dependency of session store, override it in tests.
+    """
+    return session_store
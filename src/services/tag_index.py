@@ -0,0 +1,215 @@
+import asyncio
+import bisect
+import heapq
+import json
+import uuid
+from collections import Counter
+
+from redis.exceptions import RedisError
+from sqlalchemy import exc, event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from src.conf.config import config
+from src.database.models import PublicationTagAssociation, Tag
+from src.dependency import get_async_cache
+from src.utils import metrics
+from src.utils.my_logger import logger
+
+_PENDING_KEY = "tag_index_pending"
+
+
+class TagIndex:
+    """
+    In-process autocomplete index of tag names with numbers of publications using them.
+
+    Names are kept in a sorted array of casefolded keys, a prefix is found by binary search and
+    matching names are ranked by usage. The index is loaded at startup and updated by commits which
+    create or attach tags; other workers receive the changes by Redis pub/sub and the whole index
+    is reloaded periodically, so a missed message only lasts until the next reload.
+    """
+    channel = "tags:changes"
+
+    def __init__(self, redis=None, reload_interval: float = 600):
+        """
+        :param redis: redis.asyncio.Redis | None: client of pub/sub, None - changes of this worker only
+        :param reload_interval: float: seconds between full reloads from database, 0 disables them
+
+        """
+        self.redis = redis
+        self.reload_interval = reload_interval
+        self.origin = uuid.uuid4().hex
+        self._keys: list[str] = []
+        self._names: list[str] = []
+        self._usage: dict[str, int] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._background: list[asyncio.Task] = []
+        self.loaded = False
+        self.lookups = 0
+        self.received = 0
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def _add(self, name: str) -> None:
+        key = name.casefold()
+        position = bisect.bisect_left(self._keys, key)
+        while position < len(self._keys) and self._keys[position] == key and self._names[position] < name:
+            position += 1
+        self._keys.insert(position, key)
+        self._names.insert(position, name)
+
+    def replace(self, usage: dict[str, int]) -> None:
+        """
+        Replace content of index.
+
+        :param usage: dict[str, int]: numbers of publications by tag name
+        :return: None
+        """
+        names = sorted(usage, key=lambda name: (name.casefold(), name))
+        self._keys, self._names, self._usage = [name.casefold() for name in names], names, dict(usage)
+        self.loaded = True
+
+    def apply(self, changes: dict[str, int]) -> None:
+        """
+        Apply changes of usage, unknown names are inserted.
+
+        :param changes: dict[str, int]: changes of numbers of publications by tag name, 0 for a new unused tag
+        :return: None
+        """
+        for name, delta in changes.items():
+            if name not in self._usage:
+                self._add(name)
+                self._usage[name] = 0
+            self._usage[name] = max(self._usage[name] + delta, 0)
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[tuple[str, int]]:
+        """
+        Get the most used tags starting with prefix, case-insensitive.
+
+        :param prefix: str: beginning of tag name
+        :param limit: int: maximum of suggestions
+        :return: list[tuple[str, int]]: names with numbers of publications, most used first
+        """
+        self.lookups += 1
+        prefix = prefix.casefold()
+        start = bisect.bisect_left(self._keys, prefix)
+        end = bisect.bisect_left(self._keys, prefix + "\U0010ffff", lo=start)
+        matches = ((name, self._usage[name]) for name in self._names[start:end])
+        return heapq.nsmallest(limit, matches, key=lambda match: (-match[1], match[0].casefold(), match[0]))
+
+    async def load(self, db: AsyncSession) -> None:
+        """
+        Load all tags with numbers of their publications.
+
+        :param db: AsyncSession: database session
+        :return: None
+        """
+        stmt = (select(Tag.name, func.count(PublicationTagAssociation.publication_id))
+                .outerjoin(PublicationTagAssociation, PublicationTagAssociation.tag_id == Tag.id)
+                .group_by(Tag.id, Tag.name))
+        self.replace({name: count for name, count in (await db.execute(stmt)).all()})
+
+    @staticmethod
+    def track(db: AsyncSession, changes: dict[str, int]) -> None:
+        """
+        Remember changes of tags made in session, they are applied and published after commit.
+
+        :param db: AsyncSession: database session making the changes
+        :param changes: dict[str, int]: changes of numbers of publications by tag name, 0 for a new unused tag
+        :return: None
+        """
+        pending = db.sync_session.info.setdefault(_PENDING_KEY, Counter())
+        for name, delta in changes.items():
+            pending[name] += delta
+
+    def committed(self, changes: dict[str, int]) -> None:
+        self.apply(changes)
+        if self.redis is None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        task = loop.create_task(self.publish(changes))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def publish(self, changes: dict[str, int]) -> None:
+        try:
+            await self.redis.publish(self.channel, json.dumps({"origin": self.origin, "changes": changes}))
+        except RedisError as err:
+            logger.warning(f"tag index publish failed: {err}")
+
+    def receive(self, data: str | bytes) -> None:
+        message = json.loads(data)
+        if message["origin"] != self.origin:
+            self.received += 1
+            self.apply(message["changes"])
+
+    async def _subscribe(self) -> None:
+        while True:
+            try:
+                async with self.redis.pubsub() as pubsub:
+                    await pubsub.subscribe(self.channel)
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            self.receive(message["data"])
+            except (RedisError, OSError) as err:
+                logger.warning(f"tag index subscription failed: {err}")
+            await asyncio.sleep(5)
+
+    async def _reload(self, sessions) -> None:
+        try:
+            async with sessions() as db:
+                await self.load(db)
+        except (exc.SQLAlchemyError, OSError) as err:
+            logger.warning(f"tag index wasn't loaded: {err}")
+
+    async def _reload_periodically(self, sessions) -> None:
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            await self._reload(sessions)
+
+    async def start(self, sessions) -> None:
+        """
+        Load index and keep it in sync in background.
+
+        :param sessions: callable returning async context manager of AsyncSession, e.g. sessionmanager.session
+        :return: None
+        """
+        if self._background:
+            return
+        await self._reload(sessions)
+        loop = asyncio.get_running_loop()
+        if self.redis is not None:
+            self._background.append(loop.create_task(self._subscribe()))
+        if self.reload_interval > 0:
+            self._background.append(loop.create_task(self._reload_periodically(sessions)))
+
+    async def stop(self) -> None:
+        for task in self._background:
+            task.cancel()
+        self._background = []
+
+    def stats(self) -> dict[str, int]:
+        return {"tags": len(self), "lookups": self.lookups, "received": self.received}
+
+
+tag_index = TagIndex(
+    redis=get_async_cache() if config.TAG_INDEX_REDIS else None,
+    reload_interval=config.TAG_INDEX_RELOAD_INTERVAL,
+)
+metrics.register("tag_index", tag_index.stats)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_tag_changes(session: Session) -> None:
+    changes = session.info.pop(_PENDING_KEY, None)
+    if changes:
+        tag_index.committed(dict(changes))
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _forget_tag_changes(session: Session, previous_transaction) -> None:
+    session.info.pop(_PENDING_KEY, None)
@@ -0,0 +1,100 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any
+
+from fastapi import Request, Response, status
+
+ETAG_HEADER = "ETag"
+LAST_MODIFIED_HEADER = "Last-Modified"
+
+
+def version_etag(*parts: Any) -> str:
+    """
+    Weak ETag of a response from what its content depends on, e.g. ids, updated_at and rating aggregates.
+
+    :param parts: Any: values identifying version of content, their repr is hashed
+    :return: str: weak ETag
+    """
+    return f'W/"{hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()}"'
+
+
+def body_etag(body: bytes) -> str:
+    """
+    Strong ETag of a serialized response.
+
+    :param body: bytes: body of response
+    :return: str: ETag
+    """
+    return f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+
+def _utc(value: datetime) -> datetime:
+    # SQLite returns naive timestamps, they are stored in UTC
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime | None = None) -> bool:
+    """
+    Evaluate preconditions of GET: If-None-Match by weak comparison, If-Modified-Since only without it.
+
+    :param request: Request: request with conditional headers
+    :param etag: str: current ETag of response
+    :param last_modified: datetime | None: current modification time of response
+    :return: bool: True if the client's copy is current and 304 should be returned
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if last_modified is None or if_modified_since is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return _utc(last_modified).replace(microsecond=0) <= _utc(since)
+
+
+def set_validators(response: Response, etag: str, last_modified: datetime | None = None) -> None:
+    """
+    Set ETag and Last-Modified headers of response.
+
+    :param response: Response: response of route
+    :param etag: str: ETag
+    :param last_modified: datetime | None: modification time, omitted if None
+    :return: None
+    """
+    response.headers[ETAG_HEADER] = etag
+    if last_modified is not None:
+        response.headers[LAST_MODIFIED_HEADER] = format_datetime(_utc(last_modified), usegmt=True)
+
+
+def conditional(request: Request, response: Response, etag: str,
+                last_modified: datetime | None = None) -> Response | None:
+    """
+    Answer conditional GET: 304 if the client's copy is current, else validators are set on response.
+
+    Example usage:
+    ```
+    not_modified = conditional(request, response, version_etag(publication_id, *version))
+    if not_modified is not None:
+        return not_modified
+    ```
+
+    :param request: Request: request with conditional headers
+    :param response: Response: response of route to set validators
+    :param etag: str: current ETag
+    :param last_modified: datetime | None: current modification time, only if every change updates it
+    :return: Response | None: 304 response or None if the body must be sent
+    """
+    if is_not_modified(request, etag, last_modified):
+        not_modified = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+        set_validators(not_modified, etag, last_modified)
+        return not_modified
+    set_validators(response, etag, last_modified)
+    return None
@@ -0,0 +1,25 @@
+from typing import Any, Callable
+
+_collectors: dict[str, Callable[[], dict[str, Any]]] = {}
+
+
+def register(name: str, collector: Callable[[], dict[str, Any]]) -> None:
+    """
+    Register collector of metrics, it's called on every read of metrics.
+
+    :param name: str: name of metrics group, for example "jwt_decode_cache"
+    :param collector: Callable: function without arguments returning dict of metrics
+    :return: None
+
+    """
+    _collectors[name] = collector
+
+
+def collect() -> dict[str, dict[str, Any]]:
+    """
+    Collect all registered metrics.
+
+    :return: dict: metrics by name of group
+
+    """
+    return {name: collector() for name, collector in _collectors.items()}
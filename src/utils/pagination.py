@@ -0,0 +1,140 @@
+import base64
+import binascii
+import json
+from datetime import datetime
+from typing import Any, Sequence
+
+from fastapi import HTTPException, Response, status
+from sqlalchemy import Select, func, select, tuple_
+from sqlalchemy.orm import InstrumentedAttribute
+
+from src.messages import INVALID_CURSOR
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """
+    Encode values of sort key to opaque url-safe cursor.
+
+    :param values: Sequence: values of the last item of page, datetimes are kept in isoformat
+    :return: str: cursor
+    """
+    values = [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str, types: Sequence[type]) -> list[Any]:
+    """
+    Decode cursor made by encode_cursor.
+
+    :param cursor: str: cursor from request
+    :param types: Sequence[type]: python types of values
+    :return: list: values of sort key
+    :raises HTTPException: 400 if cursor is malformed
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return [datetime.fromisoformat(value) if type_ is datetime else type_(value)
+                for type_, value in zip(types, values)]
+    except (ValueError, TypeError, binascii.Error):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=INVALID_CURSOR)
+
+
+class Keyset:
+    """
+    Keyset (cursor) pagination over unique ordered columns, e.g. ``(created_at, id)``.
+
+    Cursor is an opaque url-safe string with values of the last item of a page, the next page continues
+    strictly after it with ``WHERE (created_at, id) < (:created_at, :id)``. Unlike OFFSET, deep pages cost
+    the same as the first one and rows inserted meanwhile don't shift the page.
+
+    Values are compared as stored in database: they are selected by the unique column of cursor,
+    and the decoded ones are used only if the row was deleted. SQLite keeps timestamps as strings
+    and a decoded datetime wouldn't compare equal to its stored value.
+
+    Example usage:
+    ```
+    keyset = Keyset(Publication.created_at, Publication.id, descending=True)
+    stmt = keyset.paginate(select(Publication), cursor, offset, limit)
+    next_cursor = keyset.next_cursor(publications, limit)
+    ```
+    """
+
+    def __init__(self, *columns: InstrumentedAttribute, descending: bool = False):
+        """
+        :param columns: InstrumentedAttribute: columns of sort key, the last one must be unique
+        :param descending: bool: sort newest first
+
+        """
+        self.columns = columns
+        self.descending = descending
+
+    def encode(self, item: Any) -> str:
+        """
+        Encode cursor pointing after the item.
+
+        :param item: Any: model instance, the last item of page
+        :return: str: cursor
+        """
+        return encode_cursor([getattr(item, column.key) for column in self.columns])
+
+    def decode(self, cursor: str) -> list[Any]:
+        """
+        Decode cursor to values of sort key.
+
+        :param cursor: str: cursor from request
+        :return: list: values of columns
+        :raises HTTPException: 400 if cursor is malformed
+        """
+        return decode_cursor(cursor, [column.type.python_type for column in self.columns])
+
+    def paginate(self, stmt: Select, cursor: str | None, offset: int, limit: int) -> Select:
+        """
+        Order and limit query. Page starts after cursor if it's given, else at offset.
+
+        :param stmt: Select: query of items
+        :param cursor: str | None: cursor from previous page
+        :param offset: int: number of items to skip, used only without cursor
+        :param limit: int: size of page
+        :return: Select: query of page
+        """
+        stmt = stmt.order_by(*(column.desc() if self.descending else column.asc() for column in self.columns))
+        if cursor is None:
+            return stmt.offset(offset).limit(limit)
+
+        *values, unique = self.decode(cursor)
+        *columns, unique_column = self.columns
+        stored = [func.coalesce(select(column).where(unique_column == unique).correlate(None).scalar_subquery(),
+                                value) for column, value in zip(columns, values)]
+        key, after = tuple_(*self.columns), tuple_(*stored, unique)
+        return stmt.where(key < after if self.descending else key > after).limit(limit)
+
+    def next_cursor(self, items: Sequence[Any], limit: int) -> str | None:
+        """
+        Get cursor of the next page.
+
+        :param items: Sequence: items of page
+        :param limit: int: size of page
+        :return: str | None: cursor or None if the page is the last one
+        """
+        if not items or len(items) < limit:
+            return None
+        return self.encode(items[-1])
+
+
+def set_next_cursor(response: Response, keyset: Keyset, items: Sequence[Any], limit: int) -> None:
+    """
+    Set cursor of the next page in X-Next-Cursor header of response.
+
+    :param response: Response: response of route
+    :param keyset: Keyset: keyset the page was fetched with
+    :param items: Sequence: items of page
+    :param limit: int: size of page
+    :return: None
+    """
+    cursor = keyset.next_cursor(items, limit)
+    if cursor is not None:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
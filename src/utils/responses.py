@@ -0,0 +1,74 @@
+"""
+Fast JSON responses for read-heavy routes.
+
+FastAPI validates content returned by a route against response_model (pydantic models are dumped
+to dicts and validated again), converts the result to JSON-compatible python objects and encodes
+them with the json module. Routes may opt in to:
+
+- ``response_class=FastJSONResponse``: the same validation, encoding by orjson;
+- returning ``json_response(schema, content, response)``: content is validated once by a cached
+  TypeAdapter and serialized straight to JSON bytes, FastAPI doesn't validate a returned Response.
+
+See benchmarks/bench_responses.py.
+"""
+import functools
+from typing import Any
+
+import orjson
+from fastapi import Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, TypeAdapter
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response encoded by orjson, bytes content is sent as is.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+@functools.cache
+def type_adapter(schema: Any) -> TypeAdapter:
+    """
+    Get TypeAdapter of schema, built once per schema.
+
+    :param schema: Any: hashable type, e.g. ``list[PublicationResponse]``
+    :return: TypeAdapter: adapter
+    """
+    return TypeAdapter(schema)
+
+
+def json_response(schema: Any, content: Any, response: Response | None = None,
+                  status_code: int = 200) -> FastJSONResponse:
+    """
+    Validate content by schema and serialize it, instead of validation of FastAPI against response_model.
+
+    Example usage:
+    ```
+    @router.get("/", response_model=list[PublicationResponse], response_class=FastJSONResponse)
+    async def read(response: Response, db: AsyncSession = Depends(get_db)):
+        return json_response(list[PublicationResponse], await get_publications(db), response)
+    ```
+
+    :param schema: Any: type of content, the same as response_model of route
+    :param content: Any: models, ORM objects are read by attributes
+    :param response: Response | None: response parameter of route, its headers are kept
+    :param status_code: int: status code
+    :return: FastJSONResponse: response with serialized content
+    """
+    adapter = type_adapter(schema)
+    result = FastJSONResponse(adapter.dump_json(adapter.validate_python(content, from_attributes=True)),
+                              status_code=status_code)
+    if response is not None:
+        result.raw_headers.extend(response.raw_headers)
+    return result
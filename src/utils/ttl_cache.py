@@ -0,0 +1,123 @@
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Bounded in-process LRU cache with per-entry expiry.
+
+    Least recently used entries are evicted once ``maxsize`` is reached, expired entries are dropped lazily
+    on access. Hit, miss and eviction counters are kept for monitoring.
+
+    Example usage:
+    ```
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("key", "value")
+    cache.get("key")  # "value"
+    ```
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float | None = None, timer: Callable[[], float] = time.monotonic):
+        """
+        :param maxsize: int: maximum number of entries kept in cache
+        :param ttl: float | None: default time to live of entry in seconds, None - entries never expire
+        :param timer: callable: monotonic clock used to compute expiry
+
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._data: OrderedDict[Hashable, tuple[float | None, Any]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Get value by key and mark it as recently used.
+
+        :param key: Hashable: cache key
+        :param default: Any: value returned if key is missing or expired
+        :return: Any: cached value or default
+
+        """
+        item = self._data.get(key, _MISSING)
+        if item is _MISSING:
+            self.misses += 1
+            return default
+
+        expires_at, value = item
+        if expires_at is not None and expires_at <= self._timer():
+            del self._data[key]
+            self.misses += 1
+            return default
+
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None) -> None:
+        """
+        Put value in cache, evict least recently used entry if cache is full.
+
+        :param key: Hashable: cache key
+        :param value: Any: value to cache
+        :param ttl: float | None: time to live in seconds, default - ttl of cache
+        :return: None
+
+        """
+        if self.maxsize <= 0:
+            return
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            self._data.pop(key, None)
+            return
+
+        expires_at = None if ttl is None else self._timer() + ttl
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        """
+        Remove key from cache.
+
+        :param key: Hashable: cache key
+        :param default: Any: value returned if key is missing
+        :return: Any: removed value or default
+
+        """
+        item = self._data.pop(key, _MISSING)
+        return default if item is _MISSING else item[1]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def stats(self) -> dict[str, int | float]:
+        """
+        Get cache counters.
+
+        :return: dict: size, maxsize, hits, misses, evictions and hit_rate
+
+        """
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def __contains__(self, key: Hashable) -> bool:
+        item = self._data.get(key, _MISSING)
+        return item is not _MISSING and (item[0] is None or item[0] > self._timer())
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -10,8 +10,9 @@ from sqlalchemy.pool import StaticPool
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from main import app
 from src.database.models import Base, User
-from src.database.db import get_db
+from src.database.db import get_db, get_read_db
 from src.services.auth import auth_service
+from src.services.sessions import MemorySessionStore, get_session_store
 
 SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
@@ -54,6 +55,9 @@ def client():
             await session.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
+    session_store = MemorySessionStore(ttl=3600)
+    app.dependency_overrides[get_session_store] = lambda: session_store
 
     yield TestClient(app)
 
@@ -0,0 +1,89 @@
+import unittest
+from datetime import datetime
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Publication, PubImage, User
+from src.repositories.comments import add_comment, delete_comment, get_comments, get_comments_version
+from src.repositories.publications import get_all_publications
+from src.schemas.comments import CommentModelEditing, CommentWithAuthor
+from src.services.read_cache import read_cache
+
+
+class TestCommentCount(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        read_cache.clear()
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+        async with self.sessions() as db:
+            self.users = [User(username=f"user{i}", email=f"user{i}@example.com", password="x",
+                               avatar=f"avatar{i}" if i else None, updated_at=datetime(2024, 1, 1))
+                          for i in range(2)]
+            self.publication = Publication(title="title", user=self.users[0],
+                                           image=PubImage(current_img="image", updated_img="updated"))
+            db.add_all([*self.users, self.publication])
+            await db.commit()
+
+    async def asyncTearDown(self):
+        read_cache.clear()
+        await self.engine.dispose()
+
+    async def comment_count(self) -> int:
+        async with self.sessions() as db:
+            return (await db.get(Publication, self.publication.id)).comment_count
+
+    async def test_count_is_maintained(self):
+        comments = []
+        for i in range(3):
+            async with self.sessions() as db:
+                comments.append(await add_comment(self.publication.id, self.users[i % 2],
+                                                  CommentModelEditing(text=f"comment {i}"), db))
+        self.assertEqual(await self.comment_count(), 3)
+
+        async with self.sessions() as db:
+            # only the author deletes
+            self.assertIsNone(await delete_comment(comments[0].id, self.users[1], db))
+            self.assertIsNotNone(await delete_comment(comments[0].id, self.users[0], db))
+        self.assertEqual(await self.comment_count(), 2)
+
+        async with self.sessions() as db:
+            self.assertIsNone(await add_comment(self.publication.id + 1, self.users[0],
+                                                CommentModelEditing(text="x"), db))
+            feed = await get_all_publications(10, 0, db)
+        self.assertEqual(feed[0].comment_count, 2)
+
+    async def test_comments_with_authors(self):
+        for i in range(3):
+            async with self.sessions() as db:
+                await add_comment(self.publication.id, self.users[i % 2],
+                                  CommentModelEditing(text=f"comment {i}"), db)
+
+        async with self.sessions() as db:
+            comments = await get_comments(self.publication.id, 0, 10, db)
+            # nothing is hydrated
+            self.assertEqual(len(db.identity_map), 0)
+
+        self.assertTrue(all(isinstance(comment, CommentWithAuthor) for comment in comments))
+        self.assertEqual(sorted((comment.text, comment.username, comment.avatar) for comment in comments),
+                         [("comment 0", "user0", None), ("comment 1", "user1", "avatar1"),
+                          ("comment 2", "user0", None)])
+
+    async def test_author_change(self):
+        async with self.sessions() as db:
+            await add_comment(self.publication.id, self.users[1], CommentModelEditing(text="comment"), db)
+        async with self.sessions() as db:
+            version = await get_comments_version(self.publication.id, db)
+            self.assertEqual((await get_comments(self.publication.id, 0, 10, db))[0].username, "user1")
+
+        async with self.sessions() as db:
+            user = await db.get(User, self.users[1].id)
+            user.username = "renamed"
+            await db.commit()
+
+        async with self.sessions() as db:
+            self.assertNotEqual(await get_comments_version(self.publication.id, db), version)
+            self.assertEqual((await get_comments(self.publication.id, 0, 10, db))[0].username, "renamed")
@@ -0,0 +1,99 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+from starlette.requests import Request
+
+from src.database.db import get_read_db
+from src.database.models import Base, Publication, PubImage, User
+from src.repositories.ratings import update_publication_stats
+from src.routing.publications import router
+from src.services.read_cache import read_cache
+from src.utils.conditional import is_not_modified, version_etag
+
+
+def request(**headers: str) -> Request:
+    return Request({"type": "http", "headers": [(name.replace("_", "-").encode(), value.encode())
+                                                for name, value in headers.items()]})
+
+
+class TestPreconditions(unittest.TestCase):
+    def test_if_none_match(self):
+        etag = version_etag(1, "a")
+        self.assertEqual(etag, version_etag(1, "a"))
+        self.assertNotEqual(etag, version_etag(1, "b"))
+
+        self.assertTrue(is_not_modified(request(if_none_match=f'"x", {etag}'), etag))
+        self.assertTrue(is_not_modified(request(if_none_match=etag.removeprefix("W/")), etag))
+        self.assertTrue(is_not_modified(request(if_none_match="*"), etag))
+        self.assertFalse(is_not_modified(request(if_none_match='"x"'), etag))
+        self.assertFalse(is_not_modified(request(), etag))
+
+    def test_if_modified_since(self):
+        modified = datetime(2024, 1, 2, 3, 4, 5, 600000)
+        since = format_datetime(modified.replace(tzinfo=timezone.utc), usegmt=True)
+        earlier = format_datetime((modified - timedelta(seconds=1)).replace(tzinfo=timezone.utc), usegmt=True)
+
+        self.assertTrue(is_not_modified(request(if_modified_since=since), "etag", modified))
+        self.assertFalse(is_not_modified(request(if_modified_since=earlier), "etag", modified))
+        self.assertFalse(is_not_modified(request(if_modified_since="not a date"), "etag", modified))
+        # If-None-Match takes precedence
+        self.assertFalse(is_not_modified(request(if_none_match='"x"', if_modified_since=since), "etag", modified))
+
+
+class TestConditionalGet(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+        async with self.sessions() as db:
+            db.add_all([User(id=1, username="user", email="user@example.com", password="x"),
+                        Publication(id=1, title="title", user_id=1),
+                        PubImage(publication_id=1, current_img="image")])
+            await db.commit()
+        read_cache.clear()
+
+        async def db():
+            async with self.sessions() as session:
+                yield session
+
+        self.app = FastAPI()
+        self.app.include_router(router)
+        self.app.dependency_overrides[get_read_db] = db
+
+    async def asyncTearDown(self):
+        read_cache.clear()
+        await self.engine.dispose()
+
+    async def get(self, path: str, **headers: str):
+        async with AsyncClient(app=self.app, base_url="http://test") as client:
+            return await client.get(path, headers=headers)
+
+    async def test_publication_not_modified_until_rated(self):
+        response = await self.get("/publications/1")
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response.headers["ETag"], response.headers["Last-Modified"]
+
+        response = await self.get("/publications/1", **{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+        response = await self.get("/publications/1", **{"If-Modified-Since": last_modified})
+        self.assertEqual(response.status_code, 304)
+
+        async with self.sessions() as db:
+            await update_publication_stats(1, 1, 5, db)
+            await db.commit()
+        response = await self.get("/publications/1", **{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["average_rating"], 5)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+    async def test_missing_publication(self):
+        response = await self.get("/publications/2", **{"If-None-Match": "*"})
+        self.assertEqual(response.status_code, 404)
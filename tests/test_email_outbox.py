@@ -0,0 +1,105 @@
+import contextlib
+import socket
+import unittest
+
+from aiosmtpd.controller import Controller
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, EmailOutbox, EmailStatus
+from src.repositories.email_outbox import add_email
+from src.services.email import OutboxWorker, SMTPPool
+
+
+class Handler:
+    def __init__(self):
+        self.messages = []
+        self.peers = set()
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("bounce"):
+            return "550 no such user"
+        if address.startswith("busy"):
+            return "451 try again later"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.peers.add(session.peer)
+        return "250 Message accepted for delivery"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestOutboxWorker(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.handler = Handler()
+        self.smtpd = Controller(self.handler, hostname="127.0.0.1", port=free_port())
+        self.smtpd.start()
+
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.engine = engine
+        self.sessions = async_sessionmaker(bind=engine)
+
+        @contextlib.asynccontextmanager
+        async def session_factory():
+            async with self.sessions() as session:
+                yield session
+
+        self.pool = SMTPPool(size=2, hostname="127.0.0.1", port=self.smtpd.port,
+                             use_tls=False, start_tls=False)
+        self.worker = OutboxWorker(self.pool, session_factory, batch_size=10, retry_base=30)
+
+    async def asyncTearDown(self):
+        await self.pool.close()
+        self.smtpd.stop()
+        await self.engine.dispose()
+
+    async def add_emails(self, *recipients: str):
+        async with self.sessions() as db:
+            for recipient in recipients:
+                add_email(recipient, "Confirm your email", "verify_email.html",
+                          {"host": "http://test/", "username": recipient, "token": "token"}, db)
+            await db.commit()
+
+    async def get_emails(self) -> dict[str, EmailOutbox]:
+        async with self.sessions() as db:
+            emails = (await db.execute(select(EmailOutbox))).scalars().all()
+            return {email.recipient: email for email in emails}
+
+    async def test_batch_sent_on_pooled_connections(self):
+        await self.add_emails(*(f"user{i}@example.com" for i in range(5)))
+
+        self.assertEqual(await self.worker.run_once(), 5)
+        self.assertEqual(await self.worker.run_once(), 0)
+
+        self.assertEqual(len(self.handler.messages), 5)
+        self.assertIn(b"http://test/api/v1/auth/confirmed_email/token", self.handler.messages[0].content)
+        # 5 messages were sent on no more than 2 pooled connections
+        self.assertLessEqual(len(self.handler.peers), 2)
+        emails = await self.get_emails()
+        self.assertTrue(all(email.status == EmailStatus.sent for email in emails.values()))
+        self.assertEqual(self.worker.stats()["sent"], 5)
+
+    async def test_retry_transient_and_fail_permanent(self):
+        await self.add_emails("ok@example.com", "busy@example.com", "bounce@example.com")
+
+        self.assertEqual(await self.worker.run_once(), 3)
+
+        emails = await self.get_emails()
+        self.assertEqual(emails["ok@example.com"].status, EmailStatus.sent)
+        self.assertEqual(emails["busy@example.com"].status, EmailStatus.pending)
+        self.assertEqual(emails["busy@example.com"].attempts, 1)
+        self.assertIn("451", emails["busy@example.com"].last_error)
+        self.assertEqual(emails["bounce@example.com"].status, EmailStatus.failed)
+        # busy email is postponed by backoff
+        self.assertEqual(await self.worker.run_once(), 0)
+        self.assertEqual(self.worker.stats(), {"sent": 1, "retried": 1, "failed": 1})
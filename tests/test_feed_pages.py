@@ -0,0 +1,62 @@
+import json
+import unittest
+
+from fakeredis import aioredis
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Publication, PubImage, User
+from src.repositories.publications import get_all_publications, publications_keyset
+from src.schemas.publications import PublicationUsersResponse
+from src.services.feed_pages import FeedPages
+
+
+class TestFeedPages(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+        async with self.sessions() as db:
+            db.add(User(id=1, username="user", email="user@example.com", password="x", avatar="avatar"))
+            for i in range(1, 6):
+                db.add_all([Publication(id=i, title=f"title {i}", user_id=1),
+                            PubImage(publication_id=i, current_img=f"image {i}")])
+            await db.commit()
+
+        self.feed = FeedPages(redis=aioredis.FakeRedis(), pages=2, page_size=2)
+        await self.feed.start(self.sessions)
+        await self.feed.stop()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def assert_pages_match_database(self):
+        async with self.sessions() as db:
+            for offset in (0, 2):
+                publications = await get_all_publications(2, offset, db)
+                body, cursor = await self.feed.get_page(offset, 2)
+                expected = [PublicationUsersResponse.model_validate(publication, from_attributes=True)
+                            .model_dump(mode="json") for publication in publications]
+                self.assertEqual(json.loads(body), expected)
+                self.assertEqual(cursor, publications_keyset.next_cursor(publications, 2))
+
+    async def test_pages_are_materialized(self):
+        await self.assert_pages_match_database()
+        self.assertIsNone(await self.feed.get_page(4, 2))
+        self.assertIsNone(await self.feed.get_page(0, 10))
+
+    async def test_changes_rebuild_pages_incrementally(self):
+        async with self.sessions() as db:
+            publication = await db.get(Publication, 5)
+            publication.title = "changed"
+            db.add_all([Publication(id=6, title="new", user_id=1), PubImage(publication_id=6, current_img="new")])
+            await db.commit()
+        serialized = self.feed.counters["serialized"]
+
+        self.feed.changed(["publication:5", "publication:6", "comments:5"])
+        await self.feed.stop()
+
+        await self.assert_pages_match_database()
+        self.assertEqual(self.feed.counters["serialized"] - serialized, 2)
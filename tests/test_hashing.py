@@ -0,0 +1,52 @@
+import asyncio
+import unittest
+
+from fastapi import HTTPException
+
+from src.services.hashing import HashingPool, calibrate_rounds, hash_password, verify_and_update, verify_password
+
+
+class TestHashingPool(unittest.IsolatedAsyncioTestCase):
+    async def test_hash_and_verify_in_process_pool(self):
+        pool = HashingPool(workers=1, max_pending=4)
+        try:
+            hashed = await pool.run(hash_password, "12345678")
+            self.assertTrue(await pool.run(verify_password, "12345678", hashed))
+            self.assertFalse(await pool.run(verify_password, "87654321", hashed))
+        finally:
+            pool.shutdown()
+
+    async def test_reject_when_saturated(self):
+        pool = HashingPool(workers=0, max_pending=1)
+        hashed = hash_password("12345678")
+        first = asyncio.create_task(pool.run(verify_password, "12345678", hashed))
+        await asyncio.sleep(0)
+
+        with self.assertRaises(HTTPException) as err:
+            await pool.run(verify_password, "12345678", hashed)
+        self.assertEqual(err.exception.status_code, 503)
+        self.assertTrue(await first)
+        self.assertEqual(pool.stats()["rejected"], 1)
+        self.assertEqual(pool.pending, 0)
+
+    async def test_timings_in_stats(self):
+        pool = HashingPool(workers=0, max_pending=1)
+        await pool.run(verify_password, "12345678", hash_password("12345678", 4))
+        timing = pool.stats()["timings"]["verify_password"]
+        self.assertEqual(timing["calls"], 1)
+        self.assertGreaterEqual(timing["max_ms"], timing["avg_ms"])
+
+
+class TestBcryptCost(unittest.TestCase):
+    def test_calibrate_rounds_within_bounds(self):
+        self.assertEqual(calibrate_rounds(target_ms=0, min_rounds=4, max_rounds=6), 4)
+        self.assertEqual(calibrate_rounds(target_ms=10 ** 9, min_rounds=4, max_rounds=6), 6)
+
+    def test_rehash_weaker_hash_on_verify(self):
+        weak = hash_password("12345678", 4)
+        verified, new_hash = verify_and_update("12345678", weak, 5)
+        self.assertTrue(verified)
+        self.assertIn("$05$", new_hash)
+
+        self.assertEqual(verify_and_update("12345678", new_hash, 5), (True, None))
+        self.assertEqual(verify_and_update("87654321", weak, 5), (False, None))
@@ -0,0 +1,57 @@
+import unittest
+
+from sqlalchemy import event, select
+from sqlalchemy.exc import InvalidRequestError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Publication, PubImage, Rating, Tag, User
+from src.repositories.loaders import LIST, OWNER_CHECK, publication_options
+
+
+class TestLoaderProfiles(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine)
+
+        async with self.sessions() as db:
+            users = [User(username=f"user{i}", email=f"user{i}@example.com", password="x") for i in range(3)]
+            tags = [Tag(name="cat"), Tag(name="dog")]
+            db.add_all([Publication(title=f"title {i}", user=users[0], image=PubImage(current_img=f"http://img/{i}"),
+                                    tags=tags, ratings=[Rating(score=4, user=users[1]), Rating(score=5, user=users[2])],
+                                    rating_count=2, rating_sum=9)
+                        for i in range(5)])
+            await db.commit()
+
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: self.statements.append(statement))
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_list_profile_loads_page_in_constant_queries(self):
+        async with self.sessions() as db:
+            result = await db.execute(select(Publication).options(*publication_options(LIST)).limit(3))
+            publications = result.scalars().all()
+
+            self.assertEqual(len(publications), 3)
+            for publication in publications:
+                self.assertEqual(publication.tags_name, "cat, dog")
+                self.assertEqual(publication.average_rating, 4.5)
+                self.assertEqual(publication.user.username, "user0")
+                self.assertTrue(publication.image.current_img.startswith("http://img/"))
+        # publications with image and owner, then tags
+        self.assertEqual(len(self.statements), 2)
+
+    async def test_owner_check_profile_raises_on_relationships(self):
+        async with self.sessions() as db:
+            result = await db.execute(select(Publication).options(*publication_options(OWNER_CHECK)).limit(1))
+            publication = result.scalar_one()
+
+            self.assertEqual(publication.title, "title 0")
+            with self.assertRaises(InvalidRequestError):
+                publication.tags
+        self.assertEqual(len(self.statements), 1)
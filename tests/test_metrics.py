@@ -0,0 +1,29 @@
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.database.models import Role
+from src.routing import metrics
+from src.services.auth import auth_service
+from src.services.principal import Principal
+
+
+class TestMetricsRoute(unittest.TestCase):
+    def setUp(self):
+        self.app = FastAPI()
+        self.app.include_router(metrics.router)
+        self.client = TestClient(self.app)
+
+    def login(self, role: Role) -> None:
+        principal = Principal(id=1, email="user@example.com", role=role)
+        self.app.dependency_overrides[auth_service.get_current_principal] = lambda: principal
+
+    def test_admin_only(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 401)
+        self.login(Role.moderator)
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.login(Role.admin)
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        self.assertIsInstance(response.json(), dict)
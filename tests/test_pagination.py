@@ -0,0 +1,93 @@
+import unittest
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Publication, User
+from src.repositories.publications import get_all_publications, publications_keyset
+
+START = datetime(2024, 1, 1, 12, 0, 0)
+
+
+class TestKeysetPagination(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+        async with self.sessions() as db:
+            self.user = User(username="user", email="user@example.com", password="x")
+            # pairs of publications share created_at, id breaks ties
+            db.add_all([Publication(title=f"title {i}", user=self.user, created_at=START + timedelta(minutes=i // 2))
+                        for i in range(25)])
+            await db.commit()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_pages_by_cursor_match_offset_order(self):
+        async with self.sessions() as db:
+            expected = [publication.id for publication in await get_all_publications(25, 0, db)]
+
+            seen, cursor = [], None
+            while True:
+                page = await get_all_publications(10, 0, db, cursor)
+                seen.extend(publication.id for publication in page)
+                cursor = publications_keyset.next_cursor(page, 10)
+                if cursor is None:
+                    break
+                # publications added meanwhile don't shift the next page
+                db.add(Publication(title="new", user_id=self.user.id, created_at=START + timedelta(days=1)))
+                await db.commit()
+
+        self.assertEqual(seen, expected)
+
+    async def walk(self, db, limit: int) -> list[int]:
+        seen, cursor = [], None
+        for _ in range(10):
+            page = await get_all_publications(limit, 0, db, cursor)
+            seen.extend(publication.id for publication in page)
+            cursor = publications_keyset.next_cursor(page, limit)
+            if cursor is None:
+                break
+        return seen
+
+    async def test_ties_of_database_timestamps(self):
+        async with self.sessions() as db:
+            # created in one transaction, timestamps are equal up to the precision of database
+            db.add_all([Publication(title="same time", user_id=self.user.id) for _ in range(12)])
+            await db.commit()
+
+            seen = await self.walk(db, 10)
+        self.assertEqual(len(seen), 37)
+        self.assertEqual(len(set(seen)), 37)
+
+    async def test_cursor_of_deleted_row(self):
+        async with self.sessions() as db:
+            first = await get_all_publications(10, 0, db)
+            second = await get_all_publications(10, 10, db)
+            cursor = publications_keyset.next_cursor(first, 10)
+            await db.delete(await db.get(Publication, first[-1].id))
+            await db.commit()
+
+            page = await get_all_publications(10, 0, db, cursor)
+        self.assertEqual([p.id for p in page], [p.id for p in second])
+
+    async def test_offset_still_works(self):
+        async with self.sessions() as db:
+            first = await get_all_publications(10, 0, db)
+            second = await get_all_publications(10, 10, db)
+        self.assertEqual(publications_keyset.decode(publications_keyset.encode(first[-1])),
+                         [first[-1].created_at, first[-1].id])
+        self.assertTrue(first[-1].created_at >= second[0].created_at)
+        self.assertFalse({p.id for p in first} & {p.id for p in second})
+
+    async def test_invalid_cursor(self):
+        for cursor in ("not a cursor", "WzFd", publications_keyset.encode(Publication(id=1, created_at=None))):
+            with self.assertRaises(HTTPException) as err:
+                publications_keyset.paginate(select(Publication), cursor, 0, 10)
+            self.assertEqual(err.exception.status_code, 400)
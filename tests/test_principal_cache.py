@@ -0,0 +1,131 @@
+import asyncio
+import unittest
+
+from fakeredis import FakeServer, aioredis
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from src.database.models import Base, User, Role
+from src.services.principal_cache import (InvalidationBroadcast, PrincipalCache, TokenVersionMap, principal_cache,
+                                          token_versions)
+from src.utils.ttl_cache import TTLCache
+
+
+class TestTTLCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = TTLCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_expiry(self):
+        now = [0.0]
+        cache = TTLCache(maxsize=10, ttl=5, timer=lambda: now[0])
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), 1)
+        now[0] = 6
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+
+class TestPrincipalCache(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        self.session_maker = async_sessionmaker(bind=self.engine)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with self.session_maker() as session:
+            session.add(User(username="cached", email="cached@example.com", password="hash", role=Role.user))
+            await session.commit()
+
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute",
+                     lambda *args: self.statements.append(args[2]))
+        self.cache = PrincipalCache(maxsize=10, ttl=60)
+
+    async def asyncTearDown(self):
+        principal_cache.local.clear()
+        token_versions.local.clear()
+        await self.engine.dispose()
+
+    async def test_hit_without_query(self):
+        async with self.session_maker() as session:
+            await self.cache.set(await session.get(User, 1))
+
+        self.statements.clear()
+        async with self.session_maker() as session:
+            user = await self.cache.get("cached@example.com", session)
+            self.assertEqual(user.username, "cached")
+            self.assertEqual(user.role, Role.user)
+            self.assertEqual(self.statements, [])
+
+            user.about = "changed"
+            await session.commit()
+            await session.refresh(user)
+            self.assertEqual(user.about, "changed")
+
+    async def test_invalidate_after_commit(self):
+        async with self.session_maker() as session:
+            user = await session.get(User, 1)
+            await principal_cache.set(user)
+            self.assertIn("cached@example.com", principal_cache.local)
+
+            user.is_active = False
+            await session.commit()
+
+        self.assertNotIn("cached@example.com", principal_cache.local)
+
+    async def test_block_bumps_token_version(self):
+        async with self.session_maker() as session:
+            self.assertEqual(await token_versions.get(1, session), (0, True))
+
+            self.statements.clear()
+            self.assertEqual(await token_versions.get(1, session), (0, True))
+            self.assertEqual(self.statements, [])
+
+            user = await session.get(User, 1)
+            user.is_active = False
+            await session.commit()
+
+            self.assertEqual(await token_versions.get(1, session), (1, False))
+            self.assertIsNone(await token_versions.get(2, session))
+
+    def test_redis_round_trip(self):
+        user = User(id=1, username="cached", email="cached@example.com", password="hash", role=Role.admin)
+        snapshot = PrincipalCache.snapshot(user)
+        self.assertEqual(PrincipalCache.loads(PrincipalCache.dumps(snapshot)), snapshot)
+
+
+class TestInvalidationBroadcast(unittest.IsolatedAsyncioTestCase):
+    async def test_other_workers_drop_entries(self):
+        server = FakeServer()
+        sender, receiver = [
+            InvalidationBroadcast((PrincipalCache(maxsize=10, ttl=60), TokenVersionMap(maxsize=10, ttl=60)),
+                                  redis=aioredis.FakeRedis(server=server))
+            for _ in range(2)
+        ]
+        receiver.start()
+        try:
+            while (await sender.redis.pubsub_numsub(sender.channel))[0][1] == 0:
+                await asyncio.sleep(0.01)
+            for worker in (sender, receiver):
+                worker.principals.local.set("cached@example.com", {"id": 1})
+                worker.token_versions.local.set(1, (0, True))
+
+            sender.publish(["cached@example.com"], [1])
+            for _ in range(100):
+                if receiver.received:
+                    break
+                await asyncio.sleep(0.01)
+
+            self.assertNotIn("cached@example.com", receiver.principals.local)
+            self.assertNotIn(1, receiver.token_versions.local)
+            # the sender invalidates its entries itself, after commit
+            self.assertIn(1, sender.token_versions.local)
+        finally:
+            await receiver.stop()
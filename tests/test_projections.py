@@ -0,0 +1,66 @@
+import unittest
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Publication, PubImage, Tag, User
+from src.repositories.loaders import LIST, publication_options
+from src.repositories.publications import get_all_publications, get_user_publications
+from src.schemas.publications import PublicationResponse, PublicationUsersResponse
+
+
+class TestPublicationProjections(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+        async with self.sessions() as db:
+            self.users = [User(username=f"user{i}", email=f"user{i}@example.com", password="x", avatar="avatar")
+                          for i in range(2)]
+            # names are added in reverse order of sorting
+            tags = [Tag(name=f"tag{i}") for i in reversed(range(3))]
+            db.add_all([Publication(title=f"title {i}", description=f"description {i}" if i % 2 else None,
+                                    user=self.users[i % 2], tags=tags[:i % 4],
+                                    image=PubImage(current_img=f"image {i}", updated_img=f"updated {i}"),
+                                    rating_count=i % 3, rating_sum=i % 3 * 4)
+                        for i in range(12)])
+            await db.commit()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def hydrated(self, db, user: User | None = None) -> list[Publication]:
+        stmt = select(Publication).options(*publication_options(LIST)).order_by(Publication.id.desc())
+        if user is not None:
+            stmt = stmt.where(Publication.user_id == user.id)
+        return (await db.execute(stmt)).scalars().all()
+
+    @staticmethod
+    def dump(schema, publications) -> list[dict]:
+        dumped = [schema.model_validate(publication, from_attributes=True).model_dump()
+                  for publication in publications]
+        for publication in dumped:
+            # order of aggregated names isn't defined
+            publication["tags_name"] = publication["tags_name"] and sorted(publication["tags_name"].split(", "))
+        return dumped
+
+    async def test_tag_names_are_sorted(self):
+        async with self.sessions() as db:
+            names = [publication.tags_name for publication in await get_all_publications(20, 0, db)]
+        self.assertIn("tag0, tag1, tag2", names)
+        self.assertEqual(names, [name and ", ".join(sorted(name.split(", "))) for name in names])
+
+    async def test_rows_match_hydrated_models(self):
+        async with self.sessions() as db:
+            feed = await get_all_publications(20, 0, db)
+            own = await get_user_publications(20, 0, db, self.users[1])
+            # nothing is hydrated
+            self.assertEqual(len(db.identity_map), 0)
+
+            self.assertEqual(self.dump(PublicationUsersResponse, feed),
+                             self.dump(PublicationUsersResponse, await self.hydrated(db)))
+            self.assertEqual(self.dump(PublicationResponse, own),
+                             self.dump(PublicationResponse, await self.hydrated(db, self.users[1])))
@@ -0,0 +1,106 @@
+import threading
+import unittest
+
+from cloudinary.exceptions import Error as CloudinaryError
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Publication, PubImage, Tag, User
+from src.schemas.publications import PublicationCreate
+from src.schemas.tags import TagSchema
+from src.services.cloud_in_ary.errors import CloudinaryResourceNotFoundError
+from src.services.publish import publish_publication
+
+
+class FakeCloud:
+    def __init__(self, uploaded: set[str], failing: set[str] = frozenset()):
+        self.temp = set(uploaded)
+        self.failing = failing
+        self.published = set()
+        self.barrier = threading.Barrier(2, timeout=5)
+
+    def replace_temp_to_publications(self, email: str, postfix: str, post_id: int) -> dict[str, str | None]:
+        # both images are moved at the same time
+        self.barrier.wait()
+        if postfix in self.failing:
+            raise CloudinaryError("Error in rename")
+        if postfix not in self.temp:
+            return {postfix: None}
+        self.temp.remove(postfix)
+        self.published.add(postfix)
+        return {postfix: f"http://img/{email}/publications/{post_id}/{postfix}"}
+
+    def restore_temp(self, email: str, postfix: str, post_id: int) -> None:
+        self.published.remove(postfix)
+        self.temp.add(postfix)
+
+
+class TestPublishPublication(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine)
+
+        async with self.sessions() as db:
+            db.add(User(id=1, username="user", email="user@example.com", password="x"))
+            await db.commit()
+
+        self.commits = 0
+
+        def count_commit(session):
+            self.commits += 1
+
+        event.listen(self.sessions.class_.sync_session_class, "after_commit", count_commit)
+        self.addCleanup(event.remove, self.sessions.class_.sync_session_class, "after_commit", count_commit)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def publish(self, cloud: FakeCloud) -> Publication:
+        body = PublicationCreate(title="title", description="description", tags=[TagSchema(name="cat")])
+        async with self.sessions() as db:
+            user = (await db.execute(select(User))).scalar_one()
+            return await publish_publication(body, db, user, cloud)
+
+    async def count(self, model) -> int:
+        async with self.sessions() as db:
+            return (await db.execute(select(func.count()).select_from(model))).scalar()
+
+    async def test_publish_in_one_commit(self):
+        cloud = FakeCloud({"current_img", "updated_img"})
+        self.commits = 0
+
+        publication = await self.publish(cloud)
+
+        self.assertEqual(self.commits, 1)
+        self.assertEqual(publication.image.current_img,
+                         f"http://img/user@example.com/publications/{publication.id}/current_img")
+        self.assertIsNotNone(publication.image.updated_img)
+        self.assertEqual(publication.tags_name, "cat")
+        self.assertEqual(cloud.published, {"current_img", "updated_img"})
+
+    async def test_updated_image_is_optional(self):
+        publication = await self.publish(FakeCloud({"current_img"}))
+        self.assertIsNone(publication.image.updated_img)
+
+    async def test_failed_move_is_compensated(self):
+        cloud = FakeCloud({"current_img", "updated_img"}, failing={"updated_img"})
+
+        with self.assertRaises(CloudinaryError):
+            await self.publish(cloud)
+
+        self.assertEqual(cloud.temp, {"current_img", "updated_img"})
+        self.assertEqual(cloud.published, set())
+        for model in (Publication, PubImage, Tag):
+            self.assertEqual(await self.count(model), 0)
+
+    async def test_missing_image(self):
+        cloud = FakeCloud({"updated_img"})
+
+        with self.assertRaises(CloudinaryResourceNotFoundError):
+            await self.publish(cloud)
+
+        self.assertEqual(cloud.temp, {"updated_img"})
+        self.assertEqual(await self.count(Publication), 0)
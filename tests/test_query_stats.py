@@ -0,0 +1,89 @@
+import asyncio
+import unittest
+
+from fastapi import FastAPI
+from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, User
+from src.database.query_stats import QueryStatsMiddleware, instrument, totals
+from src.utils.my_logger import logger
+
+
+class TestQueryStats(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine)
+        async with self.sessions() as db:
+            db.add_all([User(username=f"user{i}", email=f"user{i}@example.com", password="x") for i in range(3)])
+            await db.commit()
+        instrument(self.engine)
+
+        self.app = FastAPI()
+        self.app.add_middleware(QueryStatsMiddleware, n_plus_one_threshold=3)
+
+        @self.app.get("/users")
+        async def users():
+            async with self.sessions() as db:
+                return [user.username for user in (await db.execute(select(User))).scalars()]
+
+        @self.app.get("/one-by-one")
+        async def one_by_one():
+            async with self.sessions() as db:
+                return [(await db.execute(select(User.username).where(User.id == user_id))).scalar()
+                        for user_id in (1, 2, 3)]
+
+        self.started, self.resume = asyncio.Event(), asyncio.Event()
+
+        @self.app.get("/wait")
+        async def wait():
+            async with self.sessions() as db:
+                await db.execute(select(User))
+            self.started.set()
+            await self.resume.wait()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def get(self, path: str):
+        async with AsyncClient(app=self.app, base_url="http://test") as client:
+            return await client.get(path)
+
+    async def test_server_timing_header(self):
+        with self.assertLogs(logger, "INFO") as logs:
+            response = await self.get("/users")
+
+        self.assertEqual(len(response.json()), 3)
+        timing = response.headers["Server-Timing"]
+        self.assertTrue(timing.startswith("db;dur="))
+        self.assertIn('desc="1 queries, 3 rows"', timing)
+        self.assertIn("GET /users: 1 queries", logs.output[0])
+        self.assertFalse(any("N+1" in line for line in logs.output))
+
+    async def test_repeated_statement_is_reported(self):
+        with self.assertLogs(logger, "WARNING") as logs:
+            response = await self.get("/one-by-one")
+
+        self.assertIn('desc="3 queries, 3 rows"', response.headers["Server-Timing"])
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("possible N+1, statement executed 3 times", logs.output[0])
+
+    async def test_statements_outside_request_are_not_counted(self):
+        before = dict(totals)
+        request = asyncio.create_task(self.get("/wait"))
+        await self.started.wait()
+        # e.g. a background worker, while the request is in progress
+        async with self.sessions() as db:
+            for _ in range(3):
+                await db.execute(select(User))
+        self.resume.set()
+        response = await request
+
+        self.assertIn('desc="1 queries, 3 rows"', response.headers["Server-Timing"])
+        self.assertEqual(totals["requests"], before["requests"] + 1)
+        self.assertEqual(totals["queries"], before["queries"] + 1)
+        self.assertEqual(totals["rows"], before["rows"] + 3)
@@ -0,0 +1,56 @@
+import unittest
+
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from src.services.rate_limit import RateLimit, RateLimiter, SlidingWindow, TokenBucket
+
+
+class Clock:
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.limiter = RateLimiter(timer=self.clock)
+
+    def test_sliding_window(self):
+        policy = SlidingWindow(times=3, seconds=10)
+        for _ in range(3):
+            self.assertEqual(self.limiter.hit("client", policy), 0)
+        self.assertGreater(self.limiter.hit("client", policy), 0)
+
+        # half of previous window is still counted
+        self.clock.now += 15
+        self.assertEqual(self.limiter.hit("client", policy), 0)
+        self.assertGreater(self.limiter.hit("client", policy), 0)
+
+        self.clock.now += 20
+        self.assertEqual(self.limiter.hit("client", policy), 0)
+        self.assertEqual(self.limiter.hit("other", policy), 0)
+
+    def test_token_bucket(self):
+        policy = TokenBucket(capacity=2, rate=0.5)
+        self.assertEqual(self.limiter.hit("client", policy), 0)
+        self.assertEqual(self.limiter.hit("client", policy), 0)
+        self.assertEqual(self.limiter.hit("client", policy), 2)
+
+        self.clock.now += 2
+        self.assertEqual(self.limiter.hit("client", policy), 0)
+        self.assertGreater(self.limiter.hit("client", policy), 0)
+        self.assertEqual(self.limiter.stats()["rejected"], 2)
+
+    async def test_dependency_raises_too_many_requests(self):
+        limit = RateLimit(TokenBucket(capacity=1, rate=0.1), "test", limiter=self.limiter)
+        request = Request({"type": "http", "client": ("127.0.0.1", 5000), "headers": []})
+
+        await limit(request)
+        with self.assertRaises(HTTPException) as err:
+            await limit(request)
+        self.assertEqual(err.exception.status_code, 429)
+        self.assertEqual(err.exception.headers["Retry-After"], "10")
@@ -0,0 +1,60 @@
+import unittest
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Publication, Role, User
+from src.repositories.ratings import add_rating, delete_rating
+from src.schemas.ratings import RatingCreate
+from src.services.principal import Principal
+
+
+class TestRatingStats(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine)
+
+        async with self.sessions() as db:
+            users = [User(id=i + 1, username=f"user{i}", email=f"user{i}@example.com", password="x") for i in range(3)]
+            db.add_all(users)
+            db.add(Publication(id=1, title="title", user=users[0]))
+            await db.commit()
+        self.alice = Principal(id=2, email="user1@example.com", role=Role.user)
+        self.bob = Principal(id=3, email="user2@example.com", role=Role.user)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def get_publication(self) -> Publication:
+        async with self.sessions() as db:
+            return (await db.execute(select(Publication))).scalar_one()
+
+    async def test_aggregates_follow_ratings(self):
+        async with self.sessions() as db:
+            await add_rating(1, RatingCreate(score=4), db, self.alice)
+            await add_rating(1, RatingCreate(score=5), db, self.bob)
+        publication = await self.get_publication()
+        self.assertEqual((publication.rating_count, publication.rating_sum), (2, 9))
+        self.assertEqual(publication.average_rating, 4.5)
+
+        async with self.sessions() as db:
+            await delete_rating(self.bob.id, 1, db)
+        publication = await self.get_publication()
+        self.assertEqual((publication.rating_count, publication.rating_sum), (1, 4))
+
+        async with self.sessions() as db:
+            await delete_rating(self.alice.id, 1, db)
+        self.assertIsNone((await self.get_publication()).average_rating)
+
+    async def test_duplicate_rating_keeps_aggregates(self):
+        async with self.sessions() as db:
+            await add_rating(1, RatingCreate(score=3), db, self.alice)
+            with self.assertRaises(IntegrityError):
+                await add_rating(1, RatingCreate(score=5), db, self.alice)
+            await db.rollback()
+        publication = await self.get_publication()
+        self.assertEqual((publication.rating_count, publication.rating_sum), (1, 3))
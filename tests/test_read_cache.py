@@ -0,0 +1,101 @@
+import asyncio
+import unittest
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Publication, User
+from src.repositories.profile import count_user_publications
+from src.services.read_cache import ReadCache, read_cache
+
+
+class TestReadCache(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.cache = ReadCache(maxsize=16, ttl=60, local_ttl=60, beta=0)
+        self.loads = 0
+
+        @self.cache.cached("square", int, tags=lambda x: [f"number:{x}"])
+        async def square(x: int, db=None) -> int:
+            self.loads += 1
+            await asyncio.sleep(0.01)
+            return x * x
+
+        self.square = square
+
+    async def test_hit_and_invalidation(self):
+        self.assertEqual(await self.square(3), 9)
+        self.assertEqual(await self.square(3, db=object()), 9)
+        self.assertEqual(self.loads, 1)
+
+        self.cache.invalidate("number:4")
+        await self.square(3)
+        self.assertEqual(self.loads, 1)
+
+        self.cache.invalidate("number:3")
+        await self.square(3)
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(self.cache.stats()["hit_rate"], 0.5)
+
+    async def test_concurrent_misses_load_once(self):
+        results = await asyncio.gather(*(self.square(5) for _ in range(10)))
+        self.assertEqual(results, [25] * 10)
+        self.assertEqual(self.loads, 1)
+        self.assertEqual(self.cache.counters["coalesced"], 9)
+
+    async def test_early_refresh(self):
+        await self.square(2)
+        self.cache.beta = 1e9
+        await self.square(2)
+        self.assertEqual(self.loads, 2)
+        self.assertEqual(self.cache.counters["early_refreshes"], 1)
+
+
+class TestReadCacheInvalidation(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+        async with self.sessions() as db:
+            db.add(User(id=1, username="user", email="user@example.com", password="x"))
+            await db.commit()
+        read_cache.clear()
+
+    async def asyncTearDown(self):
+        read_cache.clear()
+        await self.engine.dispose()
+
+    async def count(self) -> int:
+        async with self.sessions() as db:
+            return await count_user_publications(1, db)
+
+    async def test_commit_invalidates_and_rollback_does_not(self):
+        self.assertEqual(await self.count(), 0)
+
+        async with self.sessions() as db:
+            db.add(Publication(title="title", user_id=1))
+            await db.flush()
+            await db.rollback()
+        self.assertEqual(await self.count(), 0)
+        self.assertNotIn("user_publications:1", read_cache._versions)
+
+        async with self.sessions() as db:
+            db.add(Publication(title="title", user_id=1))
+            await db.commit()
+        self.assertEqual(await self.count(), 1)
+
+    async def test_user_changes(self):
+        async with self.sessions() as db:
+            user = await db.get(User, 1)
+            user.about = "about"
+            await db.commit()
+        # feed items embed every field of UserResponse, comments only username and avatar
+        self.assertIn("user:1", read_cache._versions)
+        self.assertNotIn("comment_authors", read_cache._versions)
+
+        async with self.sessions() as db:
+            user = await db.get(User, 1)
+            user.avatar = "avatar"
+            await db.commit()
+        self.assertIn("comment_authors", read_cache._versions)
@@ -0,0 +1,85 @@
+import unittest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from src.database.db import DatabaseSessionManager, ReadYourWritesMiddleware, primary_pinned
+from src.services.read_cache import ReadCache
+
+BROKEN_URL = "sqlite+aiosqlite:////nonexistent/replica.db"
+
+
+class TestReadReplicas(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.manager = DatabaseSessionManager("sqlite+aiosqlite://",
+                                              ["sqlite+aiosqlite://", "sqlite+aiosqlite://", BROKEN_URL])
+        self.primary = self.manager._engine
+        self.replicas = [replica.engine for replica in self.manager._replicas]
+
+    async def read_engine(self):
+        async with self.manager.read_session() as session:
+            return session.bind
+
+    async def test_round_robin_over_healthy_replicas(self):
+        await self.manager.check_replicas()
+
+        engines = [await self.read_engine() for _ in range(4)]
+        self.assertEqual(set(engines), set(self.replicas[:2]))
+        self.assertNotEqual(engines[0], engines[1])
+        self.assertFalse(self.manager.replica_stats()["replica_2"]["healthy"])
+
+    async def test_fallback_to_primary(self):
+        for replica in self.manager._replicas:
+            replica.healthy = False
+        self.assertIs(await self.read_engine(), self.primary)
+
+        self.manager.max_lag = -1
+        await self.manager.check_replicas()
+        self.assertIs(await self.read_engine(), self.primary)
+
+    async def test_pinned_request_reads_primary(self):
+        token = primary_pinned.set(True)
+        try:
+            self.assertIs(await self.read_engine(), self.primary)
+        finally:
+            primary_pinned.reset(token)
+        self.assertIsNot(await self.read_engine(), self.primary)
+
+    async def test_cache_misses_load_from_primary(self):
+        cache = ReadCache(maxsize=16, ttl=60, local_ttl=60, beta=0, sessions=self.manager)
+        sessions = []
+
+        @cache.cached("bind", int, tags=lambda x: [f"number:{x}"])
+        async def load(x: int, db) -> int:
+            sessions.append(db)
+            return x
+
+        async with self.manager.read_session() as replica_session:
+            self.assertIsNot(replica_session.bind, self.primary)
+            await load(1, replica_session)
+        self.assertIs(sessions[-1].bind, self.primary)
+
+        async with self.manager.session() as session:
+            await load(2, db=session)
+        self.assertIs(sessions[-1], session)
+
+
+class TestReadYourWritesMiddleware(unittest.TestCase):
+    def test_reads_pinned_after_write(self):
+        app = FastAPI()
+        app.add_middleware(ReadYourWritesMiddleware, window=60)
+
+        @app.get("/pinned")
+        async def pinned():
+            return primary_pinned.get()
+
+        @app.post("/write")
+        async def write():
+            return None
+
+        client = TestClient(app)
+        alice = {"Authorization": "Bearer alice"}
+        self.assertFalse(client.get("/pinned", headers=alice).json())
+        client.post("/write", headers=alice)
+        self.assertTrue(client.get("/pinned", headers=alice).json())
+        self.assertFalse(client.get("/pinned", headers={"Authorization": "Bearer bob"}).json())
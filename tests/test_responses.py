@@ -0,0 +1,55 @@
+import json
+import unittest
+from datetime import datetime
+
+from fastapi import FastAPI, Response
+from httpx import AsyncClient
+
+from src.schemas.comments import CommentModelReturned
+from src.utils.responses import FastJSONResponse, json_response, type_adapter
+
+COMMENTS = list[CommentModelReturned]
+
+
+class Row:
+    def __init__(self, id: int):
+        self.id, self.user_id, self.publication_id, self.text = id, 1, 1, f"comment {id}"
+        self.created_at = self.updated_at = datetime(2024, 1, 2, 3, 4, 5)
+        self.secret = "not in schema"
+
+
+class TestResponses(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.app = FastAPI()
+        rows = [Row(1), Row(2)]
+
+        @self.app.get("/default", response_model=COMMENTS)
+        async def default():
+            return rows
+
+        @self.app.get("/fast", response_model=COMMENTS, response_class=FastJSONResponse)
+        async def fast(response: Response):
+            response.headers["X-Next-Cursor"] = "cursor"
+            return json_response(COMMENTS, rows, response)
+
+        @self.app.get("/models", response_model=COMMENTS, response_class=FastJSONResponse)
+        async def models():
+            return type_adapter(COMMENTS).validate_python(rows, from_attributes=True)
+
+    async def get(self, path: str):
+        async with AsyncClient(app=self.app, base_url="http://test") as client:
+            return await client.get(path)
+
+    async def test_same_body_as_default(self):
+        default = await self.get("/default")
+        for path in ("/fast", "/models"):
+            response = await self.get(path)
+            self.assertEqual(response.headers["content-type"], "application/json")
+            self.assertEqual(response.json(), default.json())
+        self.assertNotIn("secret", default.text)
+        self.assertEqual((await self.get("/fast")).headers["X-Next-Cursor"], "cursor")
+
+    def test_render(self):
+        self.assertEqual(FastJSONResponse(b'{"ready":1}').body, b'{"ready":1}')
+        self.assertEqual(json.loads(FastJSONResponse({1: datetime(2024, 1, 2)}).body), {"1": "2024-01-02T00:00:00"})
+        self.assertIs(type_adapter(COMMENTS), type_adapter(COMMENTS))
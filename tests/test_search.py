@@ -0,0 +1,79 @@
+import unittest
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, User
+from src.repositories.publications import create_publication, update_text_publication
+from src.repositories.search import search_publications
+from src.repositories.tags import set_publication_tags
+from src.schemas.publications import PublicationCreate, PublicationUpdate
+from src.schemas.tags import TagSchema
+
+
+class TestSearchPublications(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+        async with self.sessions() as db:
+            self.user = User(id=1, username="user", email="user@example.com", password="x")
+            db.add(self.user)
+            await db.commit()
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def create(self, title: str, description: str | None = None, tags: list[str] = ()) -> int:
+        async with self.sessions() as db:
+            body = PublicationCreate(title=title, description=description,
+                                     tags=[TagSchema(name=name) for name in tags])
+            publication = await create_publication(body, db, self.user)
+            await db.commit()
+            return publication.id
+
+    async def search(self, query: str, limit: int = 10, cursor: str | None = None):
+        async with self.sessions() as db:
+            publications, next_cursor = await search_publications(query, limit, db, cursor)
+            return [publication.id for publication in publications], next_cursor
+
+    async def test_title_description_and_tags_are_searched(self):
+        sunset = await self.create("Sunset", "over the sea", ["beach"])
+        cat = await self.create("My cat", "sleeping at sunset", ["cat"])
+        await self.create("Dog", "in the park", ["dog"])
+
+        self.assertEqual((await self.search("sunset"))[0], [sunset, cat])
+        self.assertEqual((await self.search("beach sunset"))[0], [sunset])
+        self.assertEqual((await self.search("CAT"))[0], [cat])
+        self.assertEqual((await self.search("horse"))[0], [])
+        self.assertEqual(await self.search('" OR *'), ([], None))
+
+    async def test_document_follows_updates(self):
+        publication_id = await self.create("Cat")
+        async with self.sessions() as db:
+            await update_text_publication(publication_id, PublicationUpdate(title="Dog"), db, self.user)
+            await set_publication_tags(publication_id, [TagSchema(name="puppy")], db)
+
+        self.assertEqual((await self.search("cat"))[0], [])
+        self.assertEqual((await self.search("dog puppy"))[0], [publication_id])
+
+    async def test_pages_by_cursor(self):
+        ids = [await self.create(f"cat {i}", "cat " * (i % 3) or None) for i in range(25)]
+
+        seen, cursor = [], None
+        while True:
+            page, cursor = await self.search("cat", 10, cursor)
+            seen.extend(page)
+            if cursor is None:
+                break
+        self.assertEqual(sorted(seen), ids)
+        self.assertEqual(seen, (await self.search("cat", 50))[0])
+
+    async def test_invalid_cursor(self):
+        await self.create("cat")
+        with self.assertRaises(HTTPException) as err:
+            await self.search("cat", 10, "not a cursor")
+        self.assertEqual(err.exception.status_code, 400)
@@ -0,0 +1,37 @@
+import unittest
+
+from src.services.sessions import MemorySessionStore
+
+
+class TestMemorySessionStore(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.store = MemorySessionStore(ttl=3600)
+
+    async def test_rotate(self):
+        await self.store.create("sid1", "user@example.com", "token1", "phone")
+        self.assertTrue(await self.store.rotate("sid1", "user@example.com", "token1", "token2"))
+        self.assertTrue(await self.store.rotate("sid1", "user@example.com", "token2", "token3"))
+
+    async def test_reuse_of_rotated_token_revokes_session(self):
+        await self.store.create("sid1", "user@example.com", "token1")
+        await self.store.rotate("sid1", "user@example.com", "token1", "token2")
+
+        self.assertFalse(await self.store.rotate("sid1", "user@example.com", "token1", "token3"))
+        self.assertFalse(await self.store.rotate("sid1", "user@example.com", "token2", "token3"))
+        self.assertEqual(await self.store.get_sessions("user@example.com"), [])
+
+    async def test_revoke_only_current_token(self):
+        await self.store.create("sid1", "user@example.com", "token1")
+        self.assertFalse(await self.store.revoke("sid1", "user@example.com", "other"))
+        self.assertTrue(await self.store.revoke("sid1", "user@example.com", "token1"))
+        self.assertFalse(await self.store.rotate("sid1", "user@example.com", "token1", "token2"))
+
+    async def test_revoke_user(self):
+        await self.store.create("sid1", "user@example.com", "token1", "phone")
+        await self.store.create("sid2", "user@example.com", "token2", "laptop")
+        await self.store.create("sid3", "other@example.com", "token3")
+
+        self.assertEqual(len(await self.store.get_sessions("user@example.com")), 2)
+        self.assertEqual(await self.store.revoke_user("user@example.com"), 2)
+        self.assertEqual(await self.store.get_sessions("user@example.com"), [])
+        self.assertEqual(len(await self.store.get_sessions("other@example.com")), 1)
@@ -0,0 +1,78 @@
+import json
+import unittest
+
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Publication, User
+from src.repositories.publications import create_publication
+from src.repositories.tags import add_tags_to_publication, set_publication_tags
+from src.schemas.publications import PublicationCreate
+from src.schemas.tags import TagSchema
+from src.services.tag_index import TagIndex, tag_index
+
+
+def tags(*names: str) -> list[TagSchema]:
+    return [TagSchema(name=name) for name in names]
+
+
+class TestTagIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = TagIndex()
+        self.index.replace({"cat": 3, "Camera": 5, "car": 0, "dog": 7, "cats": 3})
+
+    def test_suggest_by_prefix_most_used_first(self):
+        self.assertEqual(self.index.suggest("ca"), [("Camera", 5), ("cat", 3), ("cats", 3), ("car", 0)])
+        self.assertEqual(self.index.suggest("CAT", limit=1), [("cat", 3)])
+        self.assertEqual(self.index.suggest("x"), [])
+
+    def test_apply_changes(self):
+        self.index.apply({"cab": 1, "car": 4, "dog": -10})
+        self.assertEqual(self.index.suggest("ca", limit=3), [("Camera", 5), ("car", 4), ("cat", 3)])
+        self.assertEqual(self.index.suggest("cab"), [("cab", 1)])
+        self.assertEqual(self.index.suggest("d"), [("dog", 0)])
+
+    def test_receive_changes_of_other_workers(self):
+        other = TagIndex()
+        self.index.receive(json.dumps({"origin": other.origin, "changes": {"cave": 2}}))
+        self.index.receive(json.dumps({"origin": self.index.origin, "changes": {"cave": 2}}))
+        self.assertEqual(self.index.suggest("cav"), [("cave", 2)])
+
+
+class TestTagIndexTracking(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+
+        async with self.sessions() as db:
+            self.user = User(id=1, username="user", email="user@example.com", password="x")
+            db.add_all([self.user, Publication(id=1, title="title", user_id=1)])
+            await db.commit()
+        tag_index.replace({})
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_commits_update_index(self):
+        async with self.sessions() as db:
+            await add_tags_to_publication(1, tags("cat", "car"), db)
+            publication = await create_publication(PublicationCreate(title="new", tags=tags("cat")), db, self.user)
+            await db.commit()
+        self.assertEqual(tag_index.suggest("ca"), [("cat", 2), ("car", 1)])
+
+        async with self.sessions() as db:
+            await set_publication_tags(publication.id, tags("camel"), db)
+        self.assertEqual(tag_index.suggest("ca"), [("camel", 1), ("car", 1), ("cat", 1)])
+
+        reloaded = TagIndex()
+        async with self.sessions() as db:
+            await reloaded.load(db)
+        self.assertEqual(reloaded.suggest("ca"), tag_index.suggest("ca"))
+
+    async def test_rolled_back_changes_are_dropped(self):
+        async with self.sessions() as db:
+            await create_publication(PublicationCreate(title="new", tags=tags("cat")), db, self.user)
+            await db.rollback()
+        self.assertEqual(tag_index.suggest("cat"), [])
@@ -0,0 +1,62 @@
+import unittest
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from src.database.models import Base, Publication, PublicationTagAssociation, Tag, User
+from src.repositories.tags import add_tags_to_publication, set_publication_tags
+from src.schemas.tags import TagSchema
+
+
+def tags(*names: str) -> list[TagSchema]:
+    return [TagSchema(name=name) for name in names]
+
+
+class TestBulkTags(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        self.sessions = async_sessionmaker(bind=self.engine)
+
+        async with self.sessions() as db:
+            db.add(Publication(id=1, title="title", user=User(username="user", email="user@example.com", password="x")))
+            await db.commit()
+
+        self.statements = []
+        event.listen(self.engine.sync_engine, "before_cursor_execute",
+                     lambda conn, cursor, statement, *args: self.statements.append(statement))
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def publication_tags(self) -> list[str]:
+        async with self.sessions() as db:
+            stmt = (select(Tag.name).join(PublicationTagAssociation, PublicationTagAssociation.tag_id == Tag.id)
+                    .filter(PublicationTagAssociation.publication_id == 1).order_by(Tag.name))
+            return list((await db.execute(stmt)).scalars())
+
+    async def test_add_tags_in_bulk(self):
+        async with self.sessions() as db:
+            self.assertEqual(await add_tags_to_publication(1, tags("cat", "dog", "cat"), db), ["cat", "dog"])
+        # insert of tags and insert of associations, besides refresh of search document
+        self.assertEqual(len([s for s in self.statements
+                              if s.startswith(("INSERT", "SELECT")) and "publications_fts" not in s]), 2)
+
+        async with self.sessions() as db:
+            self.assertEqual(await add_tags_to_publication(1, tags("dog", "fox"), db), ["dog", "fox"])
+        self.assertEqual(await self.publication_tags(), ["cat", "dog", "fox"])
+
+    async def test_set_tags_replaces_tags(self):
+        async with self.sessions() as db:
+            await add_tags_to_publication(1, tags("cat", "dog"), db)
+        async with self.sessions() as db:
+            self.assertEqual(await set_publication_tags(1, tags("dog", "owl"), db), ["dog", "owl"])
+        self.assertEqual(await self.publication_tags(), ["dog", "owl"])
+
+        async with self.sessions() as db:
+            await set_publication_tags(1, [], db)
+        self.assertEqual(await self.publication_tags(), [])
+        async with self.sessions() as db:
+            self.assertEqual(len((await db.execute(select(Tag))).scalars().all()), 3)
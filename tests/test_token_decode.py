@@ -0,0 +1,28 @@
+import unittest
+
+from jose import JWTError
+
+from src.services.auth import auth_service
+
+
+class TestDecodeToken(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        auth_service.decoded_tokens.clear()
+
+    async def test_memoized_until_expiry(self):
+        token = await auth_service.create_access_token({"sub": "user@example.com"}, expires_delta=60)
+        hits = auth_service.decoded_tokens.hits
+        first = auth_service.decode_token(token)
+        second = auth_service.decode_token(token)
+
+        self.assertEqual(first, second)
+        self.assertEqual(auth_service.decoded_tokens.hits, hits + 1)
+        second["sub"] = "changed"
+        self.assertEqual(auth_service.decode_token(token)["sub"], "user@example.com")
+
+    async def test_invalid_token_not_cached(self):
+        token = await auth_service.create_access_token({"sub": "user@example.com"}, expires_delta=60)
+        for _ in range(2):
+            with self.assertRaises(JWTError):
+                auth_service.decode_token(token[:-2] + "xx")
+        self.assertEqual(len(auth_service.decoded_tokens), 0)